@@ -3,16 +3,92 @@ import time
 import csv
 from datetime import datetime
 
-from flask import Flask, jsonify, render_template, send_file
+from flask import Flask, Response, jsonify, render_template, request
 
 from controller import TrafficController   # NEW: use your smart controller
+from controller_runner import ControllerRunner
+from count_bus import CountReader
+from frame_bus import FrameReader
+from lane_map import LaneMap
+from metrics import APP_METRICS, CONTROLLER_METRICS, Metrics, render_shared
+from preempt import PreemptListener
+from rollups import STEPS, Rollups
+from state_bus import StateFollower, StateReader
+from status_stream import StatusBroadcaster, status_payload
 
 app = Flask(__name__)
 
 # -------------------------------------------------------
 # SMART CONTROLLER INSTANCE
 # -------------------------------------------------------
-controller = TrafficController()  # uses config.py + internal CSV logging
+# TRAFFIC_STATE=local  (default, `python app.py`): this process runs the
+#                      controller itself.
+# TRAFFIC_STATE=shared (gunicorn.conf.py): controller_service.py is the single
+#                      controller authority; every worker serves its state
+#                      from the state bus.
+STATE_MODE = os.environ.get("TRAFFIC_STATE", "local")
+
+# Latest camera frame (shared memory), JPEG-encoded only when /image is hit
+frames = FrameReader(lane_map=LaneMap.load())
+
+# One serialized status event shared by every /stream subscriber
+broadcaster = StatusBroadcaster()
+
+# This process's request metrics; the detector (and, in shared mode, the
+# controller authority) share theirs through shared memory
+app_metrics = Metrics(APP_METRICS)
+controller_metrics = None
+
+# Read-only view of the rollups the controller maintains (see rollups.py)
+rollups = Rollups()
+
+ANALYTICS_MAX_BUCKETS = 10_000
+ANALYTICS_MAX_TOP = 100
+
+if STATE_MODE == "shared":
+    controller = None
+    state_reader = StateReader()
+    follower = StateFollower(state_reader, broadcaster.publish)
+    follower.start()
+else:
+    controller_metrics = Metrics(CONTROLLER_METRICS)
+    controller = TrafficController(metrics=controller_metrics)  # uses config.py + data/logs/cycles/ log
+
+    # Latest NS/EW counts published by vehicle_detection.py (shared memory)
+    counts = CountReader()
+
+    def publish_status(state):
+        broadcaster.publish(status_payload(state, frames))
+
+    # The controller advances on its own deadlines; requests only read its state
+    runner = ControllerRunner(controller, counts, on_change=publish_status, metrics=controller_metrics)
+    publish_status(controller.snapshot())
+    runner.start()
+
+    # emergency / transit priority requests skip the runner's poll cadence
+    preempt_listener = PreemptListener.start_on(runner.preempt)
+
+
+def current_status():
+    """/status payload, or None if the controller authority is not running."""
+    if controller is None:
+        shared = state_reader.status()
+        if shared is None or not state_reader.alive():
+            return None
+        payload = dict(shared)
+        payload["remaining_time"] = max(0, int(payload["phase_ends_at"] - time.time()))
+    else:
+        state = controller.snapshot()
+        payload = status_payload(state, frames)
+        payload["remaining_time"] = state.remaining
+    payload["server_time"] = time.time()
+    return payload
+
+
+def recent_cycles(n=10):
+    if controller is None:
+        return state_reader.history()[-n:]
+    return controller.cycle_log.last(n)
 
 
 # -------------------------------------------------------
@@ -21,7 +97,7 @@ controller = TrafficController()  # uses config.py + internal CSV logging
 def log_cycle_simple(phase, ns_count, ew_count, green_time):
     """
     Kept only if you still want app.py-side logging; otherwise not used.
-    History widget already reads the controller's CSV.
+    History widget already reads the controller's cycle log.
     """
     os.makedirs("data/logs", exist_ok=True)
     csv_path = "data/logs/cycles_app.csv"
@@ -68,75 +144,155 @@ def status():
     Frontend expects:
       phase           -> "NS", "EW", "YELLOW", "ALL_RED"
       remaining_time  -> number
+      phase_ends_at   -> epoch seconds the current phase ends
       green_time      -> number
       vehicle_ns      -> number
       vehicle_ew      -> number
+      approaches      -> {approach name: number} (lane map)
+      queues / flows  -> {approach name: number} or null (tracker only)
       has_image       -> bool
+      frame_seq       -> number, changes with every new camera frame
+
+    Polling fallback for browsers without EventSource; see /stream.
     """
 
-    # Read current counts from YOLO output text files
-    count_ns = 0
-    count_ew = 0
+    # Pure read: ControllerRunner (here or in controller_service.py) keeps the
+    # controller and its counts current
+    with app_metrics.timer("app_status_seconds"):
+        app_metrics.inc("app_status_requests_total")
+        payload = current_status()
+        if payload is None:
+            return jsonify({"error": "controller service not running"}), 503
+        return jsonify(payload)
 
-    if os.path.exists("vehicle_count_ns.txt"):
-        try:
-            with open("vehicle_count_ns.txt") as f:
-                count_ns = int(f.read().strip() or 0)
-        except ValueError:
-            count_ns = 0
-
-    if os.path.exists("vehicle_count_ew.txt"):
-        try:
-            with open("vehicle_count_ew.txt") as f:
-                count_ew = int(f.read().strip() or 0)
-        except ValueError:
-            count_ew = 0
 
-    # Ask smart controller for phase + timings + load
-    ui_phase, remaining, green_time, load = controller.update_phase(count_ns, count_ew)
+# -------------------------------------------------------
+# STREAM (server-sent events, pushed only when the status changes)
+# -------------------------------------------------------
+@app.route("/stream")
+def stream():
+    """
+    text/event-stream of /status payloads (without remaining_time; the
+    client counts down to phase_ends_at, corrected by server_time).
+    """
+    try:
+        last = int(request.headers.get("Last-Event-ID", 0))
+    except ValueError:
+        last = 0
+    return Response(
+        broadcaster.stream(last),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
-    has_image = os.path.exists("static/latest_frame.jpg")
 
-    return jsonify(
+# -------------------------------------------------------
+# HISTORY (last 10 cycles of the controller's cycle log)
+# -------------------------------------------------------
+@app.route("/history")
+def history():
+    # served from the log's in-memory tail (or the state bus); cost does not grow with uptime
+    cycles = [
         {
-            "phase": ui_phase,
-            "remaining_time": remaining,
-            "green_time": green_time,
-            "vehicle_ns": count_ns,
-            "vehicle_ew": count_ew,
-            "has_image": has_image,
-            # Optional: expose load if you later show it in UI
-            # "load": load
+            "timestamp": row["timestamp"],
+            "phase": row["phase"],
+            "vehicle_ns": row["vehicle_count_ns"],
+            "vehicle_ew": row["vehicle_count_ew"],
+            "green_time": row["green_time"],
         }
-    )
+        for row in recent_cycles(10)
+    ]
+    return jsonify(cycles)
 
 
 # -------------------------------------------------------
-# HISTORY (last 10 rows of controller CSV)
+# METRICS (Prometheus text format)
 # -------------------------------------------------------
-@app.route("/history")
-def history():
-    # controller already writes to data/logs/cycles.csv
-    csv_path = "data/logs/cycles.csv"
-    if not os.path.exists(csv_path):
-        return jsonify([])
-
-    cycles = []
-    with open(csv_path, "r", newline="") as f:
-        reader = csv.DictReader(f)
-        rows = list(reader)
-        for row in rows[-10:]:
-            cycles.append(
-                {
-                    "timestamp": row["timestamp"],
-                    "phase": row["phase"],
-                    "vehicle_ns": row["vehicle_count_ns"],
-                    "vehicle_ew": row["vehicle_count_ew"],
-                    "green_time": row["green_time"],
-                }
-            )
+@app.route("/metrics")
+def metrics():
+    """
+    Stage latency histograms, frame ages and frame counters of the whole
+    pipeline: this worker, the controller (here or the authority's shared
+    copy) and the detector process, if running.
+    """
+    app_metrics.set("app_stream_subscribers", broadcaster.subscribers)
+    body = app_metrics.render(f'pid="{os.getpid()}"')
+    if controller_metrics is not None:
+        body += controller_metrics.render()
+    else:
+        body += render_shared("controller")
+    body += render_shared("detector")
+    return Response(body, mimetype="text/plain; version=0.0.4")
 
-    return jsonify(cycles)
+
+# -------------------------------------------------------
+# ANALYTICS (pre-aggregated rollups; never scans raw cycles)
+# -------------------------------------------------------
+def _window():
+    """
+    [start, end) from ?start= / ?end= as epoch seconds or ISO 8601
+    (default: the last 24 hours). Raises ValueError on bad input.
+    """
+    def parse(name, default):
+        value = request.args.get(name)
+        if value is None:
+            return default
+        try:
+            return float(value)
+        except ValueError:
+            return datetime.fromisoformat(value).timestamp()
+
+    end = parse("end", time.time())
+    start = parse("start", end - 86400)
+    if start >= end:
+        raise ValueError("start must be before end")
+    return start, end
+
+
+def _analytics(query):
+    started = time.perf_counter()
+    try:
+        body = query()
+    except (KeyError, ValueError, OverflowError, OSError) as e:
+        # OverflowError / OSError: timestamps outside the platform's date range
+        return jsonify({"error": str(e)}), 400
+    body["query_ms"] = round(1000 * (time.perf_counter() - started), 3)
+    return jsonify(body)
+
+
+@app.route("/analytics/summary")
+def analytics_summary():
+    """Cycles, vehicles, average green per phase / load category and percentiles of a window."""
+    return _analytics(lambda: rollups.summary(*_window()))
+
+
+@app.route("/analytics/series")
+def analytics_series():
+    """?step=minute|hour|day buckets of a window."""
+    def query():
+        start, end = _window()
+        step = request.args.get("step", "hour")
+        if step not in STEPS:
+            raise ValueError(f"step must be one of {sorted(STEPS)}")
+        if (end - start) / (60 * STEPS[step]) > ANALYTICS_MAX_BUCKETS:
+            raise ValueError(f"more than {ANALYTICS_MAX_BUCKETS} buckets; use a coarser step")
+        return {"step": step, "buckets": rollups.series(start, end, step)}
+    return _analytics(query)
+
+
+@app.route("/analytics/peaks")
+def analytics_peaks():
+    """?step=hour|day&top=N busiest buckets of a window."""
+    def query():
+        start, end = _window()
+        step = request.args.get("step", "hour")
+        if step not in ("hour", "day"):
+            raise ValueError("step must be hour or day")
+        top = int(request.args.get("top", 5))
+        if not 1 <= top <= ANALYTICS_MAX_TOP:
+            raise ValueError(f"top must be between 1 and {ANALYTICS_MAX_TOP}")
+        return {"step": step, "peaks": rollups.peaks(start, end, step, top)}
+    return _analytics(query)
 
 
 # -------------------------------------------------------
@@ -145,16 +301,18 @@ def history():
 @app.route("/image")
 def image():
     """
-    Expects your capture script to keep writing a frame to:
-      static/latest_frame.jpg
+    Serves the newest frame published by the detector (or the capture
+    script) through shared memory; it is encoded once per new frame.
     """
-    img_path = "static/latest_frame.jpg"
-    if os.path.exists(img_path):
-        return send_file(img_path, mimetype="image/jpeg")
-    return ("", 404)
+    jpeg = frames.latest_jpeg()
+    if jpeg is None:
+        return ("", 404)
+    return Response(jpeg, mimetype="image/jpeg")
 
 
 # -------------------------------------------------------
 if __name__ == "__main__":
-    # debug=True for development
-    app.run(host="0.0.0.0", port=5000, debug=True)
+    # debug=True for development; no reloader, since the reloader's watcher
+    # process would run a second controller timeline of its own.
+    # Production / several workers: gunicorn -c gunicorn.conf.py
+    app.run(host="0.0.0.0", port=5000, debug=True, use_reloader=False)
@@ -0,0 +1,208 @@
+import sys
+import time
+from collections import deque
+
+from cctv_image_capture import CAMERA_INDEX, CaptureWorker
+from count_bus import CountBus, camera_bus_name
+from lane_map import LaneMap
+from motion_gate import InferenceGate
+from vehicle_detection import cache, count_vehicles_batch, detector
+
+BATCH_SIZE = 8           # frames per YOLO call
+TICK_SECONDS = 1.0       # frame deadline: one round over all cameras per tick
+STATS_WINDOW = 30        # batches kept for the latency/throughput report
+
+
+class CameraSource:
+    """
+    One camera. Its device is kept open by a CaptureWorker and read() takes
+    the newest raw frame from memory (None if no new frame arrived since the
+    last tick, or if the motion gate says the scene has not changed).
+    Lanes come from the camera's entry in the lane map file.
+    """
+
+    def __init__(self, name, device):
+        self.name = name
+        self.worker = CaptureWorker(device)
+        self.lane_map = LaneMap.load(name)
+        self.gate = InferenceGate()
+        self.capture_ts = None
+
+    def start(self):
+        self.worker.start()
+
+    def read(self):
+        item = self.worker.frames.get(timeout=0)
+        if item is None:
+            return None
+        frame, capture_ts = item
+        if not self.gate.should_infer(frame, capture_ts):
+            return None
+        self.capture_ts = capture_ts
+        return frame
+
+
+class BatchStats:
+    """
+    Rolling per-batch latency and throughput, used to size BATCH_SIZE
+    against TICK_SECONDS.
+    """
+
+    def __init__(self, window=STATS_WINDOW):
+        self.batches = deque(maxlen=window)   # (frames, seconds)
+        self.total_batches = 0
+        self.total_frames = 0
+        self.deadline_misses = 0
+
+    def record(self, frames, seconds):
+        self.batches.append((frames, seconds))
+        self.total_batches += 1
+        self.total_frames += frames
+
+    def summary(self):
+        if not self.batches:
+            return {
+                "batches": 0,
+                "mean_ms": 0.0,
+                "p95_ms": 0.0,
+                "max_ms": 0.0,
+                "frames_per_sec": 0.0,
+                "deadline_misses": self.deadline_misses,
+            }
+
+        latencies = sorted(seconds for _, seconds in self.batches)
+        frames = sum(n for n, _ in self.batches)
+        busy = sum(latencies)
+        p95 = latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))]
+
+        return {
+            "batches": self.total_batches,
+            "mean_ms": 1000.0 * busy / len(latencies),
+            "p95_ms": 1000.0 * p95,
+            "max_ms": 1000.0 * latencies[-1],
+            "frames_per_sec": frames / busy if busy > 0 else 0.0,
+            "deadline_misses": self.deadline_misses,
+        }
+
+
+class BatchDetectionService:
+    """
+    Gathers the latest frame from every camera, runs them through YOLO in
+    batches of `batch_size` (one model call per batch) and fans the
+    per-approach counts back out per camera through `on_counts(name, counts)`.
+    """
+
+    def __init__(self, sources, batch_size=BATCH_SIZE, on_counts=None):
+        self.sources = list(sources)
+        self.batch_size = max(1, int(batch_size))
+        self.on_counts = on_counts
+        self.stats = BatchStats()
+
+    def gather(self):
+        ready = []
+        frames = []
+        for source in self.sources:
+            frame = source.read()
+            if frame is None:
+                continue
+            ready.append(source)
+            frames.append(frame)
+        return ready, frames
+
+    def tick(self):
+        """
+        Run one detection round over all cameras.
+        Returns {camera_name: {approach: vehicles}}.
+        """
+        ready, frames = self.gather()
+        counts = {}
+
+        for start in range(0, len(frames), self.batch_size):
+            batch_sources = ready[start:start + self.batch_size]
+            batch_frames = frames[start:start + self.batch_size]
+
+            t0 = time.perf_counter()
+            outputs = count_vehicles_batch(
+                batch_frames, [source.lane_map for source in batch_sources]
+            )
+            self.stats.record(len(batch_frames), time.perf_counter() - t0)
+
+            for source, (camera_counts, _detections) in zip(batch_sources, outputs):
+                counts[source.name] = camera_counts
+                if self.on_counts is not None:
+                    self.on_counts(source.name, camera_counts)
+
+        return counts
+
+    def run(self, tick_seconds=TICK_SECONDS):
+        while True:
+            started = time.monotonic()
+            counts = self.tick()
+            elapsed = time.monotonic() - started
+
+            if elapsed > tick_seconds:
+                self.stats.deadline_misses += 1
+
+            s = self.stats.summary()
+            print(
+                f"[batch] cameras={len(counts)}/{len(self.sources)} "
+                f"tick={elapsed * 1000:.0f}ms "
+                f"batch mean={s['mean_ms']:.0f}ms p95={s['p95_ms']:.0f}ms "
+                f"throughput={s['frames_per_sec']:.1f} fps "
+                f"misses={s['deadline_misses']} "
+                f"cache hits={cache.hit_rate:.0%}"
+            )
+
+            time.sleep(max(0.0, tick_seconds - elapsed))
+
+
+class CountBusFanOut:
+    """
+    on_counts callback that publishes each camera's counts to its own
+    shared-memory count bus (see count_bus.camera_bus_name).
+    """
+
+    def __init__(self, sources):
+        self.sources = {source.name: source for source in sources}
+        self.buses = {}
+
+    def __call__(self, name, counts):
+        source = self.sources[name]
+        bus = self.buses.get(name)
+        if bus is None:
+            bus = CountBus.create(camera_bus_name(name), approaches=source.lane_map.names)
+            self.buses[name] = bus
+        bus.publish(counts, capture_ts=source.capture_ts)
+
+
+def parse_sources(args):
+    """
+    Cameras are given as name=device pairs on the command line, where device
+    is a camera index or a stream URL, e.g.
+      python batch_detection.py north=0 south=rtsp://10.0.0.12/stream1
+    """
+    sources = []
+    for arg in args:
+        name, sep, device = arg.partition("=")
+        if not sep or not name or not device:
+            raise ValueError(f"Expected name=device, got {arg!r}")
+        sources.append(CameraSource(name, int(device) if device.isdigit() else device))
+    return sources
+
+
+def main():
+    sources = parse_sources(sys.argv[1:]) or [CameraSource("cam0", CAMERA_INDEX)]
+    print(f"[batch] {len(sources)} camera(s), batch size {BATCH_SIZE}")
+
+    for source in sources:
+        source.start()
+
+    # load + warm the model while the cameras open
+    detector.warmup()
+
+    service = BatchDetectionService(sources, on_counts=CountBusFanOut(sources))
+    service.run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+import argparse
+import glob
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+
+from config import DETECTOR_INPUT_SIZE, DETECTOR_THREADS
+
+# -------------------------------------------------------
+# DETECTOR BACKEND BENCHMARK
+# -------------------------------------------------------
+# Runs every requested backend on the same frames, each in a fresh process
+# so "startup" includes importing its runtime and loading the model:
+#
+#   python bench_detector.py --backends ultralytics,onnx,openvino --frames data/frames
+#
+# --modes full,tiled also runs each backend through tiled_inference.py
+# (ROI crop, adaptive size, tiles) and reports the network pixels it spent
+# per frame next to the boxes it found.
+#
+# --frames is a directory of images or a video file; without it a few
+# synthetic frames are used (latency only, they contain no vehicles).
+
+CONF = 0.3
+IOU = 0.45
+
+
+def load_frames(source, limit):
+    if source is None:
+        rng = np.random.default_rng(0)
+        return [rng.integers(0, 255, (720, 1280, 3), dtype=np.uint8) for _ in range(limit)]
+    if os.path.isdir(source):
+        paths = sorted(p for ext in ("jpg", "jpeg", "png") for p in glob.glob(os.path.join(source, f"*.{ext}")))
+        return [cv2.imread(p) for p in paths[:limit]]
+    frames = []
+    cap = cv2.VideoCapture(source)
+    while len(frames) < limit:
+        ok, frame = cap.read()
+        if not ok:
+            break
+        frames.append(frame)
+    cap.release()
+    return frames
+
+
+def run_backend(name, frames, input_size, threads, repeat, mode="full"):
+    """Child process: startup, warmup and per-frame latency of one backend."""
+    t0 = time.perf_counter()
+    from detector_backend import make_backend
+    backend = make_backend(name, input_size=input_size, threads=threads)
+    backend.load()
+    startup = time.perf_counter() - t0
+
+    if mode == "tiled":
+        from lane_map import LaneMap
+        from tiled_inference import TiledDetector
+        tiler = TiledDetector(backend, LaneMap.load())
+        infer = lambda frame: tiler.detect(frame, CONF, IOU)
+        pixels = lambda: tiler.last_pixels
+    else:
+        infer = lambda frame: backend.infer([frame], CONF, IOU)[0]
+        pixels = lambda: backend.input_size ** 2
+
+    start = time.perf_counter()
+    backend.warmup()
+    warmup = time.perf_counter() - start
+
+    latencies = []
+    boxes = 0
+    spent = 0
+    for _ in range(repeat):
+        for frame in frames:
+            start = time.perf_counter()
+            b, _cls, _confs = infer(frame)
+            latencies.append(time.perf_counter() - start)
+            boxes += len(b)
+            spent += pixels()
+
+    latencies = np.array(latencies) * 1000.0
+    return {
+        "backend": name if mode == "full" else f"{name}/{mode}",
+        "startup_s": startup,
+        "warmup_s": warmup,
+        "first_ms": latencies[0],
+        "mean_ms": latencies.mean(),
+        "p50_ms": np.percentile(latencies, 50),
+        "p99_ms": np.percentile(latencies, 99),
+        "boxes_per_frame": boxes / len(latencies),
+        "mpx_per_frame": spent / len(latencies) / 1e6,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Detector backend startup and per-frame latency")
+    parser.add_argument("--backends", default="ultralytics,onnx,openvino", help="comma-separated backends")
+    parser.add_argument("--frames", default=None, help="directory of images or a video file")
+    parser.add_argument("--limit", type=int, default=50, help="frames to use")
+    parser.add_argument("--repeat", type=int, default=2, help="passes over the frames")
+    parser.add_argument("--size", type=int, default=DETECTOR_INPUT_SIZE)
+    parser.add_argument("--threads", type=int, default=DETECTOR_THREADS)
+    parser.add_argument("--modes", default="full", help="comma-separated: full, tiled")
+    args = parser.parse_args()
+
+    frames = load_frames(args.frames, args.limit)
+    if not frames:
+        raise SystemExit(f"[WARN] no frames read from {args.frames}")
+    print(f"[INFO] {len(frames)} frames {frames[0].shape[1]}x{frames[0].shape[0]}, "
+          f"input {args.size}, threads {args.threads or 'default'}")
+
+    print(f"{'backend':<18} {'startup s':>9} {'warmup s':>8} {'first ms':>8} "
+          f"{'mean ms':>8} {'p50 ms':>7} {'p99 ms':>7} {'boxes':>6} {'Mpx':>6}")
+    spawn = multiprocessing.get_context("spawn")
+    for name in args.backends.split(","):
+        for mode in args.modes.split(","):
+            with ProcessPoolExecutor(max_workers=1, mp_context=spawn) as pool:
+                try:
+                    r = pool.submit(run_backend, name, frames, args.size, args.threads,
+                                    args.repeat, mode).result()
+                except Exception as e:
+                    print(f"{name:<18} [WARN] skipped: {e}")
+                    continue
+            print(f"{r['backend']:<18} {r['startup_s']:>9.2f} {r['warmup_s']:>8.2f} {r['first_ms']:>8.1f} "
+                  f"{r['mean_ms']:>8.1f} {r['p50_ms']:>7.1f} {r['p99_ms']:>7.1f} "
+                  f"{r['boxes_per_frame']:>6.1f} {r['mpx_per_frame']:>6.2f}")
+
+
+if __name__ == "__main__":
+    main()
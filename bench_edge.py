@@ -0,0 +1,174 @@
+import argparse
+import http.client
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+
+# -------------------------------------------------------
+# EDGE RUNTIME VS MULTI-PROCESS: STARTUP AND MEMORY
+# -------------------------------------------------------
+# Starts each layout on the same video source and reports:
+#   ready  seconds from launch until /status answers with a counted frame
+#          (has_image), i.e. camera open, model warm, first inference done
+#   rss    summed VmRSS of every process of the layout after --settle s
+#   pss    summed proportional set size (shared libraries and shared
+#          memory counted once across the processes), where available
+#
+# Layouts:
+#   edge   python edge_runtime.py
+#   multi  vehicle_detection.py (headless) + app.py, the default deployment
+#   gunicorn  vehicle_detection.py + controller_service.py + gunicorn with
+#          --workers web workers
+#
+#   python bench_edge.py --source clip.mp4 --runs 3
+
+HOST = "127.0.0.1"
+PORT = 5098
+STARTUP_TIMEOUT = 120.0
+
+
+def _status(port):
+    conn = http.client.HTTPConnection(HOST, port, timeout=1)
+    try:
+        conn.request("GET", "/status")
+        res = conn.getresponse()
+        body = res.read()
+        return json.loads(body) if res.status == 200 else None
+    finally:
+        conn.close()
+
+
+def _wait_ready(port, procs, started):
+    deadline = started + STARTUP_TIMEOUT
+    while time.perf_counter() < deadline:
+        if any(p.poll() is not None for p in procs):
+            raise RuntimeError("a process exited during startup")
+        try:
+            status = _status(port)
+            if status is not None and status.get("has_image"):
+                return time.perf_counter() - started
+        except (OSError, http.client.HTTPException, ValueError):
+            pass
+        time.sleep(0.05)
+    raise RuntimeError("layout did not become ready")
+
+
+def _children():
+    """{pid: [child pids]} of every process visible in /proc."""
+    children = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                stat = f.read()
+        except OSError:
+            continue
+        ppid = int(stat.rsplit(")", 1)[1].split()[1])
+        children.setdefault(ppid, []).append(int(entry))
+    return children
+
+
+def _tree(pids):
+    children = _children()
+    todo, seen = list(pids), []
+    while todo:
+        pid = todo.pop()
+        seen.append(pid)
+        todo.extend(children.get(pid, []))
+    return seen
+
+
+def _memory_kb(pid):
+    """(VmRSS, Pss) of a process in KiB; Pss is None without smaps_rollup."""
+    rss = pss = None
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    rss = int(line.split()[1])
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                if line.startswith("Pss:"):
+                    pss = int(line.split()[1])
+    except OSError:
+        pass
+    return rss or 0, pss
+
+
+def _launch(layout, source, port, workers):
+    env = dict(os.environ, TRAFFIC_CAMERA=str(source), TRAFFIC_HEADLESS="1")
+    quiet = {"env": env, "stdout": subprocess.DEVNULL, "stderr": subprocess.DEVNULL}
+    if layout == "edge":
+        return [subprocess.Popen([sys.executable, "edge_runtime.py", "--host", HOST,
+                                  "--port", str(port)], **quiet)]
+
+    procs = [subprocess.Popen([sys.executable, "vehicle_detection.py"], **quiet)]
+    if layout == "multi":
+        code = f"import app; app.app.run(host='{HOST}', port={port}, threaded=True)"
+        procs.append(subprocess.Popen([sys.executable, "-c", code], **quiet))
+    else:
+        procs.append(subprocess.Popen([sys.executable, "controller_service.py"], **quiet))
+        env = dict(env, TRAFFIC_CONTROLLER="external", TRAFFIC_WORKERS=str(workers))
+        procs.append(subprocess.Popen(
+            [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "-b", f"{HOST}:{port}"],
+            **dict(quiet, env=env),
+        ))
+    return procs
+
+
+def _terminate(procs):
+    for p in procs:
+        if p.poll() is None:
+            p.send_signal(signal.SIGTERM)
+    for p in procs:
+        try:
+            p.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            p.kill()
+            p.wait()
+
+
+def measure(layout, source, settle, workers=1, port=PORT):
+    started = time.perf_counter()
+    procs = _launch(layout, source, port, workers)
+    try:
+        ready = _wait_ready(port, procs, started)
+        time.sleep(settle)
+        pids = _tree([p.pid for p in procs])
+        memory = [_memory_kb(pid) for pid in pids]
+    finally:
+        _terminate(procs)
+    pss = [p for _, p in memory]
+    return {
+        "ready_s": ready,
+        "processes": len(pids),
+        "rss_mb": sum(r for r, _ in memory) / 1024,
+        "pss_mb": sum(pss) / 1024 if None not in pss else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Startup time and memory: edge runtime vs multi-process")
+    parser.add_argument("--source", required=True, help="video file (or camera) every layout reads")
+    parser.add_argument("--layouts", default="edge,multi", help="comma-separated: edge, multi, gunicorn")
+    parser.add_argument("--workers", type=int, default=2, help="web workers of the gunicorn layout")
+    parser.add_argument("--runs", type=int, default=1, help="launches per layout (best ready time reported)")
+    parser.add_argument("--settle", type=float, default=10.0, help="seconds after ready before sampling memory")
+    args = parser.parse_args()
+
+    print(f"{'layout':<10}{'procs':>6}{'ready s':>9}{'RSS MB':>9}{'PSS MB':>9}")
+    for layout in args.layouts.split(","):
+        results = [measure(layout, args.source, args.settle, args.workers) for _ in range(args.runs)]
+        best = min(results, key=lambda r: r["ready_s"])
+        rss = max(r["rss_mb"] for r in results)
+        pss = best["pss_mb"]
+        print(f"{layout:<10}{best['processes']:>6}{best['ready_s']:>9.2f}{rss:>9.0f}"
+              f"{pss if pss is not None else float('nan'):>9.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+import argparse
+import http.client
+import multiprocessing
+import os
+import subprocess
+import sys
+import time
+
+# -------------------------------------------------------
+# /status LOAD TEST
+# -------------------------------------------------------
+# Starts one controller authority, then gunicorn with 1, 2, 4, ... workers
+# (and optionally the single-process dev server for comparison), hammers
+# /status from client processes over keep-alive connections and reports
+# requests/sec and latency percentiles per worker count.
+
+HOST = "127.0.0.1"
+PORT = 5099
+STARTUP_TIMEOUT = 30.0
+
+
+def _client(args):
+    """One client process: GET /status in a loop until the deadline."""
+    port, connections, deadline = args
+    conns = [http.client.HTTPConnection(HOST, port, timeout=10) for _ in range(connections)]
+    latencies = []
+    errors = 0
+    i = 0
+    while time.time() < deadline:
+        conn = conns[i % connections]
+        i += 1
+        start = time.perf_counter()
+        try:
+            conn.request("GET", "/status")
+            res = conn.getresponse()
+            res.read()
+            if res.status != 200:
+                errors += 1
+                continue
+        except (OSError, http.client.HTTPException):
+            errors += 1
+            conn.close()
+            continue
+        latencies.append(time.perf_counter() - start)
+    for conn in conns:
+        conn.close()
+    return latencies, errors
+
+
+def _wait_ready(port, proc):
+    deadline = time.time() + STARTUP_TIMEOUT
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError("server exited during startup")
+        try:
+            conn = http.client.HTTPConnection(HOST, port, timeout=1)
+            conn.request("GET", "/status")
+            if conn.getresponse().status == 200:
+                return
+        except OSError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError("server did not become ready")
+
+
+def _percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+def run_load(port, clients, connections, duration):
+    deadline = time.time() + duration
+    with multiprocessing.Pool(clients) as pool:
+        results = pool.map(_client, [(port, connections, deadline)] * clients)
+    latencies = sorted(l for lat, _ in results for l in lat)
+    errors = sum(e for _, e in results)
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": len(latencies) / duration,
+        "p50_ms": 1000 * _percentile(latencies, 0.50),
+        "p99_ms": 1000 * _percentile(latencies, 0.99),
+    }
+
+
+def _server(label, workers, port):
+    env = dict(os.environ)
+    if label == "dev":
+        # single process, controller in-process, werkzeug threaded server
+        code = f"import app; app.app.run(host='{HOST}', port={port}, threaded=True)"
+        return subprocess.Popen([sys.executable, "-c", code], env=env,
+                                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    env.update(TRAFFIC_CONTROLLER="external", TRAFFIC_WORKERS=str(workers))
+    return subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "-b", f"{HOST}:{port}"],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="/status throughput and latency vs worker count")
+    parser.add_argument("--workers", default="1,2,4", help="comma-separated worker counts")
+    parser.add_argument("--clients", type=int, default=4, help="client processes")
+    parser.add_argument("--connections", type=int, default=8, help="keep-alive connections per client")
+    parser.add_argument("--duration", type=float, default=5.0, help="seconds per run")
+    parser.add_argument("--dev", action="store_true", help="also measure the single-process dev server")
+    args = parser.parse_args()
+
+    runs = [("dev", 1)] if args.dev else []
+    runs += [("gunicorn", int(w)) for w in args.workers.split(",")]
+
+    service = subprocess.Popen([sys.executable, "controller_service.py"],
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        print(f"{'server':<10}{'workers':>8}{'req/s':>10}{'p50 ms':>9}{'p99 ms':>9}{'errors':>8}")
+        for label, workers in runs:
+            proc = _server(label, workers, PORT)
+            try:
+                _wait_ready(PORT, proc)
+                r = run_load(PORT, args.clients, args.connections, args.duration)
+            finally:
+                proc.terminate()
+                proc.wait(timeout=10)
+            print(f"{label:<10}{workers:>8}{r['rps']:>10.0f}{r['p50_ms']:>9.2f}"
+                  f"{r['p99_ms']:>9.2f}{r['errors']:>8}")
+    finally:
+        service.terminate()
+        service.wait(timeout=10)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,34 +1,112 @@
-import cv2
-import time
 import os
+import threading
+import time
+from collections import deque
+
+import cv2
+
+from frame_bus import FrameBus
+
+# change if needed (or an RTSP / video URL); TRAFFIC_CAMERA overrides it,
+# e.g. with a recorded clip for bench_edge.py
+CAMERA_INDEX = os.environ.get("TRAFFIC_CAMERA", "0")
+CAMERA_INDEX = int(CAMERA_INDEX) if CAMERA_INDEX.isdigit() else CAMERA_INDEX
+REOPEN_DELAY = 2.0          # seconds before retrying a lost camera
+
+
+class LatestFrameQueue:
+    """
+    Bounded in-memory frame queue with latest-frame-wins semantics.
+    put() never blocks (the oldest frame is dropped when full) and get()
+    hands out the newest frame, discarding anything older.
+    """
+
+    def __init__(self, maxsize=2):
+        self._items = deque(maxlen=maxsize)
+        self._cond = threading.Condition()
+        self.dropped = 0
+
+    def put(self, frame, capture_ts):
+        with self._cond:
+            if len(self._items) == self._items.maxlen:
+                self.dropped += 1
+            self._items.append((frame, capture_ts))
+            self._cond.notify_all()
+
+    def get(self, timeout=None):
+        """Return (frame, capture_ts), or None if nothing arrived in time."""
+        with self._cond:
+            if not self._items and not self._cond.wait_for(lambda: self._items, timeout):
+                return None
+            item = self._items.pop()
+            self.dropped += len(self._items)
+            self._items.clear()
+            return item
+
+
+class CaptureWorker(threading.Thread):
+    """
+    Keeps the capture device open and pushes raw frames into `frames`.
+    The device is only reopened after a read failure.
+    """
+
+    def __init__(self, source=CAMERA_INDEX, frames=None, interval=0.0):
+        super().__init__(name="capture", daemon=True)
+        self.source = source
+        self.frames = frames if frames is not None else LatestFrameQueue()
+        self.interval = interval
+        self.captured = 0
+        self._stopped = threading.Event()
+
+    def stop(self):
+        self._stopped.set()
+
+    def run(self):
+        cap = None
+        while not self._stopped.is_set():
+            if cap is None:
+                cap = cv2.VideoCapture(self.source)
+                if not cap.isOpened():
+                    print("Error: Could not open camera.")
+                    cap.release()
+                    cap = None
+                    self._stopped.wait(REOPEN_DELAY)
+                    continue
 
+            ret, frame = cap.read()
+            if not ret:
+                print("Error: Could not read frame from camera. Reopening...")
+                cap.release()
+                cap = None
+                self._stopped.wait(REOPEN_DELAY)
+                continue
 
-def capture_image(camera_index, output_path):
-    cap = cv2.VideoCapture(camera_index)
-    if not cap.isOpened():
-        print("Error: Could not open camera.")
-        return
+            self.frames.put(frame, time.time())
+            self.captured += 1
 
-    ret, frame = cap.read()
-    if not ret:
-        print("Error: Could not read frame from camera.")
-        cap.release()
-        return
+            if self.interval:
+                self._stopped.wait(self.interval)
 
-    cv2.imwrite(output_path, frame)
-    cap.release()
-    print("Image captured and saved as", output_path)
+        if cap is not None:
+            cap.release()
 
 
 def main():
-    camera_index = 0          # change if needed
-    interval_seconds = 5      # capture every 5 seconds
+    # Preview-only setups (no detector running): keep the camera open and
+    # publish raw frames for the dashboard. vehicle_detection.py owns the
+    # camera itself when it runs.
+    interval_seconds = 5      # publish every 5 seconds
 
-    os.makedirs("static", exist_ok=True)
-    output_path = "static/latest_frame.jpg"   # <<< must match app.py
+    worker = CaptureWorker(CAMERA_INDEX)
+    worker.start()
+    bus = FrameBus.create()
 
     while True:
-        capture_image(camera_index, output_path)
+        item = worker.frames.get(timeout=interval_seconds)
+        if item is not None:
+            frame, capture_ts = item
+            bus.publish(frame, capture_ts)
+            print("Frame captured and published")
         time.sleep(interval_seconds)
 
 
@@ -22,3 +22,138 @@ PEAK_EVENING = (17, 20)   # 17:00–20:59
 PEAK_MULTIPLIER_NS = 1.5  # NS boosts more in peak
 PEAK_MULTIPLIER_EW = 1.2
 NIGHT_MULTIPLIER = 0.7    # shorter greens at night
+
+# Lane / ROI map (see lane_map.py). Polygons are in normalized image
+# coordinates (x, y in 0..1) so one map fits every camera resolution.
+# Per-camera maps can be given in LANE_MAP_PATH as JSON:
+#   {"cam0": {"N": [[x, y], ...], "S": [...], "E": [...], "W": [...]}}
+LANE_MAP_PATH = "data/lanes.json"
+DEFAULT_LANES = {
+    "NS": [(0.0, 0.0), (1.0, 0.0), (1.0, 0.5), (0.0, 0.5)],   # upper half
+    "EW": [(0.0, 0.5), (1.0, 0.5), (1.0, 1.0), (0.0, 1.0)],   # lower half
+}
+
+# Approaches served by each green phase, e.g. {"NS": ("N", "S"), "EW": ("E", "W")}
+PHASE_APPROACHES = {
+    "NS": ("NS",),
+    "EW": ("EW",),
+}
+
+# Phase ring (see phase_ring.py): the green phases in service order, each
+# with the approaches it serves and its own timing. Keys left out fall back
+# to the globals above (base -> BASE_GREEN_NS, min / max -> MIN_GREEN /
+# MAX_GREEN, yellow / all_red -> YELLOW_TIME / ALL_RED_TIME,
+# peak_multiplier -> 1.0). "on_call": True phases (e.g. pedestrians) are
+# only served when they have demand. A protected-left + pedestrian ring:
+#   [{"name": "NS", "approaches": ("N", "S")},
+#    {"name": "NS_LEFT", "approaches": ("NL", "SL"), "base": 10, "min": 6},
+#    {"name": "EW", "approaches": ("E", "W")},
+#    {"name": "PED", "approaches": ("PED",), "base": 12, "min": 12, "on_call": True}]
+PHASE_RING = [
+    {"name": "NS", "approaches": PHASE_APPROACHES["NS"],
+     "base": BASE_GREEN_NS, "peak_multiplier": PEAK_MULTIPLIER_NS},
+    {"name": "EW", "approaches": PHASE_APPROACHES["EW"],
+     "base": BASE_GREEN_EW, "peak_multiplier": PEAK_MULTIPLIER_EW},
+]
+
+# Corridor coordination (see corridor.py)
+CORRIDOR_MIN_CYCLE = 60          # common cycle bounds (seconds)
+CORRIDOR_MAX_CYCLE = 150
+CORRIDOR_DESIGN_SPEED = 13.9     # m/s (50 km/h) until speeds are observed
+CORRIDOR_SPEED_SMOOTHING = 0.2   # weight of each new speed observation
+
+# Signal-timing policy (see policies.py): "linear", "webster", "max_pressure"
+# or "queue_clearance". Can be swapped at runtime with
+# TrafficController.set_policy().
+TIMING_POLICY = "linear"
+DECISION_BUDGET = 0.002          # seconds a policy may take per decision
+SATURATION_FLOW = 1800           # veh/h of green per phase, used by the models
+STARTUP_LOST_TIME = 2            # seconds lost at the start of each green
+
+# Timing plan (see timing_plan.py): the timing values above, overridden by
+# the JSON object in TIMING_PLAN_PATH (same names, e.g. {"PER_VEHICLE": 2}).
+# The controller re-reads the file when it changes, so a new plan applies
+# at the next decision without a restart.
+TIMING_PLAN_PATH = "data/timing.json"
+TIMING_PLAN_RELOAD_INTERVAL = 2.0   # seconds between checks of the file
+
+# Priority / preemption (see preempt.py): requests arrive as UDP datagrams
+# on PREEMPT_ADDRESS, from the detector (PRIORITY_CLASS_IDS seen in a lane)
+# or external systems. An interrupted green runs at least PREEMPT_MIN_GREEN
+# (emergency) before its yellow and all-red.
+PREEMPT_ADDRESS = ("127.0.0.1", 47800)
+PREEMPT_MIN_GREEN = 5            # seconds
+PREEMPT_GREEN = 20               # priority green; repeated requests hold it up to max green
+PREEMPT_RESEND = 2.0             # detector repeats a request this often while in view
+TRANSIT_PRIORITY_COOLDOWN = 120  # seconds between transit priority greens of one phase
+# detector class id -> "transit" or "emergency" (5 = COCO bus; add the ids
+# of a custom model's emergency-vehicle classes as "emergency")
+PRIORITY_CLASS_IDS = {5: "transit"}
+PRIORITY_MIN_CONF = 0.5
+
+# Demand forecasting (see forecast.py) is EXPERIMENTAL, not a supported
+# feature: per weekday/hour arrival profiles learned online from logged
+# cycles, used for time-of-day multipliers and arrival rates once a profile
+# bin has FORECAST_MIN_SAMPLES observations. On the bundled simulator
+# scenarios it gives longer delays than the fixed peak / night profile for
+# every policy (python simulator.py --forecast to compare), so it stays off
+# until a model beats that baseline.
+FORECAST_ENABLED = False
+FORECAST_SEASON_ALPHA = 0.2      # weight of a new observation in its weekday/hour bin
+FORECAST_LEVEL_ALPHA = 0.3       # weight of the latest observed/profile ratio
+FORECAST_MIN_SAMPLES = 3
+FORECAST_HORIZON_CYCLES = 2      # cycles ahead reported to the timing policy
+FORECAST_HISTORY_DAYS = 28       # cycle log replayed at startup
+
+# Detector backend (see detector_backend.py): "ultralytics" runs the .pt
+# weights through PyTorch; "onnx" / "openvino" run a model exported once
+# with `python detector_backend.py --export onnx|openvino` at a fixed
+# DETECTOR_INPUT_SIZE. The model is loaded and warmed up lazily, or
+# explicitly at detector startup.
+DETECTOR_BACKEND = "ultralytics"
+DETECTOR_WEIGHTS = "yolov8n.pt"
+DETECTOR_ONNX_PATH = "yolov8n.onnx"
+DETECTOR_OPENVINO_PATH = "yolov8n_openvino_model"
+DETECTOR_INPUT_SIZE = 640        # square network input (pixels)
+DETECTOR_THREADS = 0             # CPU inference threads; 0 = runtime default
+DETECTOR_WARMUP_RUNS = 2         # blank frames run before the first real one
+
+# Tiled inference for high-resolution cameras (see tiled_inference.py):
+# crop each frame to the lane map's ROI, run it at an input size picked per
+# camera from DETECTOR_INPUT_SIZES, and re-run at native resolution only
+# the TILE_SIZE tiles where small (distant) vehicles are seen.
+TILED_INFERENCE = False
+DETECTOR_INPUT_SIZES = (320, 480, 640, 960, 1280)   # adaptive size ladder
+ROI_MARGIN = 0.02                # ROI grown by this fraction of the frame
+TILE_SIZE = 640                  # tile side in frame pixels
+TILE_OVERLAP = 0.2               # fraction of a tile shared with its neighbour
+MIN_OBJECT_PX = 24               # boxes smaller than this at network scale are "small"
+TILE_REFRESH_FRAMES = 30         # every Nth frame refines every tile
+
+# Content-addressed cache of detector results (see detection_cache.py):
+# bit-identical frames are inferred once
+DETECTION_CACHE_SIZE = 256       # frames kept (LRU); 0 disables the cache
+
+# Cycle rollups (see rollups.py): minute / hour / day aggregates of the
+# cycle log behind the /analytics endpoints
+ROLLUP_DIR = "data/rollups"
+ROLLUP_MINUTE_RETENTION_DAYS = 35
+ROLLUP_SKETCH_GAMMA = 1.08       # sketch bin growth; percentiles within 8 %
+
+# Offline replay counting of recorded footage (see replay_detection.py)
+REPLAY_STRIDE_SECONDS = 1.0      # one counted sample per second of video
+REPLAY_SEGMENT_SECONDS = 300     # shard length handed to one worker
+REPLAY_WORKERS = 0               # worker processes; 0 = one per core
+REPLAY_BATCH_SIZE = 8            # sampled frames per model call
+
+# Single-process edge runtime (see edge_runtime.py): capture, detection,
+# control and a minimal status server as threads of one process
+EDGE_PORT = 5000
+EDGE_MEMORY_BUDGET_MB = 768      # RSS cap; detection is throttled above it
+EDGE_MEMORY_GRACE = 6            # checks over budget before a clean exit (code 1)
+EDGE_MEMORY_CHECK_INTERVAL = 5.0 # seconds between RSS checks
+EDGE_FRAME_QUEUE = 1             # camera frames held for the detector
+EDGE_HTTP_CONNECTIONS = 8        # concurrent HTTP connections; more get 503
+EDGE_MAX_STREAMS = 4             # of those, /stream subscribers
+EDGE_HTTP_IDLE_TIMEOUT = 5.0     # seconds an idle keep-alive connection holds its slot
+EDGE_STREAM_WRITE_TIMEOUT = 30.0 # /stream: seconds a stalled client may block a write
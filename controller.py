@@ -1,181 +1,595 @@
-import time
-import csv
+import math
 import os
-from dataclasses import dataclass
+import time
+import threading
+from dataclasses import asdict, dataclass
 from enum import Enum
 import datetime as dt
 
 from config import (
-    BASE_GREEN_NS, BASE_GREEN_EW, PER_VEHICLE,
-    MIN_GREEN, MAX_GREEN,
-    YELLOW_TIME, ALL_RED_TIME,
-    PEAK_MORNING, PEAK_EVENING,
-    PEAK_MULTIPLIER_NS, PEAK_MULTIPLIER_EW,
-    NIGHT_MULTIPLIER
+    TIMING_POLICY, DECISION_BUDGET, TIMING_PLAN_PATH,
+    PREEMPT_MIN_GREEN, PREEMPT_GREEN, TRANSIT_PRIORITY_COOLDOWN,
+    FORECAST_ENABLED, FORECAST_HORIZON_CYCLES, FORECAST_HISTORY_DAYS,
+    ROLLUP_DIR,
 )
+from cycle_log import LOG_DIR, CycleLog
+from rollups import Rollups
+from forecast import DemandForecaster
+from phase_ring import ALL_RED, GREEN
+from policies import DecisionContext, LinearPolicy, make_policy
+from preempt import EMERGENCY, RANK, TRANSIT
+from timing_plan import TimingPlan, local_hours
 
-class Phase(Enum):
+class Phase(str, Enum):
+    """
+    Interval names of the default two-phase ring. Interval names are plain
+    strings (see phase_ring.py); the str mix-in keeps comparisons with them
+    working.
+    """
     NS_GREEN = "NS_GREEN"
     NS_YELLOW = "NS_YELLOW"
     ALL_RED = "ALL_RED"
     EW_GREEN = "EW_GREEN"
     EW_YELLOW = "EW_YELLOW"
 
+def load_category(total_count):
+    """FREE / LIGHT / MODERATE / HEAVY for the vehicles waiting at a junction."""
+    if total_count == 0:
+        return "FREE"
+    elif total_count <= 5:
+        return "LIGHT"
+    elif total_count <= 15:
+        return "MODERATE"
+    else:
+        return "HEAVY"
+
+class SystemClock:
+    """Wall clock. Simulations pass their own object with the same methods."""
+
+    def time(self):
+        return time.time()
+
+    def now(self):
+        return dt.datetime.now()
+
 @dataclass
 class PhaseState:
-    name: Phase
+    name: str             # interval name, e.g. "NS_GREEN" (== Phase.NS_GREEN)
     start_time: float
     duration: int
+    interval: int = 0     # index into the compiled PhaseRing tables
+
+@dataclass
+class Preempt:
+    """A priority request being served; see preempt.py."""
+    phase: str            # ring phase to serve
+    kind: str             # preempt.TRANSIT or preempt.EMERGENCY
+    requested_at: float   # when the request was sent (sender's clock)
+    received_at: float
+    deadline: float = 0.0       # latest start of the priority green, promised on arrival
+    served_at: float = None     # start of the priority green
+
+@dataclass
+class ControllerState:
+    """What /status and the dashboards read; see TrafficController.snapshot()."""
+    version: int
+    phase: str
+    ui_phase: str
+    started_at: float
+    ends_at: float
+    remaining: int
+    green_time: int
+    load: str
+    count_ns: int
+    count_ew: int
+    approaches: dict
+    queues: dict = None
+    flows: dict = None
+    phase_counts: dict = None    # demand per ring phase
+    plan: dict = None            # TimingPlan.stamp() of the plan in use
+    preempt: dict = None         # the priority request in progress, if any
 
 class TrafficController:
-    def __init__(self, log_path="data/logs/cycles.csv"):
+    def __init__(self, log_path="data/logs/cycles", clock=None, policy=None, ring=None, metrics=None,
+                 plan_path=TIMING_PLAN_PATH, forecast=None, rollup_dir=None):
+        """
+        log_path is the cycle log directory (see cycle_log.py);
+        log_path=None disables cycle logging (e.g. in simulation).
+        clock provides time() and now(); defaults to the wall clock.
+        policy is a policies.TimingPolicy or its name (default TIMING_POLICY).
+        ring is a compiled PhaseRing (default config.PHASE_RING).
+        metrics is a metrics.Metrics with CONTROLLER_METRICS, or None.
+        plan_path is the timing override file watched by reload_plan()
+        (see timing_plan.py); None uses config.py only.
+        forecast turns the demand forecaster on or off (default
+        FORECAST_ENABLED).
+        rollup_dir holds the /analytics rollups of the cycle log (default
+        ROLLUP_DIR for the default log, else a "rollups" directory inside
+        log_path, so a test or replay log never feeds the live rollups).
+        """
         self.log_path = log_path
+        self.clock = clock or SystemClock()
+        self.plan_path = plan_path
+        self._fixed_ring = ring
+        self._plan_mtime = self._plan_file_mtime()
+        try:
+            self.plan = TimingPlan.load(plan_path, ring=ring)
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            print(f"[WARN] Timing plan {plan_path} not applied: {e}; using config.py")
+            self.plan = TimingPlan(ring=ring)
+        self.policy = make_policy(policy or TIMING_POLICY)
+        self.fallback_policy = LinearPolicy()
+        self.decision_time = 0.0       # seconds the last policy call took
+        self.policy_overruns = 0       # decisions slower than DECISION_BUDGET
+        self.metrics = metrics
+        self.cycle_log = CycleLog(log_path) if log_path is not None else None
+        # minute / hour / day aggregates for /analytics, kept in step with the log
+        self.rollups = None
+        if self.cycle_log is not None:
+            if rollup_dir is None:
+                rollup_dir = ROLLUP_DIR if log_path == LOG_DIR else os.path.join(log_path, "rollups")
+            self.rollups = Rollups(rollup_dir, writable=True).catch_up(self.cycle_log)
 
-        os.makedirs(os.path.dirname(self.log_path), exist_ok=True)
-        if not os.path.exists(self.log_path):
-            with open(self.log_path, "w", newline="") as f:
-                writer = csv.writer(f)
-                writer.writerow([
-                    "timestamp",
-                    "phase",
-                    "vehicle_count_ns",
-                    "vehicle_count_ew",
-                    "green_time",
-                    "load_category"
-                ])
-
-        now = time.time()
+        ring = self.ring
+        now = self.clock.time()
+        first = ring.green_of[0]
         self.current_phase = PhaseState(
-            name=Phase.NS_GREEN,
+            name=ring.names[first],
             start_time=now,
-            duration=BASE_GREEN_NS
+            duration=ring.base[0],
+            interval=first
         )
-        self.last_green_duration = BASE_GREEN_NS
+        self.last_green_duration = ring.base[0]
+        self.last_green = ring.phases[0]
+        self.green_started = {ring.phases[0]: now}
+        self.last_cycle_s = sum(ring.base) + sum(self.plan.timing["lost"].values())
 
-    def _time_of_day_multiplier(self, phase: Phase):
-        hour = dt.datetime.now().hour
+        # latest demand per ring phase, refreshed by set_phase_counts() /
+        # set_counts() / set_approach_counts()
+        self.phase_demand = {p: 0 for p in ring.phases}
+        self.phase_queues = None
+        self.approach_counts = {}
+        self.approach_queues = None
+        self.approach_flows = None
+
+        # learned weekday/hour demand; bootstrapped once from the cycle log,
+        # then updated as each green ends
+        self.forecaster = None
+        if forecast is None:
+            forecast = FORECAST_ENABLED
+        if forecast:
+            self.forecaster = DemandForecaster(ring.phases)
+            if self.cycle_log is not None:
+                self.forecaster.train(self.cycle_log.range(now - FORECAST_HISTORY_DAYS * 86400))
+
+        # priority request being served (request_preempt()), and when each
+        # phase's last priority green ended
+        self.preempt = None
+        self.priority_ended = {}
 
-        # Night profile
-        if hour >= 22 or hour < 6:
-            return NIGHT_MULTIPLIER
+        # bumped on every phase change; guards state shared with the runner thread
+        self.version = 0
+        self._lock = threading.RLock()
+        if self.metrics is not None:
+            self.metrics.set("controller_plan_version", self.plan.version)
 
-        # Peak profiles
-        in_morning_peak = PEAK_MORNING[0] <= hour < PEAK_MORNING[1]
-        in_evening_peak = PEAK_EVENING[0] <= hour < PEAK_EVENING[1]
+    @property
+    def ring(self):
+        """Compiled PhaseRing of the timing plan in use."""
+        return self.plan.ring
+
+    # ---------------- timing plan ----------------
+    def _plan_file_mtime(self):
+        try:
+            return os.stat(self.plan_path).st_mtime_ns
+        except (TypeError, OSError):
+            return None
+
+    def reload_plan(self):
+        """
+        Rebuild the timing plan if its override file changed since the last
+        check (cheap: one stat). The new plan replaces the old one between
+        decisions; one that fails to load is reported and ignored. Returns
+        True if a new plan was swapped in.
+        """
+        mtime = self._plan_file_mtime()
+        if mtime == self._plan_mtime:
+            return False
+        self._plan_mtime = mtime
+        try:
+            plan = TimingPlan.load(self.plan_path, ring=self._fixed_ring, version=self.plan.version + 1)
+            if plan.ring.phases != self.ring.phases:
+                raise ValueError(f"phase ring {plan.ring.phases} differs from the running "
+                                 f"{self.ring.phases}; restart to change phases")
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            print(f"[WARN] Timing plan {self.plan_path} not applied: {e}")
+            if self.metrics is not None:
+                self.metrics.inc("controller_plan_errors_total")
+            return False
 
-        if in_morning_peak or in_evening_peak:
-            if phase == Phase.NS_GREEN:
-                return PEAK_MULTIPLIER_NS
-            elif phase == Phase.EW_GREEN:
-                return PEAK_MULTIPLIER_EW
+        with self._lock:
+            self.plan = plan
+        print(f"[INFO] Timing plan v{plan.version} ({plan.digest}) loaded from {plan.source or 'config.py'}")
+        if self.metrics is not None:
+            self.metrics.set("controller_plan_version", plan.version)
+        return True
 
-        return 1.0
+    # NS / EW views of the phase demand, for two-phase callers and the cycle log
+    @property
+    def count_ns(self):
+        return self.phase_demand.get("NS", 0)
+
+    @property
+    def count_ew(self):
+        return self.phase_demand.get("EW", 0)
+
+    @property
+    def queue_ns(self):
+        return self.phase_queues.get("NS", 0) if self.phase_queues is not None else None
+
+    @property
+    def queue_ew(self):
+        return self.phase_queues.get("EW", 0) if self.phase_queues is not None else None
+
+    def _learned_multiplier(self, k, ts):
+        if self.forecaster is None:
+            return None
+        return self.forecaster.multiplier(ts, self.ring.phases[k], self.plan.multiplier_range)
+
+    def _phase_multiplier(self, k, ts=None):
+        """
+        Time-of-day factor for ring phase k at epoch `ts`: learned from the
+        site's own demand once the forecaster knows this weekday/hour, else
+        the timing plan's fixed peak / night windows.
+        """
+        ts = self.clock.time() if ts is None else ts
+        return self.plan.row(k, local_hours.hour(ts), self._learned_multiplier(k, ts))[0]
+
+    def _time_of_day_multiplier(self, phase: Phase):
+        k = self.ring.index.get(getattr(phase, "value", phase).removesuffix("_GREEN"))
+        return self._phase_multiplier(k) if k is not None else 1.0
 
     def compute_green_time(self, phase: Phase, count_ns: int, count_ew: int):
-        if phase == Phase.NS_GREEN:
-            base = BASE_GREEN_NS
-            vehicles = count_ns
-        elif phase == Phase.EW_GREEN:
-            base = BASE_GREEN_EW
-            vehicles = count_ew
-        else:
+        """Linear green for the NS_GREEN / EW_GREEN interval (two-phase helper)."""
+        name = getattr(phase, "value", phase).removesuffix("_GREEN")
+        k = self.ring.index.get(name)
+        if k is None or name not in ("NS", "EW"):
             return 0
 
-        green = base + PER_VEHICLE * vehicles
-        green *= self._time_of_day_multiplier(phase)
-        green = int(max(MIN_GREEN, min(green, MAX_GREEN)))
-        return green
+        vehicles = count_ns if name == "NS" else count_ew
+        ts = self.clock.time()
+        return self.plan.green(k, local_hours.hour(ts), vehicles, self._learned_multiplier(k, ts))
 
     def categorize_load(self, total_count):
-        if total_count == 0:
-            return "FREE"
-        elif total_count <= 5:
-            return "LIGHT"
-        elif total_count <= 15:
-            return "MODERATE"
+        return load_category(total_count)
+
+    def next_decision_at(self):
+        """
+        Time at which the next green is chosen and sized (end of the coming
+        ALL_RED), i.e. when fresh counts matter most.
+        """
+        return self.next_transition_at() + self.ring.to_decision[self.current_phase.interval]
+
+    def phase_counts(self, counts):
+        """
+        Sum per-approach counts ({approach: vehicles}) into NS/EW phase
+        demand using the phase ring's approaches.
+        """
+        sums = self.ring.phase_sums(counts)
+        return sums.get("NS", 0), sums.get("EW", 0)
+
+    def set_phase_counts(self, counts, queues=None):
+        """
+        Latest demand per ring phase ({phase: vehicles}), used at the next
+        transition. queues are tracked stopped-vehicle queues; when given
+        they size the greens instead of the instantaneous box counts.
+        """
+        with self._lock:
+            self.phase_demand = {p: counts.get(p, 0) for p in self.ring.phases}
+            self.phase_queues = (
+                {p: queues.get(p, 0) for p in self.ring.phases} if queues is not None else None
+            )
+
+    def set_counts(self, count_ns: int, count_ew: int, queue_ns=None, queue_ew=None):
+        """set_phase_counts() for the two-phase NS / EW ring."""
+        queues = None
+        if queue_ns is not None or queue_ew is not None:
+            queues = {"NS": queue_ns or 0, "EW": queue_ew or 0}
+        self.set_phase_counts({"NS": count_ns, "EW": count_ew}, queues)
+
+    def set_approach_counts(self, counts, queues=None, flows=None):
+        """set_phase_counts() from per-approach counts (and tracker queues / flows)."""
+        with self._lock:
+            self.approach_counts = dict(counts)
+            self.approach_queues = queues
+            self.approach_flows = flows
+            self.set_phase_counts(
+                self.ring.phase_sums(counts),
+                self.ring.phase_sums(queues) if queues is not None else None,
+            )
+
+    def update_approaches(self, counts, queues=None):
+        """
+        update_phase() fed with per-approach counts from the lane map and,
+        when the tracker runs, per-approach queue lengths.
+        """
+        self.set_approach_counts(counts, queues)
+        self.advance()
+        state = self.snapshot()
+        return state.ui_phase, state.remaining, state.green_time, state.load
+
+    def set_policy(self, policy):
+        """Swap the timing policy; it takes over at the next decision."""
+        policy = make_policy(policy)
+        with self._lock:
+            self.policy = policy
+        print(f"[INFO] Timing policy: {policy.name}")
+
+    # ---------------- priority / preemption ----------------
+    def request_preempt(self, approach, kind=EMERGENCY, sent_at=None):
+        """
+        Serve the phase of `approach` (or a phase name) as soon as safely
+        possible: a conflicting green ends once it has run PREEMPT_MIN_GREEN
+        (emergency) or its min green (transit), then its yellow and all-red
+        run and the requested phase gets PREEMPT_GREEN, bypassing the timing
+        policy. Repeated requests hold the priority green, up to max green.
+        A lower (or, until served, equal) kind for another phase is ignored;
+        the sender repeats it. Returns the Preempt, or None if ignored.
+        """
+        with self._lock:
+            ring = self.ring
+            now = self.clock.time()
+            k = ring.index.get(approach)
+            if k is None:
+                k = next((k for k, served in enumerate(ring.approaches) if approach in served), None)
+            if k is None:
+                print(f"[WARN] Ignoring {kind} preempt for unknown approach {approach!r}")
+                return None
+            phase = ring.phases[k]
+
+            current = self.preempt
+            if current is not None and current.phase != phase:
+                if RANK[kind] < RANK[current.kind] or \
+                        (RANK[kind] == RANK[current.kind] and current.served_at is None):
+                    return None
+                # takes over: a running priority green ends after its minimum
+                self.priority_ended[current.phase] = now
+                current = None
+            if current is None:
+                if kind == TRANSIT and now - self.priority_ended.get(phase, -math.inf) < TRANSIT_PRIORITY_COOLDOWN:
+                    return None
+                current = self.preempt = Preempt(phase, kind, sent_at or now, now)
+            elif RANK[kind] > RANK[current.kind]:
+                current.kind = kind
+            self._apply_preempt(now)
+            self.version += 1
+            return current
+
+    def _apply_preempt(self, now):
+        ring = self.ring
+        p = self.preempt
+        k = ring.index[p.phase]
+        state = self.current_phase
+        i = state.interval
+
+        if ring.kind[i] == GREEN and ring.phase_of[i] == k:
+            # already green: hold it for PREEMPT_GREEN from now
+            if p.served_at is None:
+                p.deadline = now
+                self._priority_served(p, now)
+            hold = math.ceil(now - state.start_time + PREEMPT_GREEN)
+            state.duration = max(state.duration, min(hold, ring.max_green[k]))
+        elif ring.kind[i] == GREEN:
+            cur = ring.phase_of[i]
+            minimum = PREEMPT_MIN_GREEN if p.kind == EMERGENCY else ring.min_green[cur]
+            state.duration = min(state.duration, max(now - state.start_time, minimum))
+            p.deadline = state.start_time + state.duration + ring.yellow[cur] + ring.all_red[cur]
         else:
-            return "HEAVY"
+            # yellow / all-red already running: the next decision is the priority green
+            p.deadline = self.next_transition_at() + ring.to_decision[i]
+
+    def _priority_served(self, p, at):
+        p.served_at = at
+        wait = at - p.requested_at
+        if self.metrics is not None:
+            self.metrics.inc("controller_preempts_total")
+            self.metrics.observe("controller_preempt_service_seconds", max(0.0, wait))
+        late = at > p.deadline + 1e-3 and p.deadline > 0
+        print(f"[{'WARN' if late else 'INFO'}] {p.kind} priority green for {p.phase}, "
+              f"{wait:.2f} s after the request (bound {max(p.deadline, at) - p.received_at:.2f} s)")
+
+    def decision_context(self, now):
+        plan = self.plan
+        ring = plan.ring
+        queues = self.phase_queues
+        demand = self.phase_demand if queues is None else queues
+        forecast = None
+        arrivals = None
+        if self.forecaster is not None:
+            forecast = self.forecaster.forecast(now, FORECAST_HORIZON_CYCLES * self.last_cycle_s)
+            if forecast is not None:
+                arrivals = {p: self.forecaster.rate(now, p) for p in ring.phases}
+        if self.approach_flows is not None:
+            # measured flows beat the forecast
+            arrivals = {p: f / 60.0 for p, f in ring.phase_sums(self.approach_flows).items()}
+
+        # on-call phases (e.g. pedestrians) only compete when called
+        phases = tuple(
+            p for k, p in enumerate(ring.phases) if not ring.on_call[k] or demand[p] > 0
+        ) or ring.phases
+
+        # the plan's green rows for this hour, or for the learned multiplier
+        # where the forecaster replaces the fixed one
+        hour = local_hours.hour(now)
+        multiplier = {}
+        greens = {}
+        for k, p in enumerate(ring.phases):
+            multiplier[p], greens[p] = plan.row(k, hour, self._learned_multiplier(k, now))
+
+        return DecisionContext(
+            now=now,
+            phases=phases,
+            demand=dict(demand),
+            counts=dict(self.phase_demand),
+            queues=dict(queues) if queues is not None else None,
+            arrivals=arrivals,
+            multiplier=multiplier,
+            greens=greens,
+            current=self.last_green,
+            cycle_s=self.last_cycle_s,
+            forecast=forecast,
+            **plan.timing,
+        )
+
+    def _ask_policy(self, method, ctx, *args):
+        """
+        Call a policy method, timed against DECISION_BUDGET; a policy that
+        raises is replaced by the linear rule for this decision.
+        """
+        start = time.perf_counter()
+        try:
+            result = getattr(self.policy, method)(ctx, *args)
+        except Exception as e:
+            print(f"[WARN] Policy {self.policy.name} failed ({e}); using linear")
+            result = getattr(self.fallback_policy, method)(ctx, *args)
+        self.decision_time = time.perf_counter() - start
+        if self.metrics is not None:
+            self.metrics.observe("controller_decision_seconds", self.decision_time)
+        if self.decision_time > DECISION_BUDGET:
+            self.policy_overruns += 1
+            if self.metrics is not None:
+                self.metrics.inc("controller_policy_overruns_total")
+            print(f"[WARN] Policy {self.policy.name} took {1000 * self.decision_time:.1f} ms")
+        return result
 
     def log_cycle(self, phase: Phase, count_ns: int, count_ew: int, green_time: int):
-        if phase not in (Phase.NS_GREEN, Phase.EW_GREEN):
+        name = getattr(phase, "value", phase)
+        if not name.endswith("_GREEN"):
             return  # log only full green phases
+        if self.cycle_log is None:
+            return
 
         total = count_ns + count_ew
         load = self.categorize_load(total)
-        ts = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())
-        with open(self.log_path, "a", newline="") as f:
-            writer = csv.writer(f)
-            writer.writerow([ts, phase.value, count_ns, count_ew, green_time, load])
+        # queued only; the log's writer thread batches rows to disk
+        ts = self.clock.time()
+        self.cycle_log.append(name, count_ns, count_ew, green_time, load, ts=ts)
+        if self.rollups is not None:
+            self.rollups.add(ts, name, count_ns, count_ew, green_time, load)
 
-    def update_phase(self, count_ns: int, count_ew: int):
+    # ---------------- tick-driven core ----------------
+    def next_transition_at(self):
+        """Exact clock time at which the current phase ends."""
+        return self.current_phase.start_time + self.current_phase.duration
+
+    def _enter(self, interval, at, duration):
+        self.current_phase = PhaseState(
+            name=self.ring.names[interval],
+            start_time=at,
+            duration=duration,
+            interval=interval
+        )
+
+    def _transition(self, at):
         """
-        Call regularly. Returns (phase_name_for_ui, remaining_time, green_time, load_category).
-        phase_name_for_ui: "NS", "EW", or "YELLOW/ALL_RED".
+        Leave (or extend) the current interval at time `at` (its exact
+        deadline), using the compiled ring tables only.
         """
-        now = time.time()
-        elapsed = now - self.current_phase.start_time
+        ring = self.ring
+        state = self.current_phase
+        i = state.interval
+        kind = ring.kind[i]
 
-        # compute remaining first
-        if elapsed < self.current_phase.duration:
-            remaining = int(self.current_phase.duration - elapsed)
-        else:
-            # phase ended -> transition
-            phase = self.current_phase.name
-
-            if phase == Phase.NS_GREEN:
-                self.log_cycle(phase, count_ns, count_ew, self.current_phase.duration)
-                self.current_phase = PhaseState(
-                    name=Phase.NS_YELLOW,
-                    start_time=now,
-                    duration=YELLOW_TIME
-                )
-            elif phase == Phase.NS_YELLOW:
-                self.current_phase = PhaseState(
-                    name=Phase.ALL_RED,
-                    start_time=now,
-                    duration=ALL_RED_TIME
-                )
-            elif phase == Phase.ALL_RED:
-                # choose next green based on queues
-                if count_ns >= count_ew:
-                    next_phase = Phase.NS_GREEN
-                else:
-                    next_phase = Phase.EW_GREEN
-                green = self.compute_green_time(next_phase, count_ns, count_ew)
-                self.current_phase = PhaseState(
-                    name=next_phase,
-                    start_time=now,
-                    duration=green
-                )
-            elif phase == Phase.EW_GREEN:
-                self.log_cycle(phase, count_ns, count_ew, self.current_phase.duration)
-                self.current_phase = PhaseState(
-                    name=Phase.EW_YELLOW,
-                    start_time=now,
-                    duration=YELLOW_TIME
-                )
-            elif phase == Phase.EW_YELLOW:
-                self.current_phase = PhaseState(
-                    name=Phase.ALL_RED,
-                    start_time=now,
-                    duration=ALL_RED_TIME
-                )
-
-            now = time.time()
-            elapsed = now - self.current_phase.start_time
-            remaining = int(self.current_phase.duration - elapsed)
-
-        phase_name = self.current_phase.name
-        if phase_name == Phase.NS_GREEN:
-            ui_phase = "NS"
-        elif phase_name == Phase.EW_GREEN:
-            ui_phase = "EW"
-        elif phase_name in (Phase.NS_YELLOW, Phase.EW_YELLOW):
-            ui_phase = "YELLOW"
+        if kind == GREEN:
+            elapsed = at - state.start_time
+            phase = ring.phases[ring.phase_of[i]]
+            p = self.preempt
+            # no extensions while a priority request is pending or held
+            if p is None:
+                # whole seconds only: a fractional extension would leave the
+                # deadline where it is and re-enter here forever
+                extension = int(self._ask_policy("extend", self.decision_context(at), elapsed))
+                if extension >= 1:
+                    state.duration += extension
+                    return
+            elif p.phase == phase and p.served_at is not None:
+                self.priority_ended[phase] = at
+                self.preempt = None
+            # (a preempted green may end between whole seconds)
+            self.log_cycle(state.name, self.count_ns, self.count_ew, round(state.duration))
+            self.last_green_duration = state.duration
+            if self.forecaster is not None:
+                self.forecaster.served(at, phase, self.phase_demand)
+
+        if kind == ALL_RED:
+            p = self.preempt
+            if p is not None:
+                k = ring.index[p.phase]
+                green = ring.clamp_green(k, PREEMPT_GREEN)
+                self._priority_served(p, at)
+            else:
+                # the timing policy chooses the next green and its length
+                decision = self._ask_policy("decide", self.decision_context(at))
+                k = ring.index.get(decision.phase, 0)
+                green = ring.clamp_green(k, decision.green)
+            name = ring.phases[k]
+            if name in self.green_started:
+                self.last_cycle_s = at - self.green_started[name]
+            self.green_started[name] = at
+            self.last_green = name
+            self._enter(ring.green_of[k], at, green)
         else:
-            ui_phase = "ALL_RED"
+            nxt = ring.following[i]
+            self._enter(nxt, at, ring.duration[nxt])
 
-        total = count_ns + count_ew
-        load = self.categorize_load(total)
+    def advance(self, now=None):
+        """
+        Apply every transition that is due by `now` (default: the clock),
+        each starting exactly at the previous phase's deadline. Returns True
+        if the phase changed.
+        """
+        with self._lock:
+            if now is None:
+                now = self.clock.time()
+            changed = False
+            while now >= self.next_transition_at():
+                self._transition(self.next_transition_at())
+                changed = True
+            if changed:
+                self.version += 1
+            return changed
 
-        return ui_phase, remaining, self.current_phase.duration, load
+    def snapshot(self):
+        """Consistent, read-only view of the current state."""
+        with self._lock:
+            state = self.current_phase
+            ends_at = state.start_time + state.duration
+            return ControllerState(
+                version=self.version,
+                phase=state.name,
+                ui_phase=self.ring.ui_name(state.interval),
+                started_at=state.start_time,
+                ends_at=ends_at,
+                remaining=max(0, int(ends_at - self.clock.time())),
+                green_time=round(state.duration),
+                load=self.categorize_load(sum(self.phase_demand.values())),
+                count_ns=self.count_ns,
+                count_ew=self.count_ew,
+                approaches=dict(self.approach_counts),
+                queues=self.approach_queues,
+                flows=self.approach_flows,
+                phase_counts=dict(self.phase_demand),
+                plan=self.plan.stamp(),
+                preempt=asdict(self.preempt) if self.preempt is not None else None,
+            )
+
+    def update_phase(self, count_ns: int, count_ew: int, queue_ns=None, queue_ew=None):
+        """
+        Polling entry point kept for simple loops and the simulator.
+        Returns (phase_name_for_ui, remaining_time, green_time, load_category).
+        phase_name_for_ui: "NS", "EW", or "YELLOW/ALL_RED".
+        """
+        self.set_counts(count_ns, count_ew, queue_ns, queue_ew)
+        self.advance()
+        state = self.snapshot()
+        return state.ui_phase, state.remaining, state.green_time, state.load
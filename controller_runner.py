@@ -0,0 +1,107 @@
+import threading
+import time
+from collections import deque
+
+from config import TIMING_PLAN_RELOAD_INTERVAL
+
+COUNT_REFRESH = 0.5     # seconds between count-bus reads while waiting for a deadline
+
+
+class ControllerRunner(threading.Thread):
+    """
+    Drives a TrafficController on its own schedule instead of from /status
+    polls. The thread sleeps until the controller's exact next transition
+    deadline, waking every COUNT_REFRESH to pick up fresh counts from the
+    count bus, so phase changes happen on time whether zero or hundreds of
+    dashboards are watching.
+    """
+
+    def __init__(self, controller, counts=None, on_change=None, metrics=None):
+        super().__init__(name="controller", daemon=True)
+        self.controller = controller
+        self.counts = counts            # count_bus.CountReader (or None)
+        self.on_change = on_change      # called with the new ControllerState
+        self.metrics = metrics          # metrics.Metrics with CONTROLLER_METRICS (or None)
+        self.count_seq = None           # seq of the last count record applied
+        self.count_capture_ts = None    # capture time of the counts in use
+        self.decided_at = None          # start of the green last seen decided
+        self.plan_checked_at = 0.0      # monotonic time of the last timing plan check
+        self.preempts_sent = deque()    # send times of priority requests not yet applied
+        self._wake = threading.Event()
+        self._stopped = False
+
+    def wake(self):
+        """Re-evaluate now (e.g. after an external state change)."""
+        self._wake.set()
+
+    def preempt(self, approach, kind, sent_at):
+        """
+        Priority request (preempt.PreemptListener callback): marked on the
+        controller right away, then this thread is woken to apply it instead
+        of finishing its sleep.
+        """
+        if self.controller.request_preempt(approach, kind, sent_at) is not None:
+            self.preempts_sent.append(sent_at)
+            self._wake.set()
+
+    def stop(self):
+        self._stopped = True
+        self._wake.set()
+
+    def refresh_counts(self):
+        """Apply the newest count record; returns True if it was a new one."""
+        if self.counts is None:
+            return False
+        record = self.counts.latest()
+        fresh = record is not None and record.seq != self.count_seq
+        if fresh:
+            self.count_seq = record.seq
+            self.count_capture_ts = record.capture_ts
+            self.controller.set_approach_counts(record.counts, record.queues, record.flows)
+            if self.metrics is not None:
+                self.metrics.observe("controller_count_lag_seconds", max(0.0, time.time() - record.publish_ts))
+        # let the detector infer more often just before the next green decision
+        self.counts.set_decision_at(self.controller.next_decision_at())
+        return fresh
+
+    def tick(self):
+        """One scheduler step; returns seconds until the next wake-up."""
+        start = time.perf_counter()
+        fresh = self.refresh_counts()
+        if start - self.plan_checked_at >= TIMING_PLAN_RELOAD_INTERVAL:
+            self.plan_checked_at = start
+            # a new plan is news for /status (its version stamp)
+            fresh = self.controller.reload_plan() or fresh
+        preempted = len(self.preempts_sent)      # requests applied by this advance()
+        changed = self.controller.advance()
+        if (changed or fresh or preempted) and self.on_change is not None:
+            # listeners (e.g. the status stream) drop snapshots that match the last one
+            self.on_change(self.controller.snapshot())
+        for _ in range(preempted):
+            sent_at = self.preempts_sent.popleft()
+            if self.metrics is not None:
+                self.metrics.observe("controller_preempt_latency_seconds", max(0.0, time.time() - sent_at))
+        if self.metrics is not None:
+            self.record_metrics(changed, time.perf_counter() - start)
+
+        wait = self.controller.next_transition_at() - self.controller.clock.time()
+        return max(0.0, min(wait, COUNT_REFRESH))
+
+    def record_metrics(self, changed, seconds):
+        metrics = self.metrics
+        metrics.observe("controller_tick_seconds", seconds)
+        if not changed:
+            return
+        metrics.inc("controller_phase_changes_total")
+        # a new green start means a decision was just made on the counts in use
+        decided_at = self.controller.green_started.get(self.controller.last_green)
+        if decided_at != self.decided_at:
+            self.decided_at = decided_at
+            if self.count_capture_ts is not None:
+                metrics.observe("controller_frame_age_seconds", max(0.0, decided_at - self.count_capture_ts))
+
+    def run(self):
+        while not self._stopped:
+            wait = self.tick()
+            self._wake.wait(wait)
+            self._wake.clear()
@@ -0,0 +1,80 @@
+import json
+import signal
+import threading
+
+from controller import TrafficController
+from controller_runner import ControllerRunner
+from count_bus import CountReader
+from frame_bus import FrameReader
+from metrics import CONTROLLER_METRICS, Metrics
+from preempt import PreemptListener
+from state_bus import HISTORY_SLOT, STATE_BUS_NAME, STATUS_SLOT, StateBus
+from status_stream import status_payload
+
+# -------------------------------------------------------
+# CONTROLLER AUTHORITY (multi-worker serving)
+# -------------------------------------------------------
+# The one process that owns the TrafficController when app.py runs under
+# several web workers (see gunicorn.conf.py). It drives the controller with
+# a ControllerRunner, as app.py does in single-process mode, and publishes
+# every change to the state bus for the workers to serve.
+
+HEARTBEAT_INTERVAL = 1.0    # seconds between heartbeats while nothing changes
+HISTORY_ROWS = 10           # cycles published for /history
+
+
+class ControllerService:
+    def __init__(self, bus_name=STATE_BUS_NAME, log_path="data/logs/cycles"):
+        # shared so every web worker's /metrics can render them
+        self.metrics = Metrics(CONTROLLER_METRICS).share("controller")
+        self.controller = TrafficController(log_path=log_path, metrics=self.metrics)
+        self.frames = FrameReader()
+        self.bus = StateBus.create(bus_name)
+        self.runner = ControllerRunner(self.controller, CountReader(), on_change=self.publish,
+                                       metrics=self.metrics)
+        self.preempt_listener = None
+        self._history_version = None
+        self._stopped = threading.Event()
+
+    def publish(self, state):
+        payload = status_payload(state, self.frames)
+        self.bus.publish(STATUS_SLOT, json.dumps(payload).encode())
+
+        # a phase change is when a cycle may have been logged
+        if state.version != self._history_version:
+            self._history_version = state.version
+            rows = self.controller.cycle_log.last(HISTORY_ROWS) if self.controller.cycle_log else []
+            self.bus.publish(HISTORY_SLOT, json.dumps(rows).encode())
+
+    def stop(self, *_):
+        self._stopped.set()
+
+    def run(self):
+        self.publish(self.controller.snapshot())
+        self.runner.start()
+        self.preempt_listener = PreemptListener.start_on(self.runner.preempt)
+        print(f"[INFO] Controller authority publishing to state bus '{self.bus.shm.name}'")
+        try:
+            while not self._stopped.wait(HEARTBEAT_INTERVAL):
+                self.bus.heartbeat()
+        finally:
+            self.runner.stop()
+            if self.preempt_listener is not None:
+                self.preempt_listener.stop()
+            if self.controller.cycle_log is not None:
+                self.controller.cycle_log.close()
+            if self.controller.rollups is not None:
+                self.controller.rollups.flush()
+            self.bus.close()
+            self.metrics.close()
+
+
+def main():
+    service = ControllerService()
+    signal.signal(signal.SIGTERM, service.stop)
+    signal.signal(signal.SIGINT, service.stop)
+    service.run()
+
+
+if __name__ == "__main__":
+    main()
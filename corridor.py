@@ -0,0 +1,277 @@
+import argparse
+import time
+from dataclasses import dataclass
+
+import numpy as np
+
+from config import (
+    TIMING_PLAN_PATH,
+    CORRIDOR_MIN_CYCLE, CORRIDOR_MAX_CYCLE,
+    CORRIDOR_DESIGN_SPEED, CORRIDOR_SPEED_SMOOTHING,
+)
+from controller import ControllerState, Phase, SystemClock, load_category
+from timing_plan import TimingPlan, local_hours
+
+# -------------------------------------------------------
+# CORRIDOR COORDINATION ENGINE
+# -------------------------------------------------------
+# Runs a row of adjacent two-phase intersections on one common cycle. Every
+# intersection's main-street green starts `offset` seconds into the common
+# cycle, where the offset is the travel time from the corridor's reference
+# intersection at the observed segment speeds, so platoons meet a green
+# wave. Cycle length, splits and offsets are recomputed at each common cycle
+# boundary from the latest demand, all intersections at once as NumPy
+# arrays; a tick is a few array operations however long the corridor is.
+#
+# Per intersection the cycle is laid out in local cycle time as
+#   main green | main yellow | all red | side green | side yellow | all red
+#
+# Green sizing follows the same TimingPlan as TrafficController (the NS and
+# EW ring phases' base / min / max greens, yellow, all-red, PER_VEHICLE and
+# the hour's multiplier); set_plan() swaps in a reloaded plan for the next
+# common cycle.
+
+NS_MAIN_SEQUENCE = (Phase.NS_GREEN, Phase.NS_YELLOW, Phase.ALL_RED,
+                    Phase.EW_GREEN, Phase.EW_YELLOW, Phase.ALL_RED)
+EW_MAIN_SEQUENCE = (Phase.EW_GREEN, Phase.EW_YELLOW, Phase.ALL_RED,
+                    Phase.NS_GREEN, Phase.NS_YELLOW, Phase.ALL_RED)
+UI_PHASES = {Phase.NS_GREEN: "NS", Phase.EW_GREEN: "EW",
+             Phase.NS_YELLOW: "YELLOW", Phase.EW_YELLOW: "YELLOW",
+             Phase.ALL_RED: "ALL_RED"}
+
+
+@dataclass
+class Intersection:
+    """
+    One signal on the corridor.
+      position_m : distance along the corridor from its first intersection
+      main       : "NS" or "EW", the phase that carries corridor traffic
+    """
+    name: str
+    position_m: float
+    main: str = "NS"
+
+
+class CorridorEngine:
+    """
+    Coordinated timing for many intersections sharing one cycle clock.
+
+    Feed demand with set_demands() / set_demand() (vehicles waiting on the
+    main and side phase) and speeds with observe_speeds(); call tick() as
+    often as needed (e.g. sleeping until next_transition_at()). Plans take
+    effect at the next common cycle boundary.
+    """
+
+    def __init__(self, intersections, clock=None, direction=1, plan=None):
+        """
+        direction=1: green wave towards increasing position, -1: the other way.
+        plan is the TimingPlan to size greens with (default: config.py plus
+        TIMING_PLAN_PATH, as TrafficController loads it).
+        """
+        self.intersections = list(intersections)
+        self.clock = clock or SystemClock()
+        self.direction = direction
+        n = len(self.intersections)
+
+        self.names = [i.name for i in self.intersections]
+        self.positions = np.array([i.position_m for i in self.intersections], dtype=np.float64)
+        self.main_is_ns = np.array([i.main == "NS" for i in self.intersections])
+        if plan is None:
+            try:
+                plan = TimingPlan.load(TIMING_PLAN_PATH)
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                print(f"[WARN] Timing plan {TIMING_PLAN_PATH} not applied: {e}; using config.py")
+                plan = TimingPlan()
+        self.set_plan(plan)
+
+        self.demand = np.zeros((n, 2), dtype=np.float64)        # [main, side] vehicles
+        self.segment_speed = np.full(max(n - 1, 0), CORRIDOR_DESIGN_SPEED, dtype=np.float64)
+
+        self.cycle_start = self.clock.time()
+        self.cycle = 0.0
+        self.greens = np.zeros((n, 2), dtype=np.float64)
+        self.offsets = np.zeros(n, dtype=np.float64)
+        self.ends = np.zeros((n, 6), dtype=np.float64)          # interval ends, local time
+        self.interval = np.full(n, -1, dtype=np.int8)           # index into the sequence
+        self.version = 0
+        self.plan()
+
+    # ---------------- inputs ----------------
+    def set_demand(self, i, main, side):
+        self.demand[i] = (main, side)
+
+    def set_demands(self, demand):
+        """(n, 2) array of [main, side] demand for every intersection."""
+        self.demand[:] = demand
+
+    def observe_speeds(self, speeds):
+        """
+        Smoothed update of the (n - 1) segment speeds in m/s; NaN or
+        non-positive entries (no observation) leave a segment unchanged.
+        """
+        speeds = np.asarray(speeds, dtype=np.float64)
+        seen = np.isfinite(speeds) & (speeds > 0)
+        self.segment_speed[seen] += CORRIDOR_SPEED_SMOOTHING * (speeds[seen] - self.segment_speed[seen])
+
+    # ---------------- planning ----------------
+    def set_plan(self, plan):
+        """Size greens with `plan` (a TimingPlan) from the next common cycle on."""
+        ring = plan.ring
+        if "NS" not in ring.index or "EW" not in ring.index:
+            raise ValueError(f"Corridor timing needs NS and EW phases, the plan has {ring.phases}")
+        ns, ew = ring.index["NS"], ring.index["EW"]
+        # [main, side] ring phase per intersection
+        self.phase_k = np.where(self.main_is_ns[:, None], [ns, ew], [ew, ns])
+
+        def per_phase(values):
+            return np.asarray(values, dtype=np.float64)[self.phase_k]
+
+        self.timing_plan = plan
+        self.base = per_phase(ring.base)
+        self.min_green = per_phase(ring.min_green)
+        self.max_green = per_phase(ring.max_green)
+        self.yellow = per_phase(ring.yellow)
+        self.all_red = per_phase(ring.all_red)
+        self.lost = (self.yellow + self.all_red).sum(axis=1)      # per cycle, both phases
+
+    def travel_times(self):
+        """Seconds from the reference intersection to each intersection."""
+        gaps = np.abs(np.diff(self.positions)) / self.segment_speed
+        t = np.concatenate([[0.0], np.cumsum(gaps)])
+        return t if self.direction >= 0 else t[-1] - t
+
+    def plan(self):
+        """Recompute the common cycle, per-intersection splits and offsets."""
+        plan = self.timing_plan
+        hour = local_hours.hour(self.cycle_start)
+        multiplier = np.asarray([row[hour] for row in plan.multiplier], dtype=np.float64)[self.phase_k]
+        need = np.clip((self.base + plan.per_vehicle * self.demand) * multiplier,
+                       self.min_green, self.max_green)
+
+        # the busiest intersection sets the common cycle; every intersection
+        # must still fit both minimum greens
+        cycle = float(np.clip((need.sum(axis=1) + self.lost).max(), CORRIDOR_MIN_CYCLE, CORRIDOR_MAX_CYCLE))
+        cycle = max(cycle, float((self.min_green.sum(axis=1) + self.lost).max()))
+        usable = cycle - self.lost
+
+        # split each intersection's usable green in proportion to its need
+        main = np.clip(usable * need[:, 0] / need.sum(axis=1),
+                       self.min_green[:, 0], usable - self.min_green[:, 1])
+        greens = np.column_stack([main, usable - main])
+
+        self.cycle = cycle
+        self.greens = greens
+        self.offsets = np.mod(self.travel_times(), cycle)
+        durations = np.column_stack([
+            greens[:, 0], self.yellow[:, 0], self.all_red[:, 0],
+            greens[:, 1], self.yellow[:, 1], self.all_red[:, 1],
+        ])
+        self.ends = np.cumsum(durations, axis=1)
+
+    # ---------------- running ----------------
+    def _local_time(self, now):
+        return np.mod(now - self.cycle_start - self.offsets, self.cycle)
+
+    def tick(self, now=None):
+        """
+        Advance to `now` (default: the clock). Returns the indices of the
+        intersections whose interval changed.
+        """
+        if now is None:
+            now = self.clock.time()
+        if now >= self.cycle_start + self.cycle:
+            cycles = np.floor((now - self.cycle_start) / self.cycle)
+            self.cycle_start += cycles * self.cycle
+            self.plan()
+
+        tau = self._local_time(now)
+        interval = np.minimum((tau[:, None] >= self.ends).sum(axis=1), 5).astype(np.int8)
+        changed = np.nonzero(interval != self.interval)[0]
+        if len(changed):
+            self.interval = interval
+            self.version += 1
+        return changed
+
+    def next_transition_at(self, now=None):
+        """Clock time of the next interval change anywhere on the corridor."""
+        if now is None:
+            now = self.clock.time()
+        tau = self._local_time(now)
+        ahead = self.ends - tau[:, None]
+        ahead = np.where(ahead > 0, ahead, np.inf).min()
+        return min(now + ahead, self.cycle_start + self.cycle)
+
+    # ---------------- views ----------------
+    def phase(self, i):
+        sequence = NS_MAIN_SEQUENCE if self.main_is_ns[i] else EW_MAIN_SEQUENCE
+        return sequence[max(0, int(self.interval[i]))]
+
+    def snapshot(self, i, now=None):
+        """ControllerState of intersection i, as TrafficController.snapshot()."""
+        if now is None:
+            now = self.clock.time()
+        k = max(0, int(self.interval[i]))
+        tau = float(self._local_time(now)[i])
+        starts = np.concatenate([[0.0], self.ends[i, :-1]])
+        ends_at = now + float(self.ends[i, k]) - tau
+        phase = self.phase(i)
+
+        main, side = self.demand[i].tolist()
+        count_ns, count_ew = (main, side) if self.main_is_ns[i] else (side, main)
+        return ControllerState(
+            version=self.version,
+            phase=phase.value,
+            ui_phase=UI_PHASES[phase],
+            started_at=now - tau + float(starts[k]),
+            ends_at=ends_at,
+            remaining=max(0, int(ends_at - now)),
+            green_time=int(round(self.ends[i, k] - starts[k])),
+            load=load_category(count_ns + count_ew),
+            count_ns=int(count_ns),
+            count_ew=int(count_ew),
+            approaches={},
+        )
+
+
+# -------------------------------------------------------
+# BENCHMARK: per-tick cost for a long corridor
+# -------------------------------------------------------
+def main():
+    parser = argparse.ArgumentParser(description="CorridorEngine tick benchmark")
+    parser.add_argument("--intersections", type=int, default=500)
+    parser.add_argument("--ticks", type=int, default=20000)
+    parser.add_argument("--step", type=float, default=0.1, help="simulated seconds per tick")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(1)
+    n = args.intersections
+    spacing = rng.uniform(150, 600, n)
+    corridor = [Intersection(f"X{i:03d}", float(p)) for i, p in enumerate(np.cumsum(spacing) - spacing[0])]
+
+    class _Clock:
+        t = 0.0
+
+        def time(self):
+            return self.t
+
+    clock = _Clock()
+    engine = CorridorEngine(corridor, clock=clock)
+    timings = np.zeros(args.ticks)
+    changes = 0
+    for k in range(args.ticks):
+        clock.t = k * args.step
+        if k % 50 == 0:
+            engine.set_demands(rng.poisson(6, (n, 2)))
+            engine.observe_speeds(rng.normal(12.0, 2.0, n - 1))
+        start = time.perf_counter()
+        changes += len(engine.tick())
+        timings[k] = time.perf_counter() - start
+
+    print(f"[INFO] {n} intersections, {args.ticks} ticks, cycle {engine.cycle:.0f} s, "
+          f"{changes} interval changes")
+    print(f"[INFO] tick mean {1e6 * timings.mean():.1f} us, p99 {1e6 * np.percentile(timings, 99):.1f} us, "
+          f"max {1e6 * timings.max():.1f} us")
+
+
+if __name__ == "__main__":
+    main()
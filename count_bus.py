@@ -0,0 +1,294 @@
+import struct
+import time
+from dataclasses import dataclass, field
+from multiprocessing import resource_tracker, shared_memory
+
+# -------------------------------------------------------
+# SHARED-MEMORY COUNT BUS
+# -------------------------------------------------------
+# Detection publishes one record per processed frame into a fixed-layout
+# ring in shared memory. Readers (app.py, green_time_signal.py,
+# ui_dashboard.py) copy the newest record without touching the filesystem.
+#
+# Layout (little endian):
+#   header : magic, version, max_approaches, ring_size, head, decision_at
+#   names  : max_approaches x 16-byte approach names (NUL padded)
+#   ring   : ring_size x slot
+#   slot   : seq (u64), capture_ts (f64), publish_ts (f64), flags (u32),
+#            counts (max_approaches x u32), queues (max_approaches x u32),
+#            flows (max_approaches x f32, vehicles/min)
+#
+# queues / flows come from tracker.py and are only valid when the
+# FLAG_TRACKED bit is set.
+#
+# Every slot is a seqlock: the writer stores an odd seq before touching the
+# slot and the final even seq after, so a reader that sees the same even seq
+# before and after copying has a consistent, untorn record.
+#
+# decision_at flows the other way: the controller side stores the wall-clock
+# time of its next green decision so the detector can schedule inference
+# around it (see motion_gate.py).
+
+BUS_NAME = "traffic_counts"
+DEFAULT_APPROACHES = ("NS", "EW")
+
+MAGIC = b"TCB1"
+VERSION = 3
+MAX_APPROACHES = 16
+RING_SIZE = 64
+NAME_BYTES = 16
+
+_HEADER = struct.Struct("<4sIIIQd")
+_HEAD_OFFSET = 4 + 4 + 4 + 4
+_DECISION_OFFSET = _HEAD_OFFSET + 8
+_DECISION = struct.Struct("<d")
+_SLOT_HEAD = struct.Struct("<QddI")
+_SEQ = struct.Struct("<Q")
+_BODY = struct.Struct(f"<{MAX_APPROACHES}I{MAX_APPROACHES}I{MAX_APPROACHES}f")
+
+FLAG_TRACKED = 1
+
+_NAMES_OFFSET = _HEADER.size
+_RING_OFFSET = _NAMES_OFFSET + MAX_APPROACHES * NAME_BYTES
+_SLOT_SIZE = _SLOT_HEAD.size + _BODY.size
+SEGMENT_SIZE = _RING_OFFSET + RING_SIZE * _SLOT_SIZE
+
+READ_RETRIES = 100
+
+
+def camera_bus_name(camera):
+    """Bus name for one camera of a multi-camera site."""
+    return f"{BUS_NAME}_{camera}"
+
+
+def open_segment(name, size=None):
+    """
+    Attach to (size=None) or create a named shared-memory segment.
+
+    Segments must outlive whichever process happens to exit first, so they
+    are taken out of the multiprocessing resource tracker, which would
+    otherwise unlink them when the attaching process exits.
+    """
+    if size is None:
+        shm = shared_memory.SharedMemory(name=name)
+    else:
+        shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+    try:
+        resource_tracker.unregister(shm._name, "shared_memory")
+    except Exception:
+        pass
+    return shm
+
+
+def unlink_segment(shm):
+    """Remove a segment opened with open_segment() from the system."""
+    # SharedMemory.unlink() unregisters from the tracker itself
+    resource_tracker.register(shm._name, "shared_memory")
+    shm.unlink()
+
+
+@dataclass
+class CountRecord:
+    seq: int
+    capture_ts: float
+    publish_ts: float
+    counts: dict = field(default_factory=dict)
+    queues: dict = None      # stopped vehicles per approach (tracking only)
+    flows: dict = None       # stop-line crossings/min per approach (tracking only)
+
+    @property
+    def total(self):
+        return sum(self.counts.values())
+
+    def get(self, approach, default=0):
+        return self.counts.get(approach, default)
+
+
+class CountBus:
+    """
+    Fixed-layout ring of per-approach count records in shared memory.
+    Use CountBus.create() in the (single) writer and CountBus.attach() in
+    readers.
+    """
+
+    def __init__(self, shm, approaches):
+        self.shm = shm
+        self.buf = shm.buf
+        self.approaches = tuple(approaches)
+
+    # ---------------- construction ----------------
+    @classmethod
+    def create(cls, name=BUS_NAME, approaches=DEFAULT_APPROACHES):
+        """
+        Create the bus, or reuse an existing segment of the same name so that
+        readers attached to it keep working across writer restarts.
+        """
+        approaches = tuple(approaches)
+        if not approaches or len(approaches) > MAX_APPROACHES:
+            raise ValueError(f"Need 1..{MAX_APPROACHES} approaches, got {len(approaches)}")
+
+        try:
+            shm = open_segment(name, SEGMENT_SIZE)
+            head, decision_at = 0, 0.0
+        except FileExistsError:
+            shm = open_segment(name)
+            if bytes(shm.buf[:4]) != MAGIC:
+                shm.close()
+                raise ValueError(f"Shared memory {name!r} is not a count bus")
+            if shm.size < SEGMENT_SIZE or _HEADER.unpack_from(shm.buf, 0)[1] != VERSION:
+                # left over from an older layout: start a fresh segment
+                unlink_segment(shm)
+                shm.close()
+                return cls.create(name, approaches)
+            head, decision_at = _HEADER.unpack_from(shm.buf, 0)[4:]
+
+        _HEADER.pack_into(shm.buf, 0, MAGIC, VERSION, len(approaches), RING_SIZE, head, decision_at)
+        for i in range(MAX_APPROACHES):
+            label = approaches[i].encode()[:NAME_BYTES] if i < len(approaches) else b""
+            struct.pack_into(f"{NAME_BYTES}s", shm.buf, _NAMES_OFFSET + i * NAME_BYTES, label)
+
+        return cls(shm, approaches)
+
+    @classmethod
+    def attach(cls, name=BUS_NAME):
+        shm = open_segment(name)
+        magic, version, n_approaches, ring_size = _HEADER.unpack_from(shm.buf, 0)[:4]
+        if magic != MAGIC or version != VERSION or ring_size != RING_SIZE:
+            shm.close()
+            raise ValueError(f"Shared memory {name!r} has an incompatible layout")
+
+        approaches = []
+        for i in range(n_approaches):
+            raw = struct.unpack_from(f"{NAME_BYTES}s", shm.buf, _NAMES_OFFSET + i * NAME_BYTES)[0]
+            approaches.append(raw.rstrip(b"\0").decode())
+        return cls(shm, approaches)
+
+    @classmethod
+    def try_attach(cls, name=BUS_NAME):
+        """Attach if the writer has created the bus yet, else return None."""
+        try:
+            return cls.attach(name)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def close(self):
+        self.buf = None
+        self.shm.close()
+
+    def unlink(self):
+        unlink_segment(self.shm)
+
+    # ---------------- writer ----------------
+    def _head(self):
+        return _SEQ.unpack_from(self.buf, _HEAD_OFFSET)[0]
+
+    def _values(self, values, cast):
+        if values is None:
+            values = []
+        elif isinstance(values, dict):
+            values = [cast(values.get(a, 0)) for a in self.approaches]
+        else:
+            values = [cast(v) for v in values]
+        return values + [cast(0)] * (MAX_APPROACHES - len(values))
+
+    def publish(self, counts, capture_ts=None, queues=None, flows=None):
+        """
+        Append one record. `counts` (and the optional tracker `queues` /
+        `flows`) are dicts keyed by approach name or sequences in the bus's
+        approach order. Returns the record sequence.
+        """
+        flags = FLAG_TRACKED if queues is not None else 0
+        values = self._values(counts, int) + self._values(queues, int) + self._values(flows, float)
+
+        now = time.time()
+        if capture_ts is None:
+            capture_ts = now
+
+        n = self._head()
+        offset = _RING_OFFSET + (n % RING_SIZE) * _SLOT_SIZE
+        seq = 2 * n + 2
+
+        _SEQ.pack_into(self.buf, offset, seq - 1)                 # slot busy
+        _SLOT_HEAD.pack_into(self.buf, offset, seq - 1, capture_ts, now, flags)
+        _BODY.pack_into(self.buf, offset + _SLOT_HEAD.size, *values)
+        _SEQ.pack_into(self.buf, offset, seq)                     # slot ready
+        _SEQ.pack_into(self.buf, _HEAD_OFFSET, n + 1)
+        return n + 1
+
+    # ---------------- decision hint (controller -> detector) ----------------
+    def decision_at(self):
+        """Wall-clock time of the controller's next green decision, or None."""
+        ts = _DECISION.unpack_from(self.buf, _DECISION_OFFSET)[0]
+        return ts or None
+
+    def set_decision_at(self, ts):
+        _DECISION.pack_into(self.buf, _DECISION_OFFSET, float(ts or 0.0))
+
+    # ---------------- readers ----------------
+    def _read_slot(self, n):
+        """Consistent copy of record number n (0-based), or None if overwritten."""
+        offset = _RING_OFFSET + (n % RING_SIZE) * _SLOT_SIZE
+        expected = 2 * n + 2
+
+        for _ in range(READ_RETRIES):
+            seq, capture_ts, publish_ts, flags = _SLOT_HEAD.unpack_from(self.buf, offset)
+            if seq != expected:
+                if seq > expected or seq % 2 == 0:
+                    return None      # lapped by the writer
+                continue             # write in progress
+            values = _BODY.unpack_from(self.buf, offset + _SLOT_HEAD.size)
+            if _SEQ.unpack_from(self.buf, offset)[0] == seq:
+                record = CountRecord(n + 1, capture_ts, publish_ts,
+                                     dict(zip(self.approaches, values)))
+                if flags & FLAG_TRACKED:
+                    record.queues = dict(zip(self.approaches, values[MAX_APPROACHES:]))
+                    record.flows = dict(zip(self.approaches, values[2 * MAX_APPROACHES:]))
+                return record
+        return None
+
+    def latest(self):
+        """Newest complete record, or None if nothing was published yet."""
+        for _ in range(READ_RETRIES):
+            head = self._head()
+            if head == 0:
+                return None
+            record = self._read_slot(head - 1)
+            if record is not None:
+                return record
+        return None
+
+    def history(self, n=RING_SIZE):
+        """Up to n most recent records, oldest first."""
+        head = self._head()
+        records = []
+        for i in range(max(0, head - min(n, RING_SIZE)), head):
+            record = self._read_slot(i)
+            if record is not None:
+                records.append(record)
+        return records
+
+
+class CountReader:
+    """
+    Lazily attached reader for processes that may start before the writer.
+    latest() returns None until the detector has published something.
+    """
+
+    def __init__(self, name=BUS_NAME):
+        self.name = name
+        self.bus = None
+
+    def latest(self):
+        if self._attached() is None:
+            return None
+        return self.bus.latest()
+
+    def set_decision_at(self, ts):
+        """Tell the detector when the next green decision will be made."""
+        if self._attached() is not None:
+            self.bus.set_decision_at(ts)
+
+    def _attached(self):
+        if self.bus is None:
+            self.bus = CountBus.try_attach(self.name)
+        return self.bus
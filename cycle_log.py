@@ -0,0 +1,384 @@
+import atexit
+import bisect
+import csv
+import os
+import queue
+import struct
+import sys
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+# -------------------------------------------------------
+# ROTATING BINARY CYCLE LOG
+# -------------------------------------------------------
+# Replaces the ever-growing data/logs/cycles.csv. Cycles are queued by the
+# controller, written in batches by a background thread into fixed-width
+# binary segments, and rotated by size and age:
+#
+#   data/logs/cycles/seg-<first_ts>.bin
+#
+# Segment names sort by their first timestamp, so the directory listing is
+# the index: a time-range query bisects the segment list, then bisects the
+# fixed-width records inside a segment with a few seeks. The newest
+# RECENT_CYCLES records are also kept in memory, so "last N cycles" for the
+# dashboard never touches the disk.
+#
+# Records within a segment are in timestamp order: a row older than the
+# last one written (the wall clock stepped back, or an old cycles.csv
+# imported into a live log) starts a new segment, inserted into the list
+# at its first timestamp. Segments may then overlap in time, so range()
+# also checks each segment's last timestamp and merges the rows in order.
+#
+# The writer thread survives write errors: rows a failed write (e.g. a full
+# disk) left behind are retried on the next flush, and a row that cannot be
+# encoded (unknown load category) is dropped with a warning.
+#
+# Segment layout (little endian):
+#   header : magic, version, record_size, n_phase_names,
+#            MAX_PHASE_NAMES x 16-byte phase names
+#   record : ts (f64), phase code (u8), load code (u8), green_time (u16),
+#            vehicle_count_ns (u32), vehicle_count_ew (u32)
+
+LOG_DIR = "data/logs/cycles"
+
+MAGIC = b"TCL1"
+VERSION = 1
+MAX_PHASE_NAMES = 32
+NAME_BYTES = 16
+
+SEGMENT_MAX_RECORDS = 50_000     # ~1 MB per segment
+SEGMENT_MAX_SECONDS = 86_400     # start a new segment at least daily
+MAX_SEGMENTS = 730               # retention (oldest segments are deleted)
+
+FLUSH_INTERVAL = 1.0             # seconds between batched writes
+RECENT_CYCLES = 256              # newest cycles kept in memory
+
+LOAD_CATEGORIES = ("FREE", "LIGHT", "MODERATE", "HEAVY")
+
+_HEADER = struct.Struct(f"<4sIII{MAX_PHASE_NAMES * NAME_BYTES}s")
+_RECORD = struct.Struct("<dBBHII")
+_TS = struct.Struct("<d")
+
+
+def _row(ts, phase, count_ns, count_ew, green_time, load):
+    return {
+        "ts": ts,
+        "timestamp": datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M:%S"),
+        "phase": phase,
+        "vehicle_count_ns": count_ns,
+        "vehicle_count_ew": count_ew,
+        "green_time": green_time,
+        "load_category": load,
+    }
+
+
+class _Segment:
+    """One segment file: its phase-name table and record count."""
+
+    def __init__(self, path, first_ts):
+        self.path = path
+        self.first_ts = first_ts
+        self.last_ts = first_ts
+        self.phase_names = []
+        self.count = 0
+
+    @classmethod
+    def open_existing(cls, path, first_ts):
+        seg = cls(path, first_ts)
+        with open(path, "rb") as f:
+            header = f.read(_HEADER.size)
+        if len(header) < _HEADER.size:
+            return None
+        magic, version, record_size, n_names, names = _HEADER.unpack(header)
+        if magic != MAGIC or version != VERSION or record_size != _RECORD.size:
+            return None
+        seg.phase_names = [
+            names[i * NAME_BYTES:(i + 1) * NAME_BYTES].rstrip(b"\0").decode()
+            for i in range(n_names)
+        ]
+        seg.count = (os.path.getsize(path) - _HEADER.size) // _RECORD.size
+        if seg.count:
+            seg.first_ts = seg.ts_at(0)
+            seg.last_ts = seg.ts_at(seg.count - 1)
+        return seg
+
+    def ts_at(self, index):
+        with open(self.path, "rb") as f:
+            f.seek(_HEADER.size + index * _RECORD.size)
+            return _TS.unpack(f.read(_TS.size))[0]
+
+    def header(self):
+        names = b"".join(n.encode()[:NAME_BYTES].ljust(NAME_BYTES, b"\0") for n in self.phase_names)
+        return _HEADER.pack(MAGIC, VERSION, _RECORD.size, len(self.phase_names), names)
+
+    def decode(self, raw):
+        ts, phase, load, green, count_ns, count_ew = _RECORD.unpack(raw)
+        return _row(ts, self.phase_names[phase], count_ns, count_ew, green, LOAD_CATEGORIES[load])
+
+    def read(self, start, stop):
+        """Records [start, stop) as dicts."""
+        start = max(0, start)
+        stop = min(self.count, stop)
+        if stop <= start:
+            return []
+        with open(self.path, "rb") as f:
+            f.seek(_HEADER.size + start * _RECORD.size)
+            data = f.read((stop - start) * _RECORD.size)
+        n = len(data) // _RECORD.size
+        return [self.decode(data[i * _RECORD.size:(i + 1) * _RECORD.size]) for i in range(n)]
+
+    def bisect_ts(self, ts):
+        """Index of the first record with timestamp >= ts (a few seeks)."""
+        lo, hi = 0, self.count
+        with open(self.path, "rb") as f:
+            while lo < hi:
+                mid = (lo + hi) // 2
+                f.seek(_HEADER.size + mid * _RECORD.size)
+                if _TS.unpack(f.read(_TS.size))[0] < ts:
+                    lo = mid + 1
+                else:
+                    hi = mid
+        return lo
+
+
+class CycleLog:
+    """
+    Batched, rotating cycle log with constant-time "last N" and
+    logarithmic time-range queries.
+
+    append() only enqueues; a daemon thread writes batches every
+    FLUSH_INTERVAL. Queries see everything that has been flushed plus the
+    in-memory tail of the newest cycles.
+    """
+
+    def __init__(self, log_dir=LOG_DIR):
+        self.log_dir = log_dir
+        os.makedirs(log_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._pending = queue.Queue()
+        self._unwritten = deque()        # rows a failed write left behind
+        self.dropped = 0                 # rows that could not be encoded
+        self.segments = self._scan()
+        # the segment appended to; None starts a new one on the first write
+        self.active = self.segments[-1] if self.segments else None
+        self.recent = deque(maxlen=RECENT_CYCLES)
+        self.recent.extend(self._tail_from_disk(RECENT_CYCLES))
+
+        self._stopped = threading.Event()
+        self._writer = threading.Thread(target=self._run, name="cycle-log", daemon=True)
+        self._writer.start()
+        atexit.register(self.close)
+
+    # ---------------- index ----------------
+    def _scan(self):
+        segments = []
+        for name in sorted(os.listdir(self.log_dir)):
+            if not (name.startswith("seg-") and name.endswith(".bin")):
+                continue
+            try:
+                first_ts = float(name[4:-4])
+            except ValueError:
+                continue
+            seg = _Segment.open_existing(os.path.join(self.log_dir, name), first_ts)
+            if seg is not None:
+                segments.append(seg)
+        segments.sort(key=lambda s: s.first_ts)
+        return segments
+
+    def _tail_from_disk(self, n):
+        rows = []
+        for seg in sorted(self.segments, key=lambda s: s.last_ts, reverse=True):
+            rows[:0] = seg.read(seg.count - (n - len(rows)), seg.count)
+            if len(rows) >= n:
+                break
+        rows.sort(key=lambda row: row["ts"])
+        return rows[-n:] if n else []
+
+    # ---------------- writer ----------------
+    def append(self, phase, count_ns, count_ew, green_time, load, ts=None):
+        """Queue one cycle. Never blocks on disk I/O."""
+        row = _row(time.time() if ts is None else ts, phase, count_ns, count_ew, green_time, load)
+        with self._lock:
+            self.recent.append(row)
+        self._pending.put(row)
+
+    def _run(self):
+        while not self._stopped.wait(FLUSH_INTERVAL):
+            self._flush_or_warn()
+        self._flush_or_warn()
+
+    def _flush_or_warn(self):
+        try:
+            self.flush()
+        except Exception as e:
+            print(f"[WARN] Cycle log write failed ({e}); "
+                  f"{len(self._unwritten)} cycle(s) kept for the next flush")
+
+    def flush(self):
+        """Write every queued row; on an error the unwritten rows are kept and it re-raises."""
+        with self._lock:
+            rows = self._unwritten
+            while True:
+                try:
+                    rows.append(self._pending.get_nowait())
+                except queue.Empty:
+                    break
+            if rows:
+                self._write(rows)
+
+    def _segment_for(self, row):
+        seg = self.active
+        if (
+            seg is None
+            or row["ts"] < seg.last_ts
+            or seg.count >= SEGMENT_MAX_RECORDS
+            or row["ts"] - seg.first_ts >= SEGMENT_MAX_SECONDS
+            or (row["phase"] not in seg.phase_names and len(seg.phase_names) >= MAX_PHASE_NAMES)
+        ):
+            seg = self._rotate(row["ts"])
+        return seg
+
+    def _rotate(self, first_ts):
+        name_ts = first_ts
+        path = os.path.join(self.log_dir, f"seg-{name_ts:017.6f}.bin")
+        while os.path.exists(path):      # a step back to an existing segment's start
+            name_ts += 1e-6
+            path = os.path.join(self.log_dir, f"seg-{name_ts:017.6f}.bin")
+        seg = _Segment(path, first_ts)
+        with open(path, "wb") as f:
+            f.write(seg.header())
+        bisect.insort(self.segments, seg, key=lambda s: s.first_ts)
+        self.active = seg
+
+        while len(self.segments) > MAX_SEGMENTS:
+            old = self.segments.pop(1 if self.segments[0] is seg else 0)
+            try:
+                os.remove(old.path)
+            except OSError:
+                pass
+        return seg
+
+    def _encode(self, seg, row):
+        """Packed record of `row` in `seg`, or None if it cannot be stored."""
+        try:
+            return _RECORD.pack(
+                row["ts"],
+                seg.phase_names.index(row["phase"]),
+                LOAD_CATEGORIES.index(row["load_category"]),
+                min(int(row["green_time"]), 0xFFFF),
+                int(row["vehicle_count_ns"]),
+                int(row["vehicle_count_ew"]),
+            )
+        except (ValueError, TypeError, struct.error) as e:
+            self.dropped += 1
+            print(f"[WARN] Cycle log: dropping row {row} ({e})")
+            return None
+
+    def _write(self, rows):
+        """Write and pop rows from the front of the deque `rows`, in segments."""
+        while rows:
+            seg = self._segment_for(rows[0])
+            n_names = len(seg.phase_names)
+            chunk = []
+            taken = 0
+            last_ts = seg.last_ts
+            for row in rows:
+                if seg.count + len(chunk) >= SEGMENT_MAX_RECORDS \
+                        or row["ts"] < last_ts \
+                        or row["ts"] - seg.first_ts >= SEGMENT_MAX_SECONDS:
+                    break
+                if row["phase"] not in seg.phase_names:
+                    if len(seg.phase_names) >= MAX_PHASE_NAMES:
+                        break
+                    seg.phase_names.append(row["phase"])
+                taken += 1
+                record = self._encode(seg, row)
+                if record is not None:
+                    chunk.append(record)
+                    last_ts = row["ts"]
+
+            try:
+                with open(seg.path, "r+b") as f:
+                    if len(seg.phase_names) != n_names:
+                        f.write(seg.header())
+                    f.seek(_HEADER.size + seg.count * _RECORD.size)
+                    f.write(b"".join(chunk))
+                    f.truncate()
+            except OSError:
+                del seg.phase_names[n_names:]
+                raise
+            seg.count += len(chunk)
+            seg.last_ts = last_ts
+            for _ in range(taken):
+                rows.popleft()
+
+    def close(self):
+        if not self._stopped.is_set():
+            self._stopped.set()
+            self._writer.join(timeout=5)
+
+    # ---------------- queries ----------------
+    def last(self, n=10):
+        """The newest n cycles, oldest first."""
+        with self._lock:
+            if n <= len(self.recent):
+                return list(self.recent)[-n:] if n else []
+            return self._tail_from_disk(n)
+
+    def range(self, start_ts=None, end_ts=None):
+        """Flushed cycles with start_ts <= ts < end_ts, oldest first."""
+        with self._lock:
+            segments = list(self.segments)
+        rows = []
+        overlap = False
+        prev_last = -float("inf")
+        for seg in segments:
+            if end_ts is not None and seg.first_ts >= end_ts:
+                break
+            if seg.count == 0 or (start_ts is not None and seg.last_ts < start_ts):
+                continue
+            overlap = overlap or seg.first_ts < prev_last
+            prev_last = max(prev_last, seg.last_ts)
+            lo = 0 if start_ts is None else seg.bisect_ts(start_ts)
+            hi = seg.count if end_ts is None else seg.bisect_ts(end_ts)
+            rows.extend(seg.read(lo, hi))
+        if overlap:
+            rows.sort(key=lambda row: row["ts"])
+        return rows
+
+
+def import_csv(csv_path, log):
+    """
+    Migrate an old cycles.csv into the binary log. The rows are sorted and
+    written into segments of their own (not the dashboard's recent cycles),
+    so importing into a log that already holds newer cycles is safe.
+    """
+    with open(csv_path, newline="") as f:
+        rows = [
+            _row(
+                datetime.strptime(row["timestamp"], "%Y-%m-%d %H:%M:%S").timestamp(),
+                row["phase"],
+                int(row["vehicle_count_ns"]),
+                int(row["vehicle_count_ew"]),
+                int(row["green_time"]),
+                row["load_category"],
+            )
+            for row in csv.DictReader(f)
+        ]
+    rows.sort(key=lambda row: row["ts"])
+    log.flush()
+    with log._lock:
+        active = log.active
+        log._write(deque(rows))
+        # live cycles keep going to the segment they were going to
+        if active is not None and log.active is not active:
+            log.active = active
+    return len(rows)
+
+
+if __name__ == "__main__":
+    # python cycle_log.py data/logs/cycles.csv  -> import into data/logs/cycles/
+    import_csv(sys.argv[1] if len(sys.argv) > 1 else "data/logs/cycles.csv", CycleLog())
@@ -0,0 +1,104 @@
+import threading
+import zlib
+from collections import OrderedDict
+
+import numpy as np
+
+from config import DETECTION_CACHE_SIZE
+
+# -------------------------------------------------------
+# DETECTION RESULT CACHE
+# -------------------------------------------------------
+# Content-addressed detector results, in front of every model call in
+# vehicle_detection (live loop, count_vehicles, batch_detection, replay
+# workers, edge runtime). A frame's key is its shape plus two CRC-32s, one
+# of every pixel byte and one of a sparse byte sample (zlib's CRC is the
+# fastest full-frame checksum in the standard library: ~0.4 ms for VGA,
+# ~2-3 ms for 1080p, about half of SHA-1 and a quarter of BLAKE2b here,
+# against tens of ms per inference), so a frozen camera feed, a still
+# image re-read on a timer, a video looped or replayed twice, or the same
+# frame queued twice in one batch is inferred once. The motion gate skips
+# *similar* frames; this skips only bit-identical ones, so a hit never
+# changes a count.
+#
+# Entries are read-only copies of the raw (boxes, cls, confs) arrays (the
+# detector's own arrays stay writable): lane assignment and counting run
+# on them as on fresh results, so one entry serves any lane map. Tiled
+# inference crops to the lane map's ROI, so its entries are also keyed by
+# LaneMap.key. The least recently used entry is evicted beyond
+# DETECTION_CACHE_SIZE (0 disables the cache).
+
+SAMPLE_STRIDE = 4093                     # bytes between sampled bytes (prime: varies row / channel)
+
+
+def frame_key(image, scope=None):
+    """Content address of a frame (and the `scope` its result depends on)."""
+    data = image if image.flags.c_contiguous else np.ascontiguousarray(image)
+    sample = data.reshape(-1).view(np.uint8)[::SAMPLE_STRIDE].tobytes()
+    return scope, image.shape, image.dtype.str, zlib.crc32(sample), zlib.crc32(data)
+
+
+class DetectionCache:
+    """LRU map of frame_key() -> detector arrays, with hit / miss counters."""
+
+    def __init__(self, capacity=DETECTION_CACHE_SIZE):
+        self.capacity = max(0, int(capacity))
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self):
+        return self.capacity > 0
+
+    def get(self, key):
+        """Cached arrays of `key` (now most recently used), or None."""
+        with self._lock:
+            arrays = self._entries.get(key)
+            if arrays is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return arrays
+
+    def count_hit(self):
+        """Count a lookup answered without get() (a duplicate within one batch)."""
+        with self._lock:
+            self.hits += 1
+
+    def put(self, key, arrays):
+        """Store a copy of a result; returns the read-only copy kept."""
+        arrays = tuple(np.array(a) for a in arrays)
+        for a in arrays:
+            a.flags.writeable = False
+        with self._lock:
+            self._entries[key] = arrays
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return arrays
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": len(self._entries),
+            "hit_rate": self.hit_rate,
+        }
@@ -0,0 +1,71 @@
+from typing import NamedTuple
+
+import cv2
+import numpy as np
+
+# Lane index -> BGR box colour (0 = NS green, 1 = EW yellow, ...)
+LANE_COLORS = (
+    (0, 255, 0),
+    (0, 191, 255),
+    (255, 128, 0),
+    (255, 0, 255),
+    (0, 0, 255),
+    (255, 255, 0),
+    (128, 0, 255),
+    (0, 128, 255),
+)
+
+
+class Detections(NamedTuple):
+    """
+    Vehicle detections of one frame as parallel arrays:
+      boxes : (N, 4) int32   [x1, y1, x2, y2]
+      confs : (N,)   float32 confidences
+      lanes : (N,)   uint8   lane index each box was counted in
+    """
+    boxes: np.ndarray
+    confs: np.ndarray
+    lanes: np.ndarray
+
+    @classmethod
+    def empty(cls):
+        return cls(
+            np.zeros((0, 4), dtype=np.int32),
+            np.zeros((0,), dtype=np.float32),
+            np.zeros((0,), dtype=np.uint8),
+        )
+
+    def __len__(self):
+        return len(self.lanes)
+
+
+def draw_detections(image, detections, outlines=None):
+    """
+    Return an annotated copy of `image`, with the lane polygons (pixel
+    coordinates, see LaneMap.outlines) if given. Only called when somebody
+    actually looks at the frame (imshow window or the dashboard's /image).
+    """
+    annotated = image.copy()
+
+    for (x1, y1, x2, y2), conf, lane in zip(
+        detections.boxes.tolist(),
+        detections.confs.tolist(),
+        detections.lanes.tolist(),
+    ):
+        color = LANE_COLORS[lane % len(LANE_COLORS)]
+        cv2.rectangle(annotated, (x1, y1), (x2, y2), color, 2)
+        cv2.putText(
+            annotated,
+            f"veh {conf:.2f}",
+            (x1, max(10, y1 - 5)),
+            cv2.FONT_HERSHEY_SIMPLEX,
+            0.5,
+            color,
+            2,
+        )
+
+    # draw lane polygons
+    if outlines:
+        cv2.polylines(annotated, outlines, True, (255, 255, 255), 1)
+
+    return annotated
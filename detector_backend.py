@@ -0,0 +1,264 @@
+import argparse
+import glob
+import os
+import time
+
+import cv2
+import numpy as np
+
+from config import (
+    DETECTOR_BACKEND, DETECTOR_WEIGHTS,
+    DETECTOR_ONNX_PATH, DETECTOR_OPENVINO_PATH,
+    DETECTOR_INPUT_SIZE, DETECTOR_THREADS, DETECTOR_WARMUP_RUNS,
+)
+from detections import Detections
+
+# -------------------------------------------------------
+# DETECTOR BACKENDS
+# -------------------------------------------------------
+# One interface over the ways this project can run YOLOv8:
+#
+#   ultralytics : the .pt weights through PyTorch (auto-downloads once)
+#   onnx        : an exported .onnx model on ONNX Runtime's CPU provider
+#   openvino    : an exported OpenVINO IR model on the CPU plugin
+#
+# Constructing a backend is free: nothing is imported or read from disk
+# until load() (called on the first infer() if not done earlier), so
+# importing vehicle_detection no longer pays for the model. warmup() runs
+# blank frames through the network so graph setup and allocations happen
+# before the first real frame, e.g. while the camera is still opening or
+# on a standby box that must take over instantly.
+#
+# infer(images, conf, iou, size) returns one (boxes, cls, confs) per image:
+# xyxy int32 boxes in image pixels, int class ids, float32 confidences,
+# after NMS -- the arrays vehicle_detection.classify_boxes() consumes.
+# `size` overrides the network input size where the runtime allows it
+# (ultralytics); exported models always run at their fixed input size.
+
+LETTERBOX_FILL = 114             # padding value used when the model was trained
+MAX_WH = 7680                    # class offset for class-aware NMS in one call
+
+
+class DetectorBackend:
+    name = "base"
+    fixed_size = False               # True: infer() ignores `size`
+
+    def __init__(self, input_size=DETECTOR_INPUT_SIZE, threads=DETECTOR_THREADS):
+        self.input_size = input_size
+        self.threads = threads
+        self.loaded = False
+        self.load_time = 0.0
+        self.warmup_time = 0.0
+
+    # ---------------- lifecycle ----------------
+    def load(self):
+        if self.loaded:
+            return self
+        start = time.perf_counter()
+        print(f"[INFO] detector: loading {self.name} backend ...")
+        self._load()
+        self.load_time = time.perf_counter() - start
+        self.loaded = True
+        print(f"[INFO] detector: {self.name} ready in {self.load_time:.2f} s")
+        return self
+
+    def warmup(self, runs=DETECTOR_WARMUP_RUNS):
+        self.load()
+        start = time.perf_counter()
+        blank = np.full((self.input_size, self.input_size, 3), LETTERBOX_FILL, dtype=np.uint8)
+        for _ in range(runs):
+            self._infer([blank], 0.25, 0.45, self.input_size)
+        self.warmup_time = time.perf_counter() - start
+        return self
+
+    def infer(self, images, conf, iou, size=None):
+        if not self.loaded:
+            self.load()
+        return self._infer(list(images), conf, iou, size or self.input_size)
+
+    # ---------------- per backend ----------------
+    def _load(self):
+        raise NotImplementedError
+
+    def _infer(self, images, conf, iou, size):
+        raise NotImplementedError
+
+
+class UltralyticsBackend(DetectorBackend):
+    name = "ultralytics"
+
+    def __init__(self, weights=DETECTOR_WEIGHTS, **kwargs):
+        super().__init__(**kwargs)
+        self.weights = weights
+        self.model = None
+
+    def _load(self):
+        from ultralytics import YOLO
+        if self.threads:
+            import torch
+            torch.set_num_threads(self.threads)
+        self.model = YOLO(self.weights)          # will auto-download first run
+
+    def _infer(self, images, conf, iou, size):
+        results = self.model(images, verbose=False, conf=conf, iou=iou, imgsz=size)
+        return [self._arrays(r) for r in results]
+
+    @staticmethod
+    def _arrays(r):
+        if r.boxes is None:
+            empty = Detections.empty()
+            return empty.boxes, np.zeros((0,), dtype=int), empty.confs
+        boxes = r.boxes.xyxy.cpu().numpy().astype(np.int32)     # [x1, y1, x2, y2]
+        cls = r.boxes.cls.cpu().numpy().astype(int)             # class ids
+        confs = r.boxes.conf.cpu().numpy().astype(np.float32)   # confidences
+        return boxes, cls, confs
+
+
+class ExportedBackend(DetectorBackend):
+    """
+    Shared pre/post-processing for models exported from YOLOv8 with a fixed
+    square input: letterbox to input_size, NCHW RGB float in 0..1, and a
+    (1, 4 + classes, anchors) output of cx, cy, w, h and class scores.
+    """
+    fixed_size = True
+
+    def __init__(self, path, **kwargs):
+        super().__init__(**kwargs)
+        self.path = path
+
+    def _run(self, blob):
+        raise NotImplementedError
+
+    def _infer(self, images, conf, iou, size):
+        # exported models have a static batch of 1 and a fixed input size
+        return [self._infer_one(image, conf, iou) for image in images]
+
+    def _letterbox(self, image):
+        h, w = image.shape[:2]
+        size = self.input_size
+        scale = min(size / h, size / w)
+        nh, nw = round(h * scale), round(w * scale)
+        top, left = (size - nh) // 2, (size - nw) // 2
+        canvas = np.full((size, size, 3), LETTERBOX_FILL, dtype=np.uint8)
+        canvas[top:top + nh, left:left + nw] = cv2.resize(image, (nw, nh), interpolation=cv2.INTER_LINEAR)
+        return canvas, scale, left, top
+
+    def _infer_one(self, image, conf, iou):
+        canvas, scale, left, top = self._letterbox(image)
+        blob = cv2.dnn.blobFromImage(canvas, 1 / 255.0, swapRB=True)
+        pred = self._run(blob)[0].T                  # (anchors, 4 + classes)
+
+        scores = pred[:, 4:]
+        cls = scores.argmax(axis=1)
+        confs = scores[np.arange(len(cls)), cls]
+        keep = confs >= conf
+        pred, cls, confs = pred[keep], cls[keep], confs[keep]
+        if not len(pred):
+            empty = Detections.empty()
+            return empty.boxes, np.zeros((0,), dtype=int), empty.confs
+
+        # cx, cy, w, h in network pixels -> x, y, w, h in image pixels
+        xywh = pred[:, :4].copy()
+        xywh[:, 0] -= xywh[:, 2] / 2 + left
+        xywh[:, 1] -= xywh[:, 3] / 2 + top
+        xywh /= scale
+
+        # class-aware NMS in one call: shift each class into its own region
+        shifted = xywh.copy()
+        shifted[:, :2] += cls[:, None] * MAX_WH
+        kept = np.asarray(cv2.dnn.NMSBoxes(shifted.tolist(), confs.tolist(), conf, iou), dtype=int).reshape(-1)
+
+        h, w = image.shape[:2]
+        xywh = xywh[kept]
+        boxes = np.column_stack([xywh[:, 0], xywh[:, 1], xywh[:, 0] + xywh[:, 2], xywh[:, 1] + xywh[:, 3]])
+        boxes = np.clip(boxes, 0, [w, h, w, h]).astype(np.int32)
+        return boxes, cls[kept].astype(int), confs[kept].astype(np.float32)
+
+
+class OnnxBackend(ExportedBackend):
+    name = "onnx"
+
+    def __init__(self, path=DETECTOR_ONNX_PATH, **kwargs):
+        super().__init__(path, **kwargs)
+        self.session = None
+        self.input_name = None
+
+    def _load(self):
+        try:
+            import onnxruntime as ort
+        except ImportError:
+            raise RuntimeError("The onnx backend needs onnxruntime (pip install onnxruntime)")
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        options.inter_op_num_threads = 1
+        if self.threads:
+            options.intra_op_num_threads = self.threads
+        self.session = ort.InferenceSession(self.path, options, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+
+    def _run(self, blob):
+        return self.session.run(None, {self.input_name: blob})[0]
+
+
+class OpenVinoBackend(ExportedBackend):
+    name = "openvino"
+
+    def __init__(self, path=DETECTOR_OPENVINO_PATH, **kwargs):
+        super().__init__(path, **kwargs)
+        self.compiled = None
+
+    def _load(self):
+        try:
+            import openvino as ov
+        except ImportError:
+            raise RuntimeError("The openvino backend needs OpenVINO (pip install openvino)")
+        path = self.path
+        if os.path.isdir(path):
+            # ultralytics exports a directory holding <name>.xml / .bin
+            path = sorted(glob.glob(os.path.join(path, "*.xml")))[0]
+        config = {"PERFORMANCE_HINT": "LATENCY"}
+        if self.threads:
+            config["INFERENCE_NUM_THREADS"] = self.threads
+        self.compiled = ov.Core().compile_model(path, "CPU", config)
+
+    def _run(self, blob):
+        return self.compiled(blob)[self.compiled.output(0)]
+
+
+BACKENDS = {
+    UltralyticsBackend.name: UltralyticsBackend,
+    OnnxBackend.name: OnnxBackend,
+    OpenVinoBackend.name: OpenVinoBackend,
+}
+
+
+def make_backend(name=DETECTOR_BACKEND, **kwargs):
+    """Unloaded backend by name; see BACKENDS."""
+    try:
+        return BACKENDS[name](**kwargs)
+    except KeyError:
+        raise ValueError(f"Unknown detector backend {name!r}; choose from {sorted(BACKENDS)}")
+
+
+# -------------------------------------------------------
+# EXPORT: .pt weights -> fixed-size ONNX / OpenVINO model
+# -------------------------------------------------------
+def export_model(fmt, weights=DETECTOR_WEIGHTS, input_size=DETECTOR_INPUT_SIZE):
+    from ultralytics import YOLO
+    path = YOLO(weights).export(format=fmt, imgsz=input_size, dynamic=False)
+    print(f"[INFO] exported {weights} -> {path} ({fmt}, {input_size}x{input_size})")
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the detector model for the onnx / openvino backends")
+    parser.add_argument("--export", choices=["onnx", "openvino"], required=True)
+    parser.add_argument("--weights", default=DETECTOR_WEIGHTS)
+    parser.add_argument("--size", type=int, default=DETECTOR_INPUT_SIZE, help="fixed square input size")
+    args = parser.parse_args()
+    export_model(args.export, args.weights, args.size)
+
+
+if __name__ == "__main__":
+    main()
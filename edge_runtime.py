@@ -0,0 +1,476 @@
+import argparse
+import gc
+import json
+import os
+import signal
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+import cv2
+
+from cctv_image_capture import CAMERA_INDEX, CaptureWorker, LatestFrameQueue
+from config import (
+    EDGE_PORT, EDGE_MEMORY_BUDGET_MB, EDGE_MEMORY_GRACE, EDGE_MEMORY_CHECK_INTERVAL,
+    EDGE_FRAME_QUEUE, EDGE_HTTP_CONNECTIONS, EDGE_MAX_STREAMS, EDGE_HTTP_IDLE_TIMEOUT,
+    EDGE_STREAM_WRITE_TIMEOUT,
+)
+from controller import TrafficController
+from controller_runner import ControllerRunner
+from count_bus import CountRecord
+from detections import draw_detections
+from frame_bus import JPEG_QUALITY
+from metrics import APP_METRICS, CONTROLLER_METRICS, EDGE_METRICS, Metrics
+from motion_gate import MAX_INTERVAL
+from preempt import PreemptListener, PrioritySender
+from status_stream import StatusBroadcaster, status_payload
+import vehicle_detection
+from vehicle_detection import FRAME_POLL_INTERVAL, LANE_MAP, DetectionLoop, detector
+
+# -------------------------------------------------------
+# SINGLE-PROCESS EDGE RUNTIME
+# -------------------------------------------------------
+# The whole junction in one process for small edge boxes, instead of
+# vehicle_detection.py + app.py (or controller_service.py + gunicorn)
+# talking through shared memory:
+#
+#   capture    CaptureWorker thread, EDGE_FRAME_QUEUE frames held at most
+#   detection  DetectionWorker thread on vehicle_detection's one detector
+#              (motion gate, tracker, priority requests), publishing to
+#              LocalCounts and LatestDetections in memory
+#   control    ControllerRunner thread + PreemptListener, as in app.py
+#   status     stdlib ThreadingHTTPServer with /, /status, /stream,
+#              /history, /metrics and /image; at most EDGE_HTTP_CONNECTIONS
+#              connections (EDGE_MAX_STREAMS of them /stream), extra ones
+#              get a 503; a keep-alive connection idle for
+#              EDGE_HTTP_IDLE_TIMEOUT is closed to free its slot
+#
+# The main thread watches the resident set size. Over EDGE_MEMORY_BUDGET_MB
+# it collects garbage, drops the JPEG and detection caches and throttles
+# detection to one inference per motion_gate.MAX_INTERVAL; if RSS is still
+# over after EDGE_MEMORY_GRACE checks it shuts everything down cleanly and
+# exits with code 1 so the service manager restarts it.
+#
+#   python edge_runtime.py                       # camera CAMERA_INDEX, port EDGE_PORT
+#   python edge_runtime.py --source clip.mp4 --budget 512
+#
+# bench_edge.py compares startup time and memory with the multi-process
+# layout.
+
+HISTORY_ROWS = 10
+JOIN_TIMEOUT = 5.0               # seconds to wait for each worker on shutdown
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def rss_bytes():
+    """Current resident set size of this process."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except OSError:
+        # no /proc: peak RSS instead (bytes on macOS, KiB elsewhere)
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+class LocalCounts:
+    """
+    In-process stand-in for count_bus.CountReader: the detection thread
+    publishes, ControllerRunner reads latest() and leaves its decision hint.
+    Each record is swapped in as one reference, so no lock is needed.
+    """
+
+    def __init__(self, lane_map=LANE_MAP):
+        self.lane_map = lane_map
+        self.record = None
+        self._decision_at = None
+
+    def publish(self, counts, capture_ts, queues=None, flows=None):
+        seq = self.record.seq + 1 if self.record is not None else 1
+        self.record = CountRecord(
+            seq, capture_ts, time.time(), counts,
+            self.lane_map.as_dict(queues) if queues is not None else None,
+            self.lane_map.as_dict(flows) if flows is not None else None,
+        )
+        return seq
+
+    def latest(self):
+        return self.record
+
+    def decision_at(self):
+        return self._decision_at
+
+    def set_decision_at(self, ts):
+        self._decision_at = ts or None
+
+
+class LatestDetections:
+    """
+    Newest inferred frame and its detections for /status and /image (the
+    in-process counterpart of frame_bus.FrameReader): the frame is annotated
+    and JPEG-encoded at most once, when /image first asks for it.
+    """
+
+    def __init__(self, lane_map=LANE_MAP):
+        self.lane_map = lane_map
+        self._latest = None          # (seq, frame, Detections)
+        self._lock = threading.Lock()
+        self._jpeg_seq = None
+        self._jpeg = None
+
+    def publish(self, frame, capture_ts, detections):
+        seq = self._latest[0] + 1 if self._latest is not None else 1
+        self._latest = (seq, frame, detections)
+
+    def has_frame(self):
+        return self._latest is not None
+
+    def frame_seq(self):
+        latest = self._latest
+        return latest[0] if latest is not None else 0
+
+    def latest_jpeg(self):
+        """JPEG bytes of the newest frame, or None if there is no frame yet."""
+        with self._lock:
+            latest = self._latest
+            if latest is None:
+                return None
+            seq, frame, detections = latest
+            if self._jpeg is not None and seq == self._jpeg_seq:
+                return self._jpeg
+
+            outlines = self.lane_map.outlines(frame.shape[0], frame.shape[1])
+            ok, encoded = cv2.imencode(".jpg", draw_detections(frame, detections, outlines),
+                                       [cv2.IMWRITE_JPEG_QUALITY, JPEG_QUALITY])
+            if not ok:
+                return self._jpeg
+            self._jpeg_seq = seq
+            self._jpeg = encoded.tobytes()
+            return self._jpeg
+
+    def drop_cache(self):
+        with self._lock:
+            self._jpeg = None
+            self._jpeg_seq = None
+
+
+class DetectionWorker(threading.Thread):
+    """
+    vehicle_detection.DetectionLoop on a thread, publishing counts, tracker
+    queues and the frame in memory. Priority requests go straight to
+    `on_priority` (ControllerRunner.preempt).
+    """
+
+    def __init__(self, capture, counts, frames, on_priority=None, lane_map=LANE_MAP):
+        super().__init__(name="detection", daemon=True)
+        self.priority = PrioritySender(deliver=on_priority) if on_priority is not None else None
+        self.loop = DetectionLoop(capture, counts, frames, self.priority, lane_map, log=False)
+        self.first_counts_at = None  # perf_counter() of the first published counts
+        self._stopped = threading.Event()
+
+    @property
+    def throttled(self):
+        return self.loop.throttle > 0
+
+    @throttled.setter
+    def throttled(self, value):
+        # memory pressure: infer at most every MAX_INTERVAL
+        self.loop.throttle = MAX_INTERVAL if value else 0.0
+
+    def stop(self):
+        self._stopped.set()
+
+    def run(self):
+        while not self._stopped.is_set():
+            if self.loop.step() is not None and self.first_counts_at is None:
+                self.first_counts_at = time.perf_counter()
+            self._stopped.wait(FRAME_POLL_INTERVAL)
+
+
+# -------------------------------------------------------
+# STATUS SERVER
+# -------------------------------------------------------
+_BUSY = (b"HTTP/1.1 503 Service Unavailable\r\nContent-Length: 0\r\n"
+         b"Retry-After: 1\r\nConnection: close\r\n\r\n")
+
+
+class EdgeHTTPServer(ThreadingHTTPServer):
+    """
+    ThreadingHTTPServer with at most `connections` connections (threads)
+    open, `streams` of them on /stream.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, address, runtime, connections=EDGE_HTTP_CONNECTIONS, streams=EDGE_MAX_STREAMS):
+        super().__init__(address, StatusHandler)
+        self.runtime = runtime
+        self.slots = threading.BoundedSemaphore(connections)
+        self.stream_slots = threading.BoundedSemaphore(streams)
+
+    def process_request(self, request, client_address):
+        if not self.slots.acquire(blocking=False):
+            self.runtime.edge_metrics.inc("edge_http_rejected_total")
+            try:
+                request.sendall(_BUSY)
+            except OSError:
+                pass
+            self.shutdown_request(request)
+            return
+        super().process_request(request, client_address)
+
+    def process_request_thread(self, request, client_address):
+        try:
+            super().process_request_thread(request, client_address)
+        finally:
+            self.slots.release()
+
+
+class StatusHandler(BaseHTTPRequestHandler):
+    """The dashboard's routes from app.py, served from the runtime's memory."""
+
+    protocol_version = "HTTP/1.1"        # keep-alive for polling dashboards
+    server_version = "traffic-edge"
+    timeout = EDGE_HTTP_IDLE_TIMEOUT     # idle keep-alive connections give their slot back
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status, body=b"", content_type="application/json"):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _json(self, payload, status=200):
+        self._send(status, json.dumps(payload).encode())
+
+    def do_GET(self):
+        runtime = self.server.runtime
+        path = urlsplit(self.path).path
+        if path == "/":
+            self._send(200, runtime.index_html, "text/html; charset=utf-8")
+        elif path == "/status":
+            with runtime.app_metrics.timer("app_status_seconds"):
+                runtime.app_metrics.inc("app_status_requests_total")
+                self._json(runtime.status())
+        elif path == "/stream":
+            self._stream(runtime)
+        elif path == "/history":
+            self._json(runtime.history())
+        elif path == "/metrics":
+            self._send(200, runtime.render_metrics().encode(), "text/plain; version=0.0.4")
+        elif path == "/image":
+            jpeg = runtime.frames.latest_jpeg()
+            if jpeg is None:
+                self._send(404, content_type="text/plain")
+            else:
+                self._send(200, jpeg, "image/jpeg")
+        else:
+            self._send(404, content_type="text/plain")
+
+    def _stream(self, runtime):
+        slots = self.server.stream_slots
+        if not slots.acquire(blocking=False):
+            # the dashboard falls back to polling /status
+            self._send(503, content_type="text/plain")
+            return
+        try:
+            self._send_events(runtime)
+        finally:
+            slots.release()
+
+    def _send_events(self, runtime):
+        try:
+            last = int(self.headers.get("Last-Event-ID", 0))
+        except ValueError:
+            last = 0
+
+        # the stream only writes, so the idle timeout does not apply; a client
+        # that stops reading still frees its slot once a write stalls
+        self.connection.settimeout(EDGE_STREAM_WRITE_TIMEOUT)
+        self.close_connection = True     # no length: the stream ends with the connection
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        events = runtime.broadcaster.stream(last)
+        try:
+            for data in events:
+                if runtime.stopped:
+                    break
+                self.wfile.write(data)
+                self.wfile.flush()
+        except OSError:
+            pass                          # client went away
+        finally:
+            events.close()
+
+
+# -------------------------------------------------------
+# RUNTIME
+# -------------------------------------------------------
+class EdgeRuntime:
+    def __init__(self, source=CAMERA_INDEX, port=EDGE_PORT, host="0.0.0.0",
+                 budget_mb=EDGE_MEMORY_BUDGET_MB, log_path="data/logs/cycles"):
+        self.started = time.perf_counter()
+        self.budget = budget_mb * 2 ** 20
+        self.budget_mb = budget_mb
+        self.over_budget = 0             # consecutive memory checks over the budget
+        self.stopped = False
+        self._stop = threading.Event()
+
+        self.edge_metrics = Metrics(EDGE_METRICS)
+        self.app_metrics = Metrics(APP_METRICS)
+        self.controller_metrics = Metrics(CONTROLLER_METRICS)
+
+        self.controller = TrafficController(log_path=log_path, metrics=self.controller_metrics)
+        self.counts = LocalCounts()
+        self.frames = LatestDetections()
+        self.broadcaster = StatusBroadcaster()
+        self.runner = ControllerRunner(self.controller, self.counts, on_change=self.publish_status,
+                                       metrics=self.controller_metrics)
+        self.preempt_listener = None
+
+        self.capture = CaptureWorker(source, LatestFrameQueue(EDGE_FRAME_QUEUE))
+        self.detection = DetectionWorker(self.capture, self.counts, self.frames, self.runner.preempt)
+
+        with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), "templates", "index.html"), "rb") as f:
+            self.index_html = f.read()
+        self.server = EdgeHTTPServer((host, port), self)
+
+    # ---------------- status ----------------
+    def publish_status(self, state):
+        self.broadcaster.publish(status_payload(state, self.frames))
+
+    def status(self):
+        state = self.controller.snapshot()
+        payload = status_payload(state, self.frames)
+        payload["remaining_time"] = state.remaining
+        payload["server_time"] = time.time()
+        return payload
+
+    def history(self):
+        cycle_log = self.controller.cycle_log
+        return [
+            {
+                "timestamp": row["timestamp"],
+                "phase": row["phase"],
+                "vehicle_ns": row["vehicle_count_ns"],
+                "vehicle_ew": row["vehicle_count_ew"],
+                "green_time": row["green_time"],
+            }
+            for row in (cycle_log.last(HISTORY_ROWS) if cycle_log is not None else [])
+        ]
+
+    def render_metrics(self):
+        if self.detection.first_counts_at is not None:
+            self.edge_metrics.set("edge_ready_seconds", self.detection.first_counts_at - self.started)
+        self.app_metrics.set("app_stream_subscribers", self.broadcaster.subscribers)
+        return (self.edge_metrics.render(f'pid="{os.getpid()}"')
+                + self.app_metrics.render()
+                + self.controller_metrics.render()
+                + vehicle_detection.metrics.render())
+
+    # ---------------- memory budget ----------------
+    def check_memory(self):
+        """
+        One watchdog step; returns False once RSS has stayed over the budget
+        for more than EDGE_MEMORY_GRACE checks.
+        """
+        rss = rss_bytes()
+        self.edge_metrics.set("edge_rss_bytes", rss)
+        if rss <= self.budget:
+            if self.over_budget:
+                print(f"[INFO] RSS {rss / 2 ** 20:.0f} MB back under budget; detection resumed")
+            self.over_budget = 0
+            self.detection.throttled = False
+            return True
+
+        self.over_budget += 1
+        self.edge_metrics.inc("edge_memory_pressure_total")
+        print(f"[WARN] RSS {rss / 2 ** 20:.0f} MB over the {self.budget_mb} MB budget "
+              f"({self.over_budget}/{EDGE_MEMORY_GRACE}); throttling detection")
+        self.detection.throttled = True
+        self.frames.drop_cache()
+        vehicle_detection.cache.clear()
+        gc.collect()
+        return self.over_budget < EDGE_MEMORY_GRACE
+
+    # ---------------- lifecycle ----------------
+    def stop(self, *_):
+        self._stop.set()
+
+    def run(self):
+        """Start every thread, then watch memory until stopped. Returns the exit code."""
+        self.capture.start()
+        self.publish_status(self.controller.snapshot())
+        self.runner.start()
+        self.preempt_listener = PreemptListener.start_on(self.runner.preempt)
+        threading.Thread(target=self.server.serve_forever, name="status-http", daemon=True).start()
+
+        startup = time.perf_counter() - self.started
+        self.edge_metrics.set("edge_startup_seconds", startup)
+        host, port = self.server.server_address[:2]
+        print(f"[INFO] Edge runtime serving on http://{host}:{port} after {startup:.2f} s "
+              f"(memory budget {self.budget_mb} MB)")
+
+        # load + warm the model while the camera opens; the signal already runs
+        detector.warmup()
+        print(f"[INFO] detector warm in {detector.warmup_time:.2f} s")
+        self.detection.start()
+
+        code = 0
+        try:
+            while not self._stop.wait(EDGE_MEMORY_CHECK_INTERVAL):
+                if not self.check_memory():
+                    print(f"[WARN] Memory budget exceeded for {EDGE_MEMORY_GRACE} checks; shutting down")
+                    code = 1
+                    break
+        finally:
+            self.shutdown()
+        return code
+
+    def shutdown(self):
+        self.stopped = True
+        self.server.shutdown()
+        self.server.server_close()
+        if self.preempt_listener is not None:
+            self.preempt_listener.stop()
+        self.detection.stop()
+        self.capture.stop()
+        self.runner.stop()
+        for thread in (self.detection, self.capture, self.runner):
+            if thread.is_alive():
+                thread.join(JOIN_TIMEOUT)
+        if self.detection.priority is not None:
+            self.detection.priority.close()
+        if self.controller.cycle_log is not None:
+            self.controller.cycle_log.close()
+        if self.controller.rollups is not None:
+            self.controller.rollups.flush()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Capture, detection, control and status in one process")
+    parser.add_argument("--source", default=CAMERA_INDEX, help="camera index, RTSP URL or video file")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=EDGE_PORT)
+    parser.add_argument("--budget", type=int, default=EDGE_MEMORY_BUDGET_MB, help="RSS budget in MB")
+    args = parser.parse_args()
+
+    source = int(args.source) if str(args.source).isdigit() else args.source
+    runtime = EdgeRuntime(source, port=args.port, host=args.host, budget_mb=args.budget)
+    signal.signal(signal.SIGTERM, runtime.stop)
+    signal.signal(signal.SIGINT, runtime.stop)
+    sys.exit(runtime.run())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+from config import (
+    FORECAST_SEASON_ALPHA, FORECAST_LEVEL_ALPHA, FORECAST_MIN_SAMPLES,
+)
+from timing_plan import local_hours
+
+# -------------------------------------------------------
+# ONLINE DEMAND FORECASTER (EXPERIMENTAL)
+# -------------------------------------------------------
+# Off by default (config.FORECAST_ENABLED): in the simulator its learned
+# multipliers and arrival rates still lose to the fixed peak / night
+# profile, so the controller does not rely on it.
+#
+# Seasonal profile + exponential smoothing, per phase (or any other key):
+#
+#   profile[k][bin] : smoothed arrival rate (veh/s) for weekday/hour `bin`
+#   level[k]        : smoothed ratio observed / profile (today vs a usual day)
+#   mean[k]         : long-run mean arrival rate
+#
+#   rate(t) = level x profile[bin(t)]
+#
+# Arrival rates come from served(): when a phase's green ends, every other
+# phase's waiting demand has built up since its own green ended, so
+# (demand - what was still waiting then) / elapsed is its arrival rate over
+# that red. The same rule replays
+# cycle log rows in train(); the log records NS and EW counts only, so
+# only a ring with NS / EW phases is bootstrapped from it, other rings learn
+# from live cycles alone. observe() is O(1) per key and rate() /
+# forecast() are a couple of list lookups, so the controller can ask on
+# every decision.
+
+BINS = 7 * 24
+MAX_LEVEL = 3.0
+MAX_RED = 3600               # longer gaps (controller down) are not one red
+
+# phase -> cycle log column with its count (cycle_log.py logs two phases)
+LOGGED_COUNTS = {"NS": "vehicle_count_ns", "EW": "vehicle_count_ew"}
+
+
+def _bin(ts):
+    return local_hours.week_hour(ts)
+
+
+class DemandForecaster:
+    def __init__(self, keys, season_alpha=FORECAST_SEASON_ALPHA, level_alpha=FORECAST_LEVEL_ALPHA):
+        self.keys = tuple(keys)
+        self.season_alpha = season_alpha
+        self.level_alpha = level_alpha
+        self.profile = {k: [0.0] * BINS for k in self.keys}
+        self.samples = {k: [0] * BINS for k in self.keys}
+        self.level = {k: 1.0 for k in self.keys}
+        self.mean = {k: 0.0 for k in self.keys}
+        self.observations = {k: 0 for k in self.keys}
+        self.served_at = {}          # key -> (epoch seconds its last green ended, vehicles left)
+
+    # ---------------- learning ----------------
+    def observe(self, when, key, vehicles, seconds):
+        """Learn that `vehicles` of `key` arrived over the `seconds` before `when` (epoch seconds)."""
+        if seconds <= 0 or key not in self.profile:
+            return
+        b = _bin(when)
+        rate = vehicles / seconds
+        profile = self.profile[key]
+        seasonal = profile[b]
+
+        if seasonal > 0:
+            ratio = min(rate / seasonal, MAX_LEVEL)
+            self.level[key] += self.level_alpha * (ratio - self.level[key])
+        if self.samples[key][b] == 0:
+            profile[b] = rate
+        else:
+            profile[b] += self.season_alpha * (rate - seasonal)
+
+        self.observations[key] += 1
+        self.mean[key] += (rate - self.mean[key]) / self.observations[key]
+        self.samples[key][b] += 1
+
+    def served(self, ts, key, demand):
+        """
+        The green of `key` ended at epoch `ts` with {key: waiting vehicles}
+        in `demand`: learn the arrival rate of every other key.
+        """
+        for other, vehicles in demand.items():
+            if other == key:
+                continue
+            since, left = self.served_at.get(other, (None, 0))
+            if since is not None and 0 < ts - since < MAX_RED:
+                self.observe(ts, other, max(0, vehicles - left), ts - since)
+        self.served_at[key] = (ts, demand.get(key, 0))
+
+    def train(self, rows):
+        """
+        Bootstrap from cycle log rows (cycle_log.CycleLog.range()): only the
+        keys with a logged count column (LOGGED_COUNTS) learn anything.
+        """
+        columns = {k: LOGGED_COUNTS[k] for k in self.keys if k in LOGGED_COUNTS}
+        if not columns:
+            print(f"[INFO] Forecaster: the cycle log has no counts for phases {list(self.keys)}; "
+                  f"learning from live cycles only")
+            return self
+        for row in rows:
+            self.served(
+                row["ts"],
+                row["phase"].removesuffix("_GREEN"),
+                {k: row[column] for k, column in columns.items()},
+            )
+        return self
+
+    # ---------------- queries ----------------
+    def ready(self, when, key=None):
+        b = _bin(when)
+        keys = (key,) if key is not None else self.keys
+        return all(self.samples[k][b] >= FORECAST_MIN_SAMPLES for k in keys)
+
+    def rate(self, when, key):
+        """Expected arrival rate (veh/s) of `key` at `when`, or None if unknown."""
+        if not self.ready(when, key):
+            return None
+        return self.level[key] * self.profile[key][_bin(when)]
+
+    def forecast(self, when, seconds):
+        """{key: expected arrivals over the next `seconds`}, or None if unknown."""
+        if not self.ready(when):
+            return None
+        b = _bin(when)
+        return {k: self.level[k] * self.profile[k][b] * seconds for k in self.keys}
+
+    def multiplier(self, when, key, bounds):
+        """
+        Learned replacement for the fixed peak / night multipliers: expected
+        rate now relative to the long-run mean, clamped to `bounds` (the
+        running timing plan's multiplier_range, so a reloaded plan's peak /
+        night values apply). None until the current bin has enough samples.
+        """
+        rate = self.rate(when, key)
+        if rate is None or self.mean[key] <= 0:
+            return None
+        low, high = bounds
+        return max(low, min(rate / self.mean[key], high))
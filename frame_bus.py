@@ -0,0 +1,212 @@
+import struct
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from count_bus import open_segment, unlink_segment
+from detections import Detections, draw_detections
+
+# -------------------------------------------------------
+# SHARED-MEMORY FRAME SLOT
+# -------------------------------------------------------
+# The latest raw BGR frame and its vehicle detections, published by the
+# process that owns the camera (vehicle_detection.py or
+# cctv_image_capture.py). app.py copies them out, draws the boxes and
+# JPEG-encodes the result only when /image is actually requested.
+#
+# Layout (little endian):
+#   header     : magic, version, max_bytes, seq, capture_ts, publish_ts,
+#                height, width, channels, n_detections
+#   pixels     : max_bytes
+#   detections : MAX_DETECTIONS x (x1, y1, x2, y2, conf, lane) float32
+#
+# seq is a seqlock (odd while the writer is copying pixels in).
+
+FRAME_BUS_NAME = "traffic_frame"
+
+MAGIC = b"TFB1"
+VERSION = 2
+MAX_FRAME_BYTES = 3840 * 2160 * 3        # up to 4K BGR
+MAX_DETECTIONS = 512
+JPEG_QUALITY = 80
+
+_HEADER = struct.Struct("<4sIQQddIIII")
+_SEQ_OFFSET = 4 + 4 + 8
+_SEQ = struct.Struct("<Q")
+_PIXELS_OFFSET = 64
+_DETECTIONS_OFFSET = _PIXELS_OFFSET + MAX_FRAME_BYTES
+SEGMENT_SIZE = _DETECTIONS_OFFSET + MAX_DETECTIONS * 6 * 4
+
+READ_RETRIES = 20
+
+
+class FrameBus:
+    """
+    Single-slot shared-memory frame buffer. Use FrameBus.create() in the
+    writer and FrameBus.attach() in readers.
+    """
+
+    def __init__(self, shm):
+        self.shm = shm
+        self.buf = shm.buf
+        self.pixels = np.ndarray((MAX_FRAME_BYTES,), dtype=np.uint8,
+                                 buffer=shm.buf, offset=_PIXELS_OFFSET)
+        self.detections = np.ndarray((MAX_DETECTIONS, 6), dtype=np.float32,
+                                     buffer=shm.buf, offset=_DETECTIONS_OFFSET)
+
+    @classmethod
+    def create(cls, name=FRAME_BUS_NAME):
+        try:
+            shm = open_segment(name, SEGMENT_SIZE)
+            _HEADER.pack_into(shm.buf, 0, MAGIC, VERSION, MAX_FRAME_BYTES, 0, 0.0, 0.0, 0, 0, 0, 0)
+        except FileExistsError:
+            shm = open_segment(name)
+            if shm.size < SEGMENT_SIZE or bytes(shm.buf[:4]) != MAGIC \
+                    or _HEADER.unpack_from(shm.buf, 0)[1] != VERSION:
+                shm.close()
+                raise ValueError(f"Shared memory {name!r} is not a frame bus")
+        return cls(shm)
+
+    @classmethod
+    def attach(cls, name=FRAME_BUS_NAME):
+        shm = open_segment(name)
+        magic, version, max_bytes = _HEADER.unpack_from(shm.buf, 0)[:3]
+        if magic != MAGIC or version != VERSION or max_bytes != MAX_FRAME_BYTES:
+            shm.close()
+            raise ValueError(f"Shared memory {name!r} has an incompatible layout")
+        return cls(shm)
+
+    @classmethod
+    def try_attach(cls, name=FRAME_BUS_NAME):
+        try:
+            return cls.attach(name)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def close(self):
+        self.pixels = None
+        self.detections = None
+        self.buf = None
+        self.shm.close()
+
+    def unlink(self):
+        unlink_segment(self.shm)
+
+    # ---------------- writer ----------------
+    def seq(self):
+        return _SEQ.unpack_from(self.buf, _SEQ_OFFSET)[0]
+
+    def publish(self, frame, capture_ts=None, detections=None):
+        frame = np.ascontiguousarray(frame)
+        if frame.ndim == 2:
+            frame = frame[:, :, None]
+        if frame.nbytes > MAX_FRAME_BYTES:
+            raise ValueError(f"Frame of {frame.nbytes} bytes exceeds {MAX_FRAME_BYTES}")
+
+        now = time.time()
+        if capture_ts is None:
+            capture_ts = now
+        height, width, channels = frame.shape
+        n_detections = 0 if detections is None else min(len(detections), MAX_DETECTIONS)
+        seq = (self.seq() // 2 + 1) * 2
+
+        _SEQ.pack_into(self.buf, _SEQ_OFFSET, seq - 1)
+        self.pixels[:frame.nbytes] = frame.reshape(-1)
+        if n_detections:
+            rows = self.detections[:n_detections]
+            rows[:, :4] = detections.boxes[:n_detections]
+            rows[:, 4] = detections.confs[:n_detections]
+            rows[:, 5] = detections.lanes[:n_detections]
+        _HEADER.pack_into(self.buf, 0, MAGIC, VERSION, MAX_FRAME_BYTES,
+                          seq - 1, capture_ts, now, height, width, channels, n_detections)
+        _SEQ.pack_into(self.buf, _SEQ_OFFSET, seq)
+        return seq // 2
+
+    # ---------------- readers ----------------
+    def latest(self):
+        """
+        Return (seq, capture_ts, frame copy, Detections) or None if nothing
+        was published yet.
+        """
+        for _ in range(READ_RETRIES):
+            header = _HEADER.unpack_from(self.buf, 0)
+            seq, capture_ts = header[3], header[4]
+            height, width, channels, n_detections = header[6:]
+            if seq == 0:
+                return None
+            if seq % 2:
+                time.sleep(0.001)
+                continue
+            nbytes = height * width * channels
+            frame = self.pixels[:nbytes].copy().reshape(height, width, channels)
+            rows = self.detections[:n_detections].copy()
+            if self.seq() == seq:
+                detections = Detections(
+                    rows[:, :4].astype(np.int32),
+                    rows[:, 4].copy(),
+                    rows[:, 5].astype(np.uint8),
+                )
+                return seq // 2, capture_ts, frame, detections
+        return None
+
+
+class FrameReader:
+    """
+    Lazily attached frame reader with a one-entry JPEG cache, so each frame
+    is annotated and encoded at most once no matter how many dashboards
+    request it.
+    """
+
+    def __init__(self, name=FRAME_BUS_NAME, lane_map=None):
+        self.name = name
+        self.lane_map = lane_map
+        self.bus = None
+        self._lock = threading.Lock()
+        self._jpeg_seq = None
+        self._jpeg = None
+
+    def _attached(self):
+        if self.bus is None:
+            self.bus = FrameBus.try_attach(self.name)
+        return self.bus
+
+    def has_frame(self):
+        bus = self._attached()
+        return bus is not None and bus.seq() > 0
+
+    def frame_seq(self):
+        bus = self._attached()
+        return bus.seq() // 2 if bus is not None else 0
+
+    def latest(self):
+        """(seq, capture_ts, frame copy, Detections) of the newest frame, or None."""
+        bus = self._attached()
+        return bus.latest() if bus is not None else None
+
+    def latest_jpeg(self):
+        """JPEG bytes of the newest frame, or None if there is no frame yet."""
+        bus = self._attached()
+        if bus is None:
+            return None
+
+        with self._lock:
+            if self._jpeg is not None and bus.seq() // 2 == self._jpeg_seq:
+                return self._jpeg
+
+            latest = bus.latest()
+            if latest is None:
+                return self._jpeg
+            seq, _, frame, detections = latest
+
+            outlines = None
+            if self.lane_map is not None:
+                outlines = self.lane_map.outlines(frame.shape[0], frame.shape[1])
+            frame = draw_detections(frame, detections, outlines)
+            ok, encoded = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, JPEG_QUALITY])
+            if not ok:
+                return self._jpeg
+            self._jpeg_seq = seq
+            self._jpeg = encoded.tobytes()
+            return self._jpeg
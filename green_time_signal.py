@@ -1,5 +1,6 @@
 import time
-import os
+
+from count_bus import CountReader
 
 BASE_GREEN_TIME = 30      # seconds
 VEHICLE_MULTIPLIER = 2    # +2s per vehicle
@@ -11,30 +12,16 @@ def adjust_green_signal_time(vehicle_count):
 
 def main():
     last_count = None
+    counts = CountReader()
 
     while True:
-        if not os.path.exists("vehicle_count.txt"):
-            print("vehicle_count.txt not found. Waiting for detection...")
+        record = counts.latest()
+        if record is None:
+            print("No vehicle counts published yet. Waiting for detection...")
             time.sleep(READ_INTERVAL)
             continue
 
-        try:
-            with open("vehicle_count.txt", "r") as file:
-                data = file.read().strip()
-                if not data:
-                    print("Empty vehicle_count.txt. Waiting...")
-                    time.sleep(READ_INTERVAL)
-                    continue
-                vehicle_count = int(data)
-
-            if vehicle_count < 0:
-                print("Invalid vehicle count in the file. Count must be non‑negative.")
-                time.sleep(READ_INTERVAL)
-                continue
-        except Exception as e:
-            print(f"Error reading vehicle count from file: {e}")
-            time.sleep(READ_INTERVAL)
-            continue
+        vehicle_count = record.total
 
         # Only print when value changes
         if vehicle_count != last_count:
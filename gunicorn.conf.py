@@ -0,0 +1,42 @@
+import os
+import subprocess
+import sys
+
+# -------------------------------------------------------
+# PRODUCTION SERVING: gunicorn -c gunicorn.conf.py
+# -------------------------------------------------------
+# Several app.py workers behind one controller authority. The master starts
+# controller_service.py once; workers run with TRAFFIC_STATE=shared and read
+# the controller state from shared memory (state_bus.py), so every worker
+# serves the same phase timeline.
+#
+# Environment:
+#   TRAFFIC_BIND        listen address          (default 0.0.0.0:5000)
+#   TRAFFIC_WORKERS     web worker processes    (default: CPU count)
+#   TRAFFIC_THREADS     threads per worker      (each open /stream holds one)
+#   TRAFFIC_CONTROLLER  "external" if controller_service.py is run separately
+
+wsgi_app = "app:app"
+bind = os.environ.get("TRAFFIC_BIND", "0.0.0.0:5000")
+workers = int(os.environ.get("TRAFFIC_WORKERS", os.cpu_count() or 1))
+worker_class = "gthread"
+threads = int(os.environ.get("TRAFFIC_THREADS", 32))
+keepalive = 5
+raw_env = ["TRAFFIC_STATE=shared"]
+
+_service = None
+
+
+def on_starting(server):
+    global _service
+    if os.environ.get("TRAFFIC_CONTROLLER") == "external":
+        return
+    here = os.path.dirname(os.path.abspath(__file__))
+    _service = subprocess.Popen([sys.executable, os.path.join(here, "controller_service.py")])
+    server.log.info("Started controller authority (pid %s)", _service.pid)
+
+
+def on_exit(server):
+    if _service is not None and _service.poll() is None:
+        _service.terminate()
+        _service.wait(timeout=10)
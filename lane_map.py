@@ -0,0 +1,99 @@
+import json
+import os
+
+import cv2
+import numpy as np
+
+from config import DEFAULT_LANES, LANE_MAP_PATH
+
+OUTSIDE = 255          # lane index of detections outside every polygon
+MAX_LANES = 254
+
+
+class LaneMap:
+    """
+    Named lane polygons of one camera.
+
+    For every frame resolution a uint8 label raster is rendered once
+    (0 = outside, i + 1 = lane i), so assigning N detections to lanes is a
+    single fancy-index lookup instead of N point-in-polygon tests.
+    Later polygons win where polygons overlap.
+
+    A lane is either a bare polygon or {"polygon": [...], "stop_line":
+    [[x1, y1], [x2, y2]]}; the optional stop line is used by tracker.py to
+    count vehicles crossing it.
+    """
+
+    def __init__(self, lanes):
+        if not lanes or len(lanes) > MAX_LANES:
+            raise ValueError(f"Need 1..{MAX_LANES} lanes, got {len(lanes)}")
+        self.names = tuple(lanes)
+        self.polygons = []
+        self.stop_lines = np.full((len(self.names), 4), np.nan, dtype=np.float32)
+
+        for i, name in enumerate(self.names):
+            lane = lanes[name]
+            if isinstance(lane, dict):
+                if lane.get("stop_line") is not None:
+                    self.stop_lines[i] = np.asarray(lane["stop_line"], dtype=np.float32).reshape(4)
+                lane = lane["polygon"]
+            self.polygons.append(np.asarray(lane, dtype=np.float32).reshape(-1, 2))
+
+        # content identity (names + polygons): equal for maps loaded from the
+        # same lanes, so per-map caches survive a reload
+        self.key = (self.names, tuple(poly.tobytes() for poly in self.polygons))
+        self._rasters = {}
+
+    @classmethod
+    def load(cls, camera="cam0", path=LANE_MAP_PATH):
+        """Lane map of `camera` from the JSON file, else config.DEFAULT_LANES."""
+        if os.path.exists(path):
+            with open(path) as f:
+                cameras = json.load(f)
+            if camera in cameras:
+                return cls(cameras[camera])
+        return cls(DEFAULT_LANES)
+
+    def outlines(self, height, width):
+        """Polygons in pixel coordinates (int32 arrays for cv2 drawing)."""
+        scale = np.array([width, height], dtype=np.float32)
+        return [np.round(poly * scale).astype(np.int32) for poly in self.polygons]
+
+    def roi(self, height, width, margin=0.0):
+        """
+        Pixel rectangle (x1, y1, x2, y2) around every lane polygon, grown by
+        `margin` (fraction of the frame) and clipped to the frame.
+        """
+        points = np.concatenate(self.polygons)
+        low = np.clip(points.min(axis=0) - margin, 0.0, 1.0)
+        high = np.clip(points.max(axis=0) + margin, 0.0, 1.0)
+        x1, y1 = int(low[0] * width), int(low[1] * height)
+        x2, y2 = int(np.ceil(high[0] * width)), int(np.ceil(high[1] * height))
+        return x1, y1, max(x2, x1 + 1), max(y2, y1 + 1)
+
+    def stop_lines_px(self, height, width):
+        """(n_lanes, 4) stop lines [x1, y1, x2, y2] in pixels, NaN if none."""
+        return self.stop_lines * np.array([width, height, width, height], dtype=np.float32)
+
+    def raster(self, height, width):
+        label = self._rasters.get((height, width))
+        if label is None:
+            label = np.zeros((height, width), dtype=np.uint8)
+            for i, pts in enumerate(self.outlines(height, width)):
+                cv2.fillPoly(label, [pts], i + 1)
+            self._rasters[(height, width)] = label
+        return label
+
+    def assign(self, boxes, height, width):
+        """Lane index (uint8, OUTSIDE if none) of each [x1, y1, x2, y2] box centre."""
+        label = self.raster(height, width)
+        cx = np.clip((boxes[:, 0] + boxes[:, 2]) // 2, 0, width - 1)
+        cy = np.clip((boxes[:, 1] + boxes[:, 3]) // 2, 0, height - 1)
+        return label[cy, cx] - np.uint8(1)          # 0 wraps to OUTSIDE
+
+    def count(self, lanes):
+        """Per-lane counts (int array in self.names order) of assigned lanes."""
+        return np.bincount(lanes[lanes != OUTSIDE], minlength=len(self.names))
+
+    def as_dict(self, counts):
+        return dict(zip(self.names, counts.tolist()))
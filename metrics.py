@@ -0,0 +1,276 @@
+import json
+import struct
+import time
+
+import numpy as np
+
+from count_bus import open_segment, unlink_segment
+
+# -------------------------------------------------------
+# PIPELINE METRICS
+# -------------------------------------------------------
+# Counters, gauges and HDR-style latency histograms kept in one flat
+# float64 buffer per process, cheap enough to leave on in production:
+# observe() is an integer bit_length() and three memoryview increments
+# (about a microsecond, against tens of milliseconds per inferred frame).
+#
+# Histogram buckets are log-linear over microseconds, like HdrHistogram
+# with 3 significant bits: exact below 16 us, then 8 buckets per power of
+# two (<= 12.5 % relative error) up to 2^31 us (~36 min).
+#
+# A process that wants its metrics scraped from elsewhere (the detector,
+# the controller authority) calls share(role): the array moves into the
+# shared-memory segment "traffic_metrics_<role>", whose header holds the
+# metric spec as JSON, and app.py's /metrics renders it with
+# render_shared(role). Updates are not seqlocked; a scrape may see one
+# histogram a single observation ahead of its count, which Prometheus
+# tolerates.
+
+SEGMENT_PREFIX = "traffic_metrics_"
+METRIC_PREFIX = "traffic_"
+
+MAGIC = b"TMB1"
+_HEADER = struct.Struct("<4sII")             # magic, spec bytes, n values
+_DATA_ALIGN = 8
+
+COUNTER = "counter"
+GAUGE = "gauge"
+HISTOGRAM = "histogram"
+
+SUB_BUCKETS = 8                              # per power of two (3 bits)
+LINEAR_BUCKETS = 2 * SUB_BUCKETS             # exact microseconds below this
+OCTAVES = 27
+N_BUCKETS = LINEAR_BUCKETS + OCTAVES * SUB_BUCKETS
+HISTOGRAM_SLOTS = 2 + N_BUCKETS              # count, sum (seconds), buckets
+
+
+def bucket_index(us):
+    """Histogram bucket of an integer number of microseconds."""
+    if us < LINEAR_BUCKETS:
+        return us if us > 0 else 0
+    shift = us.bit_length() - 4
+    index = LINEAR_BUCKETS + (shift - 1) * SUB_BUCKETS + (us >> shift) - SUB_BUCKETS
+    return index if index < N_BUCKETS else N_BUCKETS - 1
+
+
+def bucket_upper(index):
+    """Exclusive upper bound of bucket `index`, in seconds."""
+    if index < LINEAR_BUCKETS:
+        return (index + 1) * 1e-6
+    shift = (index - LINEAR_BUCKETS) // SUB_BUCKETS + 1
+    top = SUB_BUCKETS + (index - LINEAR_BUCKETS) % SUB_BUCKETS
+    return ((top + 1) << shift) * 1e-6
+
+
+# Prometheus gets one `le` per power of two (the HDR resolution stays
+# available through quantile())
+EXPORTED_BUCKETS = tuple(range(LINEAR_BUCKETS - 1, N_BUCKETS, SUB_BUCKETS))
+
+
+class _Timer:
+    __slots__ = ("metrics", "name", "start")
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.observe(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class Metrics:
+    """
+    Fixed set of metrics declared up front by `spec`, a list of
+    (name, kind, help) with kind COUNTER, GAUGE or HISTOGRAM. Histograms
+    observe seconds.
+    """
+
+    def __init__(self, spec, values=None):
+        self.spec = [tuple(s) for s in spec]
+        self.offset = {}
+        size = 0
+        for name, kind, _help in self.spec:
+            self.offset[name] = size
+            size += HISTOGRAM_SLOTS if kind == HISTOGRAM else 1
+        if values is None:
+            values = memoryview(bytearray(8 * size)).cast("d")
+        self.values = values             # memoryview of doubles: fastest item access
+        self.shm = None
+
+    # ---------------- hot path ----------------
+    def observe(self, name, seconds):
+        base = self.offset[name]
+        values = self.values
+        values[base] += 1
+        values[base + 1] += seconds
+        values[base + 2 + bucket_index(int(seconds * 1e6))] += 1
+
+    def inc(self, name, n=1):
+        self.values[self.offset[name]] += n
+
+    def set(self, name, value):
+        self.values[self.offset[name]] = value
+
+    def timer(self, name):
+        """with metrics.timer("stage_seconds"): ..."""
+        return _Timer(self, name)
+
+    # ---------------- reading ----------------
+    def array(self):
+        """Copy of every value as a NumPy array."""
+        return np.frombuffer(self.values, dtype=np.float64).copy()
+
+    def value(self, name):
+        return float(self.values[self.offset[name]])
+
+    def count(self, name):
+        return int(self.values[self.offset[name]])
+
+    def quantile(self, name, q):
+        """Upper bound of the bucket holding quantile q (0..1), in seconds."""
+        base = self.offset[name]
+        buckets = self.array()[base + 2:base + HISTOGRAM_SLOTS]
+        total = buckets.sum()
+        if total == 0:
+            return 0.0
+        index = int(np.searchsorted(np.cumsum(buckets), q * total))
+        return bucket_upper(min(index, N_BUCKETS - 1))
+
+    def render(self, labels=""):
+        """Prometheus text exposition of every metric."""
+        values = self.array()
+        plain = f"{{{labels}}}" if labels else ""
+        sep = "," if labels else ""
+        lines = []
+        for name, kind, help_text in self.spec:
+            full = METRIC_PREFIX + name
+            base = self.offset[name]
+            lines.append(f"# HELP {full} {help_text}")
+            lines.append(f"# TYPE {full} {kind}")
+            if kind != HISTOGRAM:
+                lines.append(f"{full}{plain} {values[base]:.17g}")
+                continue
+            buckets = np.cumsum(values[base + 2:base + HISTOGRAM_SLOTS])
+            for index in EXPORTED_BUCKETS:
+                lines.append(f'{full}_bucket{{{labels}{sep}le="{bucket_upper(index):.6g}"}} {buckets[index]:.0f}')
+            lines.append(f'{full}_bucket{{{labels}{sep}le="+Inf"}} {values[base]:.0f}')
+            lines.append(f"{full}_sum{plain} {values[base + 1]:.9g}")
+            lines.append(f"{full}_count{plain} {values[base]:.0f}")
+        return "\n".join(lines) + "\n"
+
+    # ---------------- sharing ----------------
+    def share(self, role):
+        """Move the values into the shared segment for `role`; returns self."""
+        name = SEGMENT_PREFIX + role
+        spec = json.dumps(self.spec).encode()
+        data_offset = _data_offset(len(spec))
+        nbytes = self.values.nbytes
+        size = data_offset + nbytes
+        try:
+            shm = open_segment(name, size)
+        except FileExistsError:
+            # left by an earlier run: start from zero (a counter reset to Prometheus)
+            old = open_segment(name)
+            unlink_segment(old)
+            old.close()
+            shm = open_segment(name, size)
+
+        _HEADER.pack_into(shm.buf, 0, MAGIC, len(spec), len(self.values))
+        shm.buf[_HEADER.size:_HEADER.size + len(spec)] = spec
+        shared = shm.buf[data_offset:data_offset + nbytes].cast("d")
+        shared[:] = self.values
+        self.values = shared
+        self.shm = shm
+        return self
+
+    def close(self):
+        if self.shm is not None:
+            local = memoryview(bytearray(self.values.nbytes)).cast("d")
+            local[:] = self.values
+            self.values.release()
+            self.values = local
+            self.shm.close()
+            self.shm = None
+
+
+def _data_offset(spec_bytes):
+    end = _HEADER.size + spec_bytes
+    return (end + _DATA_ALIGN - 1) // _DATA_ALIGN * _DATA_ALIGN
+
+
+def render_shared(role):
+    """
+    Prometheus text for the metrics another process shared as `role`, or ""
+    if it is not running. Attaches per call, so a restarted writer (new
+    segment) is picked up on the next scrape.
+    """
+    try:
+        shm = open_segment(SEGMENT_PREFIX + role)
+    except FileNotFoundError:
+        return ""
+    try:
+        magic, spec_bytes, n_values = _HEADER.unpack_from(shm.buf, 0)
+        if magic != MAGIC:
+            return ""
+        spec = json.loads(bytes(shm.buf[_HEADER.size:_HEADER.size + spec_bytes]))
+        start = _data_offset(spec_bytes)
+        values = memoryview(bytearray(shm.buf[start:start + 8 * n_values])).cast("d")
+        return Metrics(spec, values).render(f'role="{role}"')
+    finally:
+        shm.close()
+
+
+# -------------------------------------------------------
+# METRIC SETS
+# -------------------------------------------------------
+DETECTOR_METRICS = [
+    ("detector_wait_seconds", HISTOGRAM, "Time waiting for a camera frame"),
+    ("detector_gate_seconds", HISTOGRAM, "Motion gate check per frame"),
+    ("detector_infer_seconds", HISTOGRAM, "Model inference per frame"),
+    ("detector_classify_seconds", HISTOGRAM, "Vehicle filter and lane assignment per frame"),
+    ("detector_track_seconds", HISTOGRAM, "Tracker update per frame"),
+    ("detector_publish_seconds", HISTOGRAM, "Count and frame bus publish per frame"),
+    ("detector_frame_age_seconds", HISTOGRAM, "Capture to counts published"),
+    ("detector_frames_captured_total", COUNTER, "Frames read from the camera"),
+    ("detector_frames_dropped_total", COUNTER, "Frames overwritten before the detector took them"),
+    ("detector_frames_skipped_total", COUNTER, "Frames the motion gate kept from inference"),
+    ("detector_frames_inferred_total", COUNTER, "Frames run through the model"),
+    ("detector_input_size", GAUGE, "Network input size of the coarse pass (tiled inference)"),
+    ("detector_tiles_total", COUNTER, "Native-resolution tiles run (tiled inference)"),
+    ("detector_cache_key_seconds", HISTOGRAM, "Frame hash for the detection cache"),
+    ("detector_cache_hits_total", COUNTER, "Frames answered from the detection cache"),
+    ("detector_cache_misses_total", COUNTER, "Frames not in the detection cache"),
+]
+
+CONTROLLER_METRICS = [
+    ("controller_decision_seconds", HISTOGRAM, "Timing policy call (decide / extend)"),
+    ("controller_tick_seconds", HISTOGRAM, "ControllerRunner scheduler step"),
+    ("controller_frame_age_seconds", HISTOGRAM, "Capture of the counts in use to each green decision"),
+    ("controller_count_lag_seconds", HISTOGRAM, "Counts published by the detector to applied by the controller"),
+    ("controller_policy_overruns_total", COUNTER, "Policy calls over DECISION_BUDGET"),
+    ("controller_phase_changes_total", COUNTER, "Signal interval changes"),
+    ("controller_preempt_latency_seconds", HISTOGRAM, "Priority request sent to the signal reacting"),
+    ("controller_preempt_service_seconds", HISTOGRAM, "Priority request sent to its green starting"),
+    ("controller_preempts_total", COUNTER, "Priority greens served"),
+    ("controller_plan_version", GAUGE, "Version of the timing plan in use"),
+    ("controller_plan_errors_total", COUNTER, "Timing plan files rejected on reload"),
+]
+
+APP_METRICS = [
+    ("app_status_seconds", HISTOGRAM, "/status request handling"),
+    ("app_status_requests_total", COUNTER, "/status requests"),
+    ("app_stream_subscribers", GAUGE, "Open /stream connections"),
+]
+
+EDGE_METRICS = [
+    ("edge_startup_seconds", GAUGE, "Runtime construction to status server and controller up"),
+    ("edge_ready_seconds", GAUGE, "Runtime construction to the first counted frame"),
+    ("edge_rss_bytes", GAUGE, "Resident set size at the last memory check"),
+    ("edge_memory_pressure_total", COUNTER, "Memory checks over EDGE_MEMORY_BUDGET_MB"),
+    ("edge_http_rejected_total", COUNTER, "Connections refused over EDGE_HTTP_CONNECTIONS"),
+]
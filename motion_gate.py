@@ -0,0 +1,83 @@
+import cv2
+
+# -------------------------------------------------------
+# MOTION-GATED INFERENCE SCHEDULER
+# -------------------------------------------------------
+# YOLO only runs when the scene changed noticeably since the last inferred
+# frame (mean absolute difference of a tiny greyscale thumbnail), with a
+# floor and ceiling on the inference interval. Shortly before the
+# controller's next green decision the gate tightens both, so the counts
+# that size the next green are fresh.
+
+GATE_SIZE = (64, 36)        # thumbnail (w, h) used for the change score
+CHANGE_THRESHOLD = 4.0      # mean |diff| in grey levels that counts as change
+
+MIN_INTERVAL = 1.0          # seconds between inferences, at most 1/s normally
+MAX_INTERVAL = 10.0         # re-infer at least this often on a static scene
+
+URGENT_WINDOW = 8.0         # seconds before a green decision ...
+URGENT_MIN_INTERVAL = 0.25  # ... infer up to 4/s on change
+URGENT_MAX_INTERVAL = 1.0   # ... and at least once a second
+
+
+class InferenceGate:
+    """
+    Decides per frame whether to run the detector or reuse the last counts.
+    """
+
+    def __init__(self, threshold=CHANGE_THRESHOLD):
+        self.threshold = threshold
+        self.reference = None       # thumbnail of the last inferred frame
+        self.last_infer_ts = None
+        self.last_score = 0.0
+        self.inferred = 0
+        self.skipped = 0
+
+    @staticmethod
+    def thumbnail(frame):
+        grey = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+        return cv2.resize(grey, GATE_SIZE, interpolation=cv2.INTER_AREA)
+
+    def intervals(self, now, decision_at=None):
+        """(min, max) inference interval given the next decision time."""
+        if decision_at is not None and 0 <= decision_at - now <= URGENT_WINDOW:
+            return URGENT_MIN_INTERVAL, URGENT_MAX_INTERVAL
+        return MIN_INTERVAL, MAX_INTERVAL
+
+    def should_infer(self, frame, now, decision_at=None):
+        """
+        True if `frame` (captured at `now`) should go through YOLO.
+        `decision_at` is the wall-clock time of the controller's next green
+        decision, if known.
+        """
+        if self.reference is None:
+            return self._accept(self.thumbnail(frame), now)
+
+        elapsed = now - self.last_infer_ts
+        min_interval, max_interval = self.intervals(now, decision_at)
+
+        if elapsed < min_interval:
+            self.skipped += 1
+            return False
+
+        small = self.thumbnail(frame)
+        if elapsed >= max_interval:
+            return self._accept(small, now)
+
+        self.last_score = float(cv2.absdiff(small, self.reference).mean())
+        if self.last_score >= self.threshold:
+            return self._accept(small, now)
+
+        self.skipped += 1
+        return False
+
+    def _accept(self, small, now):
+        self.reference = small
+        self.last_infer_ts = now
+        self.inferred += 1
+        return True
+
+    @property
+    def skip_ratio(self):
+        total = self.inferred + self.skipped
+        return self.skipped / total if total else 0.0
@@ -0,0 +1,117 @@
+from config import (
+    BASE_GREEN_NS, MIN_GREEN, MAX_GREEN,
+    YELLOW_TIME, ALL_RED_TIME,
+    PHASE_RING,
+)
+
+# -------------------------------------------------------
+# PHASE RING -> TRANSITION TABLE
+# -------------------------------------------------------
+# A ring is a list of green phases (config.PHASE_RING). It is compiled once
+# into parallel tuples indexed by interval number, where every green phase
+# k contributes three intervals:
+#
+#   3k     "<name>_GREEN"   (length chosen by the timing policy)
+#   3k + 1 "<name>_YELLOW"  (yellow[k])
+#   3k + 2 "ALL_RED"        (all_red[k]; the next green is decided at its end)
+#
+# The controller then moves between intervals with tuple lookups only
+# (kind[i], following[i], duration[i]), never comparing names. The default
+# two-phase ring compiles to exactly the old NS_GREEN -> NS_YELLOW ->
+# ALL_RED -> EW_GREEN -> EW_YELLOW -> ALL_RED sequence.
+#
+# Concurrent movements (NEMA-style dual rings and barriers) are expressed as
+# compound phases here: one ring entry per barrier group, with every
+# approach that runs concurrently listed in its "approaches".
+
+GREEN = 0
+YELLOW = 1
+ALL_RED = 2
+
+
+def _whole_seconds(value):
+    return (isinstance(value, (int, float)) and not isinstance(value, bool)
+            and value >= 1 and float(value).is_integer())
+
+
+class PhaseRing:
+    """Compiled phase ring; see the module comment for the layout."""
+
+    def __init__(self, phases, defaults=None):
+        """
+        phases as in config.PHASE_RING; defaults overrides the config
+        globals used for keys a phase leaves out ({"base": ..., "min": ...,
+        "max": ..., "yellow": ..., "all_red": ...}).
+        """
+        defaults = {
+            "base": BASE_GREEN_NS, "min": MIN_GREEN, "max": MAX_GREEN,
+            "yellow": YELLOW_TIME, "all_red": ALL_RED_TIME,
+            **(defaults or {}),
+        }
+        if not phases:
+            raise ValueError("A phase ring needs at least one phase")
+        names = [p["name"] for p in phases]
+        if len(set(names)) != len(names):
+            raise ValueError(f"Duplicate phase names in ring: {names}")
+
+        # ---- per green phase ----
+        self.phases = tuple(names)
+        self.n_phases = len(names)
+        self.index = {name: k for k, name in enumerate(names)}
+        self.approaches = tuple(tuple(p.get("approaches", (p["name"],))) for p in phases)
+        self.base = tuple(p.get("base", defaults["base"]) for p in phases)
+        self.min_green = tuple(p.get("min", defaults["min"]) for p in phases)
+        self.max_green = tuple(p.get("max", defaults["max"]) for p in phases)
+        self.yellow = tuple(p.get("yellow", defaults["yellow"]) for p in phases)
+        self.all_red = tuple(p.get("all_red", defaults["all_red"]) for p in phases)
+        self.peak_multiplier = tuple(p.get("peak_multiplier", 1.0) for p in phases)
+        self.on_call = tuple(bool(p.get("on_call", False)) for p in phases)
+
+        for k, name in enumerate(names):
+            # the controller extends and clamps greens in whole seconds
+            for key, value in (("base", self.base[k]), ("min", self.min_green[k]), ("max", self.max_green[k])):
+                if not _whole_seconds(value):
+                    raise ValueError(f"Phase {name}: {key} must be a whole number of seconds >= 1, got {value!r}")
+            if not self.min_green[k] <= self.max_green[k]:
+                raise ValueError(f"Phase {name}: need min <= max")
+
+        # ---- per interval ----
+        n = 3 * self.n_phases
+        self.names = tuple(
+            label
+            for name in names
+            for label in (f"{name}_GREEN", f"{name}_YELLOW", "ALL_RED")
+        )
+        self.kind = tuple(i % 3 for i in range(n))
+        self.phase_of = tuple(i // 3 for i in range(n))
+        self.following = tuple((i + 1) % n for i in range(n))     # static successor
+        self.duration = tuple(
+            (0, self.yellow[i // 3], self.all_red[i // 3])[i % 3] for i in range(n)
+        )
+        self.green_of = tuple(3 * k for k in range(self.n_phases))
+        # seconds from the end of interval i to the next green decision
+        self.to_decision = tuple(
+            (self.yellow[i // 3] + self.all_red[i // 3], self.all_red[i // 3], 0)[i % 3]
+            for i in range(n)
+        )
+
+    @classmethod
+    def from_config(cls):
+        return cls(PHASE_RING)
+
+    def ui_name(self, interval):
+        """Dashboard label: the phase name while green, else YELLOW / ALL_RED."""
+        kind = self.kind[interval]
+        if kind == GREEN:
+            return self.phases[self.phase_of[interval]]
+        return "YELLOW" if kind == YELLOW else "ALL_RED"
+
+    def phase_sums(self, values):
+        """{approach: value} -> {phase: summed value}."""
+        return {
+            name: sum(values.get(a, 0) for a in approaches)
+            for name, approaches in zip(self.phases, self.approaches)
+        }
+
+    def clamp_green(self, k, green):
+        return int(max(self.min_green[k], min(green, self.max_green[k])))
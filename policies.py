@@ -0,0 +1,237 @@
+from dataclasses import dataclass
+
+from config import (
+    BASE_GREEN_NS, BASE_GREEN_EW, PER_VEHICLE,
+    MIN_GREEN, MAX_GREEN,
+    YELLOW_TIME, ALL_RED_TIME,
+    SATURATION_FLOW, STARTUP_LOST_TIME,
+)
+
+# -------------------------------------------------------
+# SIGNAL-TIMING POLICIES
+# -------------------------------------------------------
+# TrafficController asks its policy two questions:
+#   decide(ctx)          at the end of ALL_RED: which phase goes green next,
+#                        and for how long
+#   extend(ctx, elapsed) at the end of a green: seconds to extend it (0 ends it)
+# Policies see phases by name ("NS", "EW") through a DecisionContext and do
+# constant-time arithmetic only, so a decision costs microseconds and is safe
+# on every tick. The controller times each call against DECISION_BUDGET and
+# falls back to LinearPolicy if a policy raises.
+
+BASE_GREEN = {"NS": BASE_GREEN_NS, "EW": BASE_GREEN_EW}
+HEADWAY = 3600.0 / SATURATION_FLOW          # seconds per discharging vehicle
+
+WEBSTER_MAX_Y = 0.9          # cap on the intersection flow ratio (keeps the cycle finite)
+WEBSTER_MIN_CYCLE = 40
+WEBSTER_MAX_CYCLE = 150
+MAX_PRESSURE_SLOT = MIN_GREEN   # green per max-pressure decision (phase min_green when known)
+
+
+@dataclass
+class DecisionContext:
+    """
+    Inputs to a timing decision, keyed by phase name.
+      phases     : phases that may be served now, in ring order
+      order      : every phase of the ring, in ring order
+      demand     : vehicles to serve (tracked queue if known, else count)
+      counts     : vehicles detected in each phase's approaches
+      queues     : tracked stopped vehicles, or None without the tracker
+      arrivals   : arrival rate in veh/s (tracker flows), or None
+      multiplier : time-of-day factor for each phase
+      current    : phase that is (or last was) green
+      cycle_s    : length of the last full cycle, seconds
+      forecast   : expected arrivals over the next FORECAST_HORIZON_CYCLES
+                   cycles (forecast.py), or None while it is still learning
+      greens     : green by vehicle count of each phase from the timing
+                   plan at this hour's (fixed or learned) multiplier
+                   (timing_plan.py); row i is the green for i vehicles,
+                   the last entry for any more
+      base / min_green / max_green / lost / per_vehicle : per-phase timing
+                   (lost = yellow + all red); missing entries use the
+                   config globals
+    """
+    now: float
+    phases: tuple
+    demand: dict
+    counts: dict
+    queues: dict = None
+    arrivals: dict = None
+    multiplier: dict = None
+    current: str = None
+    cycle_s: float = 0.0
+    forecast: dict = None
+    greens: dict = None
+    order: tuple = None
+    base: dict = None
+    min_green: dict = None
+    max_green: dict = None
+    lost: dict = None
+    per_vehicle: dict = None
+
+    def timing(self, field, phase, default):
+        values = getattr(self, field)
+        return values.get(phase, default) if values else default
+
+
+@dataclass
+class Decision:
+    phase: str
+    green: int
+
+
+def _clamp_green(ctx, phase, green):
+    low = ctx.timing("min_green", phase, MIN_GREEN)
+    high = ctx.timing("max_green", phase, MAX_GREEN)
+    return int(max(low, min(green, high)))
+
+
+def _lost_time(ctx, phase):
+    return ctx.timing("lost", phase, YELLOW_TIME + ALL_RED_TIME) + STARTUP_LOST_TIME
+
+
+def _other(ctx):
+    """The first servable phase after ctx.current in ring order."""
+    order = ctx.order or ctx.phases
+    if ctx.current not in order:
+        return ctx.phases[0]
+    start = order.index(ctx.current)
+    for step in range(1, len(order) + 1):
+        phase = order[(start + step) % len(order)]
+        if phase in ctx.phases:
+            return phase
+    return ctx.phases[0]
+
+
+def _arrival_rate(ctx, phase):
+    """
+    veh/s: tracker flow or forecast rate if available, else demand spread
+    over the last cycle.
+    """
+    if ctx.arrivals is not None and ctx.arrivals.get(phase) is not None:
+        return ctx.arrivals[phase]
+    return ctx.demand[phase] / ctx.cycle_s if ctx.cycle_s > 0 else 0.0
+
+
+class TimingPolicy:
+    name = "base"
+
+    def decide(self, ctx):
+        raise NotImplementedError
+
+    def extend(self, ctx, elapsed):
+        return 0
+
+
+class LinearPolicy(TimingPolicy):
+    """
+    The original rule: the busier phase goes next, green = base +
+    PER_VEHICLE x vehicles, scaled by the time-of-day multiplier.
+    """
+    name = "linear"
+
+    def decide(self, ctx):
+        phase = max(ctx.phases, key=lambda p: ctx.demand[p])   # ties: first phase
+        row = ctx.greens.get(phase) if ctx.greens else None
+        if row is not None:
+            return Decision(phase, row[min(int(ctx.demand[phase]), len(row) - 1)])
+        multiplier = ctx.multiplier.get(phase, 1.0) if ctx.multiplier else 1.0
+        base = ctx.timing("base", phase, BASE_GREEN.get(phase, BASE_GREEN_NS))
+        per_vehicle = ctx.timing("per_vehicle", phase, PER_VEHICLE)
+        green = (base + per_vehicle * ctx.demand[phase]) * multiplier
+        return Decision(phase, _clamp_green(ctx, phase, green))
+
+
+class WebsterPolicy(TimingPolicy):
+    """
+    Fixed phase rotation with Webster's optimum cycle
+        C0 = (1.5 L + 5) / (1 - Y)
+    and greens split by each phase's flow ratio y = q / s.
+    """
+    name = "webster"
+
+    def decide(self, ctx):
+        s = SATURATION_FLOW / 3600.0
+        y = {p: min(_arrival_rate(ctx, p) / s, WEBSTER_MAX_Y) for p in ctx.phases}
+        total_y = min(sum(y.values()), WEBSTER_MAX_Y)
+        lost = sum(_lost_time(ctx, p) for p in ctx.phases)
+
+        cycle = (1.5 * lost + 5) / (1 - total_y)
+        cycle = max(WEBSTER_MIN_CYCLE, min(cycle, WEBSTER_MAX_CYCLE))
+        phase = _other(ctx)
+        share = y[phase] / total_y if total_y > 0 else 1.0 / len(ctx.phases)
+        return Decision(phase, _clamp_green(ctx, phase, (cycle - lost) * share))
+
+
+class MaxPressurePolicy(TimingPolicy):
+    """
+    Serve the phase with the highest pressure (queue upstream minus queue
+    downstream; downstream is unknown at an isolated junction, so 0) in
+    short slots, extending the green while it still has the most pressure.
+    """
+    name = "max_pressure"
+
+    def __init__(self, downstream=None):
+        self.downstream = downstream or {}
+
+    def pressure(self, ctx, phase):
+        return ctx.demand[phase] - self.downstream.get(phase, 0)
+
+    def decide(self, ctx):
+        # ties go to the phase that has waited (the one after the current)
+        order = sorted(ctx.phases, key=lambda p: p != _other(ctx))
+        phase = max(order, key=lambda p: self.pressure(ctx, p))
+        return Decision(phase, _clamp_green(ctx, phase, self.slot(ctx, phase)))
+
+    def slot(self, ctx, phase):
+        return ctx.timing("min_green", phase, MAX_PRESSURE_SLOT)
+
+    def extend(self, ctx, elapsed):
+        current = self.pressure(ctx, ctx.current)
+        best = max(self.pressure(ctx, p) for p in ctx.phases)
+        slot = self.slot(ctx, ctx.current)
+        if current > 0 and current >= best \
+                and elapsed + slot <= ctx.timing("max_green", ctx.current, MAX_GREEN):
+            return slot
+        return 0
+
+
+class QueueClearancePolicy(TimingPolicy):
+    """
+    Size the green to discharge the standing queue at the saturation
+    headway, plus the vehicles that arrive while it discharges:
+        g = (startup lost time + queue x h) / (1 - q x h)
+    """
+    name = "queue_clearance"
+
+    def decide(self, ctx):
+        phase = max(ctx.phases, key=lambda p: ctx.demand[p])
+        load = min(_arrival_rate(ctx, phase) * HEADWAY, 0.9)
+        green = (STARTUP_LOST_TIME + ctx.demand[phase] * HEADWAY) / (1 - load)
+        return Decision(phase, _clamp_green(ctx, phase, green))
+
+    def extend(self, ctx, elapsed):
+        # only the tracker can tell whether the queue actually cleared
+        if ctx.queues is None:
+            return 0
+        remaining = ctx.queues.get(ctx.current, 0) * HEADWAY
+        budget = ctx.timing("max_green", ctx.current, MAX_GREEN) - elapsed
+        return int(min(remaining, budget)) if remaining >= 1 else 0
+
+
+POLICIES = {
+    LinearPolicy.name: LinearPolicy,
+    WebsterPolicy.name: WebsterPolicy,
+    MaxPressurePolicy.name: MaxPressurePolicy,
+    QueueClearancePolicy.name: QueueClearancePolicy,
+}
+
+
+def make_policy(policy):
+    """Policy instance from a name in POLICIES or an existing instance."""
+    if isinstance(policy, TimingPolicy):
+        return policy
+    try:
+        return POLICIES[policy]()
+    except KeyError:
+        raise ValueError(f"Unknown timing policy {policy!r}; choose from {sorted(POLICIES)}")
@@ -0,0 +1,265 @@
+import argparse
+import json
+import socket
+import threading
+import time
+
+import numpy as np
+
+from config import (
+    PREEMPT_ADDRESS, PREEMPT_RESEND,
+    PRIORITY_CLASS_IDS, PRIORITY_MIN_CONF,
+)
+from lane_map import OUTSIDE
+
+# -------------------------------------------------------
+# PRIORITY / PREEMPTION EVENTS
+# -------------------------------------------------------
+# Emergency vehicles and buses must not wait for the normal cadence (a
+# green runs to its deadline, counts are polled every COUNT_REFRESH). Every
+# priority request -- from the detector seeing a priority class in a lane,
+# or from an external system such as a siren detector or transit AVL box --
+# is one small UDP datagram to PREEMPT_ADDRESS on the local host:
+#
+#   {"approach": "NS", "kind": "emergency", "ts": 1715000000.123}
+#
+# The controller process runs a PreemptListener that hands each request to
+# ControllerRunner.preempt(), which marks it on the controller and wakes the
+# runner thread at once. TrafficController.request_preempt() then cuts the
+# conflicting green short (after PREEMPT_MIN_GREEN for emergencies, the
+# phase's own min green for transit), runs its yellow and all-red, and
+# serves the requested phase next, bypassing the timing policy. The
+# worst-case wait is therefore known when the request arrives and is
+# reported with it; "ts" (the sender's clock) starts the latency metrics.
+#
+# Kinds, lowest to highest: "transit" (bus priority, rate-limited by
+# TRANSIT_PRIORITY_COOLDOWN) and "emergency".
+#
+#   python preempt.py NS --kind emergency      # send one request
+#   python preempt.py --bench 20               # measure end-to-end latency
+
+TRANSIT = "transit"
+EMERGENCY = "emergency"
+KINDS = (TRANSIT, EMERGENCY)
+RANK = {kind: rank for rank, kind in enumerate(KINDS)}
+
+MAX_DATAGRAM = 512
+POLL_TIMEOUT = 0.5               # listener re-checks its stop flag this often
+
+
+def encode(approach, kind=EMERGENCY, ts=None):
+    return json.dumps({"approach": approach, "kind": kind, "ts": ts or time.time()}).encode()
+
+
+def decode(data):
+    """(approach, kind, ts) of a request datagram; ValueError if malformed."""
+    try:
+        message = json.loads(data)
+        approach, kind = str(message["approach"]), message.get("kind", EMERGENCY)
+        ts = float(message.get("ts") or time.time())
+    except (ValueError, KeyError, TypeError) as e:
+        raise ValueError(f"bad preempt request {data[:64]!r}: {e}")
+    if kind not in RANK:
+        raise ValueError(f"unknown preempt kind {kind!r}; choose from {list(KINDS)}")
+    return approach, kind, ts
+
+
+def send_preempt(approach, kind=EMERGENCY, address=PREEMPT_ADDRESS, sock=None):
+    """Fire-and-forget priority request for `approach` (or a phase name)."""
+    own = sock is None
+    sock = sock or socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        sock.sendto(encode(approach, kind), tuple(address))
+    finally:
+        if own:
+            sock.close()
+
+
+class PreemptListener(threading.Thread):
+    """
+    Receives request datagrams and calls on_request(approach, kind, ts) for
+    each, on its own thread so a request never waits behind anything else.
+    """
+
+    def __init__(self, on_request, address=PREEMPT_ADDRESS):
+        super().__init__(name="preempt", daemon=True)
+        self.on_request = on_request
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind(tuple(address))
+        self.sock.settimeout(POLL_TIMEOUT)
+        self.address = self.sock.getsockname()
+        self.received = 0
+        self._stopped = False
+
+    @classmethod
+    def start_on(cls, on_request, address=PREEMPT_ADDRESS):
+        """Started listener, or None (with a warning) if the address is taken."""
+        try:
+            listener = cls(on_request, address)
+        except OSError as e:
+            print(f"[WARN] Preempt listener disabled, cannot bind {address}: {e}")
+            return None
+        listener.start()
+        print(f"[INFO] Preempt requests on udp://{listener.address[0]}:{listener.address[1]}")
+        return listener
+
+    def stop(self):
+        self._stopped = True
+
+    def run(self):
+        while not self._stopped:
+            try:
+                data, _ = self.sock.recvfrom(MAX_DATAGRAM)
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            try:
+                request = decode(data)
+            except ValueError as e:
+                print(f"[WARN] {e}")
+                continue
+            self.received += 1
+            try:
+                self.on_request(*request)
+            except Exception as e:
+                print(f"[WARN] Preempt request {request} failed: {e}")
+        self.sock.close()
+
+
+# -------------------------------------------------------
+# DETECTOR SIDE
+# -------------------------------------------------------
+def priority_approaches(boxes, cls, confs, shape, lane_map):
+    """
+    {approach: kind} of the lanes holding a PRIORITY_CLASS_IDS detection
+    (the highest kind per lane), from the raw (boxes, cls, confs).
+    """
+    if not PRIORITY_CLASS_IDS:
+        return {}
+    wanted = np.isin(cls, list(PRIORITY_CLASS_IDS)) & (confs >= PRIORITY_MIN_CONF)
+    if not wanted.any():
+        return {}
+    height, width = shape[:2]
+    lanes = lane_map.assign(boxes[wanted], height, width)
+    found = {}
+    for lane, class_id in zip(lanes.tolist(), cls[wanted].tolist()):
+        if lane == OUTSIDE:
+            continue
+        approach = lane_map.names[lane]
+        kind = PRIORITY_CLASS_IDS[class_id]
+        if RANK[kind] >= RANK.get(found.get(approach), -1):
+            found[approach] = kind
+    return found
+
+
+class PrioritySender:
+    """
+    Sends the detector's priority requests, repeating each (approach, kind)
+    at most every PREEMPT_RESEND seconds while it stays in view; the
+    controller holds the priority green as long as requests keep coming.
+    With `deliver` (a ControllerRunner.preempt in the same process, as in
+    edge_runtime.py) requests are handed over directly instead of sent.
+    """
+
+    def __init__(self, address=PREEMPT_ADDRESS, resend=PREEMPT_RESEND, deliver=None):
+        self.address = tuple(address)
+        self.resend = resend
+        self.deliver = deliver
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM) if deliver is None else None
+        self.sent_at = {}
+        self.sent = 0
+
+    def send(self, requests, now=None):
+        now = now or time.time()
+        for approach, kind in requests.items():
+            if now - self.sent_at.get((approach, kind), 0.0) < self.resend:
+                continue
+            self.sent_at[(approach, kind)] = now
+            if self.deliver is not None:
+                self.deliver(approach, kind, now)
+                self.sent += 1
+                continue
+            try:
+                send_preempt(approach, kind, self.address, self.sock)
+                self.sent += 1
+            except OSError as e:
+                print(f"[WARN] Preempt request for {approach} not sent: {e}")
+
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
+
+
+# -------------------------------------------------------
+# LATENCY BENCHMARK
+# -------------------------------------------------------
+def bench(n, gap):
+    """
+    Run a controller + runner + listener in this process (on a short test
+    ring) and send `n` emergency requests for alternating phases, `gap`
+    seconds apart. Reports the event path latency (request sent -> signal
+    state changed) and how long each waited for its green against the
+    bound promised on arrival.
+    """
+    from controller import TrafficController
+    from controller_runner import ControllerRunner
+    from metrics import CONTROLLER_METRICS, Metrics
+    from phase_ring import PhaseRing
+
+    # short greens and clearances so a run takes seconds per request
+    ring = PhaseRing([
+        {"name": name, "approaches": (name,), "base": 5, "min": 2, "max": 6, "yellow": 1, "all_red": 1}
+        for name in ("NS", "EW")
+    ])
+    metrics = Metrics(CONTROLLER_METRICS)
+    controller = TrafficController(log_path=None, ring=ring, metrics=metrics, plan_path=None)
+    runner = ControllerRunner(controller, None, metrics=metrics)
+    listener = PreemptListener(runner.preempt, ("127.0.0.1", 0))
+    runner.start()
+    listener.start()
+
+    served = []
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        for i in range(n):
+            phase = controller.ring.phases[i % controller.ring.n_phases]
+            sent = time.time()
+            send_preempt(phase, EMERGENCY, listener.address, sock)
+            while controller.preempt is None or controller.preempt.served_at is None \
+                    or controller.preempt.phase != phase:
+                time.sleep(0.001)
+            p = controller.preempt
+            served.append((p.served_at - sent, p.deadline - p.received_at))
+            time.sleep(gap)
+
+    runner.stop()
+    listener.stop()
+    waits = np.array([w for w, _ in served])
+    over = sum(w > bound + 0.05 for w, bound in served)
+    q = lambda name, p: 1000 * metrics.quantile(name, p)
+    print(f"[INFO] {n} emergency requests")
+    print(f"  event path (sent -> signal reacts): p50 {q('controller_preempt_latency_seconds', 0.5):.2f} ms, "
+          f"p99 {q('controller_preempt_latency_seconds', 0.99):.2f} ms")
+    print(f"  wait for green: mean {waits.mean():.1f} s, max {waits.max():.1f} s; "
+          f"over the promised bound: {over}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Send a priority request, or benchmark preemption latency")
+    parser.add_argument("approach", nargs="?", help="approach or phase to serve")
+    parser.add_argument("--kind", choices=KINDS, default=EMERGENCY)
+    parser.add_argument("--bench", type=int, metavar="N", help="measure N requests on a local controller")
+    parser.add_argument("--gap", type=float, default=1.0, help="seconds between benchmark requests")
+    args = parser.parse_args()
+
+    if args.bench:
+        bench(args.bench, args.gap)
+    elif args.approach:
+        send_preempt(args.approach, args.kind)
+        print(f"[INFO] {args.kind} preempt for {args.approach} sent to {PREEMPT_ADDRESS}")
+    else:
+        parser.error("give an approach or --bench N")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,317 @@
+import argparse
+import csv
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from typing import NamedTuple, Optional
+
+import cv2
+
+from config import (
+    DETECTOR_THREADS,
+    REPLAY_STRIDE_SECONDS, REPLAY_SEGMENT_SECONDS,
+    REPLAY_WORKERS, REPLAY_BATCH_SIZE,
+)
+from lane_map import LaneMap
+import vehicle_detection
+from vehicle_detection import count_vehicles_batch
+
+# -------------------------------------------------------
+# OFFLINE REPLAY COUNTING
+# -------------------------------------------------------
+# Re-counts recorded footage (video files, or RTSP replay streams from a
+# recorder) so config.py parameters can be tuned against weeks of real
+# traffic instead of the live camera:
+#
+#   python replay_detection.py rec/mon.mp4@2026-05-04T06:00 rec/tue.mp4 --out counts.csv
+#
+# One sample is counted every REPLAY_STRIDE_SECONDS of video. Seekable
+# recordings are cut into REPLAY_SEGMENT_SECONDS shards that a process
+# pool counts in parallel; each worker process holds one detector (the
+# vehicle_detection model, loaded once in the pool initializer) and gets
+# cores / workers inference threads, so throughput scales with cores
+# instead of the runtimes fighting over them. Shards finish out of order
+# and OrderedMerge releases their rows in time order as soon as every
+# earlier shard is in, so the output streams instead of waiting for the
+# whole run.
+#
+# Seeking only uses CAP_PROP_POS_FRAMES and checks where the capture
+# really landed, since backends (FFmpeg, GStreamer, hardware decoders)
+# differ: an unsupported or overshot seek falls back to decoding forward
+# from the start. Short gaps between samples are skipped with grab(),
+# which demuxes and decodes without the colour conversion of read().
+# Streams (no frame count) cannot be seeked or sharded: each one is a
+# single shard sampled on its own timestamps.
+
+DEFAULT_FPS = 25.0               # when the container reports none
+SEEK_FRAMES = 250                # larger gaps seek instead of grabbing through
+
+
+class Recording(NamedTuple):
+    path: str
+    fps: float
+    frames: int                  # 0 for streams / unknown length
+    start_ts: float              # wall time of the first frame
+
+    @property
+    def seekable(self):
+        return self.frames > 0
+
+    @property
+    def duration(self):
+        return self.frames / self.fps
+
+    def samples(self, stride):
+        """Number of samples taken every `stride` seconds (seekable only)."""
+        return int((self.frames - 1) / (stride * self.fps)) + 1
+
+
+class Segment(NamedTuple):
+    index: int                   # position in the merged output
+    recording: Recording
+    first: int                   # first sample of this shard
+    last: Optional[int]          # one past the last sample; None = to the end
+
+
+def probe(path, start_ts=0.0):
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        raise ValueError(f"Could not open {path!r}")
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
+    if not 0 < fps < 1000:
+        fps = DEFAULT_FPS
+    if "://" in path or frames <= 0:
+        frames = 0
+    return Recording(path, fps, frames, start_ts)
+
+
+def plan(recordings, stride=REPLAY_STRIDE_SECONDS, segment_seconds=REPLAY_SEGMENT_SECONDS):
+    """Shards of every recording, in time order."""
+    per = max(1, round(segment_seconds / stride))
+    segments = []
+    for rec in sorted(recordings, key=lambda r: r.start_ts):
+        if not rec.seekable:
+            segments.append(Segment(len(segments), rec, 0, None))
+            continue
+        n = rec.samples(stride)
+        for first in range(0, n, per):
+            segments.append(Segment(len(segments), rec, first, min(n, first + per)))
+    return segments
+
+
+# -------------------------------------------------------
+# DECODING
+# -------------------------------------------------------
+def _seek(cap, rec, frame):
+    """Put `cap` at or before `frame`; returns the index it will decode next."""
+    if cap.set(cv2.CAP_PROP_POS_FRAMES, frame):
+        pos = int(cap.get(cv2.CAP_PROP_POS_FRAMES))
+        if 0 <= pos <= frame:
+            return pos
+    # seeking unsupported, or it overshot: decode forward from the start
+    cap.open(rec.path)
+    return 0
+
+
+def sample_frames(rec, stride=REPLAY_STRIDE_SECONDS, first=0, last=None):
+    """Yield (offset seconds, frame) every `stride` seconds of samples first..last."""
+    cap = cv2.VideoCapture(rec.path)
+    try:
+        if not rec.seekable:
+            yield from _sample_stream(cap, rec, stride)
+            return
+        step = stride * rec.fps
+        pos = 0                                  # index of the next decoded frame
+        for k in range(first, rec.samples(stride) if last is None else last):
+            target = int(k * step)
+            if target < pos or target - pos > SEEK_FRAMES:
+                pos = _seek(cap, rec, target)
+            while pos < target:
+                if not cap.grab():
+                    return
+                pos += 1
+            ok, frame = cap.read()
+            if not ok:
+                return
+            pos += 1
+            yield target / rec.fps, frame
+    finally:
+        cap.release()
+
+
+def _sample_stream(cap, rec, stride):
+    decoded = 0
+    next_at = 0.0
+    while cap.grab():
+        # stream timestamps when the backend has them, else frame counting
+        offset = cap.get(cv2.CAP_PROP_POS_MSEC) / 1000.0 or decoded / rec.fps
+        decoded += 1
+        if offset < next_at:
+            continue
+        ok, frame = cap.retrieve()
+        if ok:
+            yield offset, frame
+        while next_at <= offset:
+            next_at += stride
+
+
+# -------------------------------------------------------
+# WORKERS
+# -------------------------------------------------------
+_lane_map = None                 # per worker process
+
+
+def _init_worker(camera, threads):
+    global _lane_map
+    # one process per core: keep OpenCV and the runtime from spawning more
+    cv2.setNumThreads(1)
+    vehicle_detection.detector.threads = threads
+    vehicle_detection.detector.warmup()
+    _lane_map = LaneMap.load(camera)
+
+
+def count_segment(segment, stride=REPLAY_STRIDE_SECONDS, batch_size=REPLAY_BATCH_SIZE):
+    """
+    Worker: (segment.index, [(ts, {approach: vehicles})] in time order,
+    (detection cache hits, misses) of this segment).
+    """
+    rec = segment.recording
+    cache = vehicle_detection.cache
+    hits, misses = cache.hits, cache.misses
+    rows = []
+    frames, stamps = [], []
+
+    def flush():
+        outputs = count_vehicles_batch(frames, [_lane_map] * len(frames))
+        rows.extend((ts, counts) for ts, (counts, _detections) in zip(stamps, outputs))
+        frames.clear()
+        stamps.clear()
+
+    for offset, frame in sample_frames(rec, stride, segment.first, segment.last):
+        frames.append(frame)
+        stamps.append(rec.start_ts + offset)
+        if len(frames) == batch_size:
+            flush()
+    if frames:
+        flush()
+    return segment.index, rows, (cache.hits - hits, cache.misses - misses)
+
+
+class OrderedMerge:
+    """
+    Reassembles shard results that complete in any order: add() returns
+    the rows that can now be emitted, i.e. those of every shard up to the
+    first one still missing.
+    """
+
+    def __init__(self):
+        self.pending = {}
+        self.next_index = 0
+
+    def add(self, index, rows):
+        self.pending[index] = rows
+        ready = []
+        while self.next_index in self.pending:
+            ready.extend(self.pending.pop(self.next_index))
+            self.next_index += 1
+        return ready
+
+
+def replay(recordings, camera="cam0", stride=REPLAY_STRIDE_SECONDS,
+           segment_seconds=REPLAY_SEGMENT_SECONDS, workers=REPLAY_WORKERS,
+           batch_size=REPLAY_BATCH_SIZE):
+    """Yield (ts, {approach: vehicles}) of every sample, in time order."""
+    segments = plan(recordings, stride, segment_seconds)
+    if not segments:
+        return
+    cores = os.cpu_count() or 1
+    workers = max(1, min(workers or cores, len(segments)))
+    threads = DETECTOR_THREADS or max(1, cores // workers)
+    print(f"[INFO] replay: {len(segments)} shard(s) on {workers} worker(s) x {threads} thread(s)")
+
+    merge = OrderedMerge()
+    spawn = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=spawn,
+                             initializer=_init_worker, initargs=(camera, threads)) as pool:
+        futures = [pool.submit(count_segment, s, stride, batch_size) for s in segments]
+        hits = misses = 0
+        for future in as_completed(futures):
+            index, rows, (segment_hits, segment_misses) = future.result()
+            hits += segment_hits
+            misses += segment_misses
+            yield from merge.add(index, rows)
+    if hits + misses:
+        print(f"[INFO] replay: detection cache hits {hits} / {hits + misses} "
+              f"({hits / (hits + misses):.0%}) of sampled frames")
+
+
+# -------------------------------------------------------
+# CLI
+# -------------------------------------------------------
+def _parse_time(text):
+    try:
+        return float(text)
+    except ValueError:
+        return datetime.fromisoformat(text).timestamp()
+
+
+def parse_recordings(args, start_ts=0.0):
+    """
+    Recordings are given as path[@start], start an epoch or ISO time. A
+    recording without a start follows on from the end of the previous one
+    (e.g. a recorder's hourly files).
+    """
+    recordings = []
+    for arg in args:
+        path, sep, start = arg.rpartition("@")
+        if not sep:
+            path = arg
+        else:
+            try:
+                start_ts = _parse_time(start)
+            except ValueError:
+                path = arg                       # the '@' of a stream URL's credentials
+        rec = probe(path, start_ts)
+        recordings.append(rec)
+        start_ts = rec.start_ts + (rec.duration if rec.seekable else 0.0)
+    return recordings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Count vehicles in recorded footage, in parallel")
+    parser.add_argument("recordings", nargs="+", help="video files or stream URLs, as path[@start]")
+    parser.add_argument("--camera", default="cam0", help="lane map entry to count with")
+    parser.add_argument("--start", default="0", help="start of the first recording (epoch or ISO)")
+    parser.add_argument("--stride", type=float, default=REPLAY_STRIDE_SECONDS, help="seconds between samples")
+    parser.add_argument("--segment", type=float, default=REPLAY_SEGMENT_SECONDS, help="seconds per shard")
+    parser.add_argument("--workers", type=int, default=REPLAY_WORKERS, help="processes; 0 = one per core")
+    parser.add_argument("--batch", type=int, default=REPLAY_BATCH_SIZE, help="frames per model call")
+    parser.add_argument("--out", default="replay_counts.csv", help="CSV file to write")
+    args = parser.parse_args()
+
+    recordings = parse_recordings(args.recordings, _parse_time(args.start))
+    for rec in recordings:
+        length = f"{rec.duration:.0f} s" if rec.seekable else "stream"
+        print(f"[INFO] {rec.path}: {length} at {rec.fps:.1f} fps")
+    names = LaneMap.load(args.camera).names
+
+    started = time.perf_counter()
+    samples = 0
+    with open(args.out, "w", newline="") as out:
+        writer = csv.writer(out)
+        writer.writerow(("ts",) + names)
+        for ts, counts in replay(recordings, args.camera, args.stride, args.segment,
+                                 args.workers, args.batch):
+            writer.writerow([f"{ts:.3f}"] + [counts[name] for name in names])
+            samples += 1
+    elapsed = time.perf_counter() - started
+    print(f"[INFO] {samples} samples -> {args.out} in {elapsed:.1f} s "
+          f"({samples / max(elapsed, 1e-9):.1f} samples/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,396 @@
+import argparse
+import math
+import os
+import shutil
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from config import ROLLUP_DIR, ROLLUP_MINUTE_RETENTION_DAYS, ROLLUP_SKETCH_GAMMA
+from cycle_log import LOAD_CATEGORIES, CycleLog
+
+# -------------------------------------------------------
+# PRE-AGGREGATED CYCLE ROLLUPS
+# -------------------------------------------------------
+# Every logged cycle is added, as it is logged, to one row of three dense
+# tables indexed by local-time bucket number:
+#
+#   minute : sums + two sketches, kept ROLLUP_MINUTE_RETENTION_DAYS
+#   hour   : sums + two sketches, kept forever
+#   day    : sums + two sketches, kept forever
+#
+# A row holds cycle / vehicle / green-time sums per phase and per load
+# category, and log-bucketed sketches of the green time and of the
+# vehicles waiting per cycle (DDSketch-style: bin i holds values in
+# [gamma^(i-1), gamma^i), so percentiles have <= (gamma - 1) relative
+# error and sketches merge by addition).
+#
+# Tables are chunked into memory-mapped .npy files under ROLLUP_DIR, so
+# any process can read them (the web workers) while the controller writes,
+# and a window query is a few slice sums: whole days in the middle, whole
+# hours at the day edges, minutes at the hour edges -- at most a few
+# hundred rows for any window, years long or not. Totals and percentiles
+# always come from the same rows, so they describe the same cycles. Raw
+# cycle rows are only read to catch up after a restart (rows logged after
+# the watermark) or by `python rollups.py --rebuild`.
+#
+# Only NS / EW are rolled up: they are the approaches the cycle log records.
+
+PHASES = ("NS", "EW")
+
+SKETCH_BINS = 1 + math.ceil(math.log(1024) / math.log(ROLLUP_SKETCH_GAMMA))   # values up to ~1000
+_LOG_GAMMA = math.log(ROLLUP_SKETCH_GAMMA)
+
+
+def _columns():
+    names = ["cycles"]
+    names += [f"vehicles_{p}" for p in PHASES]
+    names += [f"cycles_{p}" for p in PHASES]
+    names += [f"green_{p}" for p in PHASES]
+    names += [f"cycles_{c}" for c in LOAD_CATEGORIES]
+    names += [f"green_{c}" for c in LOAD_CATEGORIES]
+    return {name: i for i, name in enumerate(names)}
+
+
+COLUMNS = _columns()
+N_SUMS = len(COLUMNS)
+GREEN_SKETCH = N_SUMS
+VEHICLE_SKETCH = N_SUMS + SKETCH_BINS
+N_COLUMNS = N_SUMS + 2 * SKETCH_BINS
+
+# name -> (rows per chunk file, columns)
+TABLES = {
+    "minute": (7 * 1440, N_COLUMNS),
+    "hour": (366 * 24, N_COLUMNS),
+    "day": (3660, N_COLUMNS),
+}
+STEPS = {"minute": 1, "hour": 60, "day": 1440}   # minutes per bucket
+
+
+def sketch_bin(value):
+    if value < 1:
+        return 0
+    return min(SKETCH_BINS - 1, 1 + int(math.log(value) / _LOG_GAMMA))
+
+
+def sketch_quantile(bins, q):
+    """Value at quantile q (0..1) of a sketch, or None if it is empty."""
+    total = bins.sum()
+    if total <= 0:
+        return None
+    i = int(np.searchsorted(np.cumsum(bins), q * total))
+    if i == 0:
+        return 0.0
+    # midpoint (in relative terms) of [gamma^(i-1), gamma^i)
+    g = ROLLUP_SKETCH_GAMMA
+    return 2 * g ** (i - 1) * g / (g + 1)
+
+
+# ---------------- local-time bucket numbers ----------------
+def minute_index(ts):
+    t = datetime.fromtimestamp(ts)
+    return (t.toordinal() * 24 + t.hour) * 60 + t.minute
+
+
+def minute_start(m):
+    day, rest = divmod(m, 1440)
+    return (datetime.fromordinal(day) + timedelta(minutes=rest)).timestamp()
+
+
+class RollupTable:
+    """One resolution: dense rows in chunked, memory-mapped .npy files."""
+
+    def __init__(self, directory, name, writable=False):
+        self.dir = os.path.join(directory, name)
+        self.name = name
+        self.chunk_rows, self.n_cols = TABLES[name]
+        self.writable = writable
+        self._chunks = {}
+        if writable:
+            os.makedirs(self.dir, exist_ok=True)
+
+    def _path(self, c):
+        return os.path.join(self.dir, f"{c:06d}.npy")
+
+    def chunk(self, c, create=False):
+        arr = self._chunks.get(c)
+        if arr is not None:
+            return arr
+        path = self._path(c)
+        if os.path.exists(path):
+            try:
+                arr = np.load(path, mmap_mode="r+" if self.writable else "r")
+            except (ValueError, OSError):
+                return None      # being created by the writer right now
+            if arr.shape != (self.chunk_rows, self.n_cols):
+                # older layout (minute rows without sketches): rebuild with --rebuild
+                if not (self.writable and create):
+                    return None
+                print(f"[WARN] rollups: replacing {path} of an older layout")
+                del arr
+                os.remove(path)
+                return self.chunk(c, create)
+        elif create:
+            arr = np.lib.format.open_memmap(path, mode="w+", dtype=np.float64,
+                                            shape=(self.chunk_rows, self.n_cols))
+        else:
+            return None          # not cached: it may be created later
+        self._chunks[c] = arr
+        return arr
+
+    def add(self, index, values):
+        c, r = divmod(index, self.chunk_rows)
+        self.chunk(c, create=True)[r] += values[:self.n_cols]
+
+    def rows(self, i0, i1):
+        """(i1 - i0, n_cols) rows; buckets never written are zero."""
+        out = np.zeros((max(0, i1 - i0), self.n_cols))
+        i = i0
+        while i < i1:
+            c, r = divmod(i, self.chunk_rows)
+            n = min(i1 - i, self.chunk_rows - r)
+            arr = self.chunk(c)
+            if arr is not None:
+                out[i - i0:i - i0 + n] = arr[r:r + n]
+            i += n
+        return out
+
+    def sum(self, i0, i1):
+        total = np.zeros(self.n_cols)
+        i = i0
+        while i < i1:
+            c, r = divmod(i, self.chunk_rows)
+            n = min(i1 - i, self.chunk_rows - r)
+            arr = self.chunk(c)
+            if arr is not None:
+                total += arr[r:r + n].sum(axis=0)
+            i += n
+        return total
+
+    def drop_before(self, index):
+        """Delete chunk files entirely older than bucket `index`."""
+        for fname in os.listdir(self.dir):
+            c = int(fname.split(".")[0])
+            if (c + 1) * self.chunk_rows <= index:
+                self._chunks.pop(c, None)
+                os.remove(os.path.join(self.dir, fname))
+
+    def flush(self):
+        for arr in self._chunks.values():
+            if self.writable:
+                arr.flush()
+
+
+class Rollups:
+    """
+    Minute / hour / day rollups of the cycle log. writable=True for the
+    controller that logs cycles; readers (app.py) open the same directory
+    read-only.
+    """
+
+    def __init__(self, directory=ROLLUP_DIR, writable=False):
+        self.dir = directory
+        self.writable = writable
+        if writable:
+            os.makedirs(directory, exist_ok=True)
+        self.tables = {name: RollupTable(directory, name, writable) for name in TABLES}
+        self._watermark = None
+        self._minute_chunk = None
+
+    # ---------------- writing ----------------
+    @property
+    def watermark(self):
+        """Timestamp of the newest cycle rolled up (0 if none)."""
+        if self._watermark is None:
+            path = os.path.join(self.dir, "watermark.npy")
+            if os.path.exists(path):
+                self._watermark = np.load(path, mmap_mode="r+" if self.writable else "r")
+            elif self.writable:
+                self._watermark = np.lib.format.open_memmap(path, mode="w+", dtype=np.float64, shape=(1,))
+            else:
+                return 0.0
+        return float(self._watermark[0])
+
+    def add(self, ts, phase, count_ns, count_ew, green_time, load):
+        """Roll up one logged cycle; O(1)."""
+        phase = phase.removesuffix("_GREEN")
+        values = np.zeros(N_COLUMNS)
+        values[COLUMNS["cycles"]] = 1
+        values[COLUMNS["vehicles_NS"]] = count_ns
+        values[COLUMNS["vehicles_EW"]] = count_ew
+        if phase in PHASES:
+            values[COLUMNS[f"cycles_{phase}"]] = 1
+            values[COLUMNS[f"green_{phase}"]] = green_time
+        if load in LOAD_CATEGORIES:
+            values[COLUMNS[f"cycles_{load}"]] = 1
+            values[COLUMNS[f"green_{load}"]] = green_time
+        values[GREEN_SKETCH + sketch_bin(green_time)] = 1
+        values[VEHICLE_SKETCH + sketch_bin(count_ns + count_ew)] = 1
+
+        m = minute_index(ts)
+        self.tables["minute"].add(m, values)
+        self.tables["hour"].add(m // 60, values)
+        self.tables["day"].add(m // 1440, values)
+
+        self.watermark          # open it
+        self._watermark[0] = max(self._watermark[0], ts)
+        self._expire(m)
+
+    def add_row(self, row):
+        self.add(row["ts"], row["phase"], row["vehicle_count_ns"], row["vehicle_count_ew"],
+                 row["green_time"], row["load_category"])
+
+    def catch_up(self, cycle_log):
+        """Roll up cycle log rows newer than the watermark (after a restart)."""
+        n = 0
+        for row in cycle_log.range(self.watermark + 1e-6 if self.watermark else None):
+            self.add_row(row)
+            n += 1
+        if n:
+            self.flush()
+            print(f"[INFO] rollups: caught up {n} cycles from the cycle log")
+        return self
+
+    def _expire(self, m):
+        minute = self.tables["minute"]
+        c = m // minute.chunk_rows
+        if c != self._minute_chunk:
+            self._minute_chunk = c
+            minute.drop_before(m - ROLLUP_MINUTE_RETENTION_DAYS * 1440)
+
+    def flush(self):
+        for table in self.tables.values():
+            table.flush()
+        if self._watermark is not None and self.writable:
+            self._watermark.flush()
+
+    # ---------------- querying ----------------
+    def _plan(self, m0, m1):
+        """[m0, m1) minutes -> [(table, i0, i1)] of whole days, hours and minutes."""
+        h0, h1 = -(-m0 // 60), m1 // 60
+        if h0 >= h1:
+            return [("minute", m0, m1)]
+        parts = [("minute", m0, h0 * 60), ("minute", h1 * 60, m1)]
+        d0, d1 = -(-h0 // 24), h1 // 24
+        if d0 >= d1:
+            parts.append(("hour", h0, h1))
+        else:
+            parts += [("hour", h0, d0 * 24), ("day", d0, d1), ("hour", d1 * 24, h1)]
+        return [p for p in parts if p[1] < p[2]]
+
+    def _window(self, start_ts, end_ts):
+        """
+        [m0, m1) minutes covering [start_ts, end_ts); a partial minute at
+        either end is included (e.g. the current one when end_ts is now).
+        """
+        m0, m1 = minute_index(start_ts), minute_index(end_ts)
+        if minute_start(m1) < end_ts:
+            m1 += 1
+        # minute rows past retention are gone: round those edges to the hour
+        oldest = minute_index(time.time()) - ROLLUP_MINUTE_RETENTION_DAYS * 1440
+        if m0 < oldest:
+            m0 = m0 // 60 * 60
+        if m1 < oldest:
+            m1 = -(-m1 // 60) * 60
+        return m0, max(m0, m1)
+
+    def summary(self, start_ts, end_ts):
+        """Totals, averages and percentiles of [start_ts, end_ts)."""
+        m0, m1 = self._window(start_ts, end_ts)
+        sums = np.zeros(N_COLUMNS)
+        for name, i0, i1 in self._plan(m0, m1):
+            sums += self.tables[name].sum(i0, i1)
+
+        c = COLUMNS
+        green = sums[GREEN_SKETCH:GREEN_SKETCH + SKETCH_BINS]
+        vehicles = sums[VEHICLE_SKETCH:VEHICLE_SKETCH + SKETCH_BINS]
+        return {
+            "start": minute_start(m0),
+            "end": minute_start(m1),
+            "cycles": int(sums[c["cycles"]]),
+            "vehicles": {p: int(sums[c[f"vehicles_{p}"]]) for p in PHASES},
+            "avg_green": {p: _ratio(sums[c[f"green_{p}"]], sums[c[f"cycles_{p}"]]) for p in PHASES},
+            "load": {
+                cat: {
+                    "cycles": int(sums[c[f"cycles_{cat}"]]),
+                    "avg_green": _ratio(sums[c[f"green_{cat}"]], sums[c[f"cycles_{cat}"]]),
+                }
+                for cat in LOAD_CATEGORIES
+            },
+            "green_time": {f"p{int(q * 100)}": sketch_quantile(green, q) for q in (0.5, 0.9, 0.99)},
+            "vehicles_per_cycle": {f"p{int(q * 100)}": sketch_quantile(vehicles, q) for q in (0.5, 0.9, 0.99)},
+        }
+
+    def series(self, start_ts, end_ts, step="hour"):
+        """Per-bucket cycles, vehicles and average green over [start_ts, end_ts)."""
+        m0, m1 = self._window(start_ts, end_ts)
+        per = STEPS[step]
+        i0, i1 = m0 // per, -(-m1 // per)
+        rows = self.tables[step].rows(i0, i1)
+        c = COLUMNS
+        green = sum(rows[:, c[f"green_{p}"]] for p in PHASES)
+        cycles = rows[:, c["cycles"]]
+        return [
+            {
+                "start": minute_start((i0 + k) * per),
+                "cycles": int(cycles[k]),
+                "vehicles": {p: int(rows[k, c[f"vehicles_{p}"]]) for p in PHASES},
+                "avg_green": _ratio(green[k], cycles[k]),
+            }
+            for k in range(len(rows))
+        ]
+
+    def peaks(self, start_ts, end_ts, step="hour", top=5):
+        """The `top` buckets with the most vehicles in [start_ts, end_ts)."""
+        m0, m1 = self._window(start_ts, end_ts)
+        per = STEPS[step]
+        i0, i1 = m0 // per, -(-m1 // per)
+        rows = self.tables[step].rows(i0, i1)
+        c = COLUMNS
+        volume = sum(rows[:, c[f"vehicles_{p}"]] for p in PHASES)
+        best = np.argsort(-volume, kind="stable")[:top]
+        return [
+            {
+                "start": minute_start((i0 + k) * per),
+                "cycles": int(rows[k, c["cycles"]]),
+                "vehicles": {p: int(rows[k, c[f"vehicles_{p}"]]) for p in PHASES},
+            }
+            for k in best.tolist() if rows[k, c["cycles"]]
+        ]
+
+
+def _ratio(a, b):
+    return round(float(a) / float(b), 2) if b else None
+
+
+def rebuild(log_dir, directory=ROLLUP_DIR):
+    """Recompute every rollup from the cycle log (one full scan)."""
+    if os.path.isdir(directory):
+        shutil.rmtree(directory)
+    log = CycleLog(log_dir)
+    try:
+        rollups = Rollups(directory, writable=True).catch_up(log)
+    finally:
+        log.close()
+    rollups.flush()
+    return rollups
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cycle log rollups")
+    parser.add_argument("--rebuild", action="store_true", help="recompute from the cycle log")
+    parser.add_argument("--log", default="data/logs/cycles", help="cycle log directory")
+    parser.add_argument("--days", type=float, default=1.0, help="summary window (days back from now)")
+    args = parser.parse_args()
+
+    rollups = rebuild(args.log) if args.rebuild else Rollups()
+    end = time.time()
+    start_q = time.perf_counter()
+    summary = rollups.summary(end - args.days * 86400, end)
+    print(f"[INFO] summary of the last {args.days:g} day(s) in {1000 * (time.perf_counter() - start_q):.2f} ms")
+    print(summary)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,349 @@
+import argparse
+import csv
+import heapq
+import json
+import math
+import os
+import random
+import time
+from collections import deque
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+
+from config import PHASE_APPROACHES
+from controller import TrafficController
+from cycle_log import CycleLog
+from phase_ring import GREEN
+
+# -------------------------------------------------------
+# DISCRETE-EVENT INTERSECTION SIMULATOR
+# -------------------------------------------------------
+# Drives TrafficController on a virtual clock. Vehicles arrive per
+# approach (Poisson, optionally with an hourly demand profile), queue, and
+# discharge at the saturation headway while their phase is green. The
+# event loop jumps straight from one arrival / departure / phase deadline
+# to the next, so a simulated day takes well under a second.
+
+SATURATION_FLOW = 1800      # veh/h/approach while discharging a queue
+STARTUP_LOST_TIME = 2.0     # seconds at the start of green before the first departure
+SIM_START = datetime(2025, 1, 6, 0, 0, 0)   # a Monday, midnight
+
+_ARRIVAL = 0
+_DEPARTURE = 1
+_CONTROLLER = 2
+
+
+class VirtualClock:
+    """Clock for TrafficController that only moves when the simulator says so."""
+
+    def __init__(self, start=SIM_START):
+        self.t = start.timestamp()
+
+    def time(self):
+        return self.t
+
+    def now(self):
+        return datetime.fromtimestamp(self.t)
+
+
+@dataclass
+class Scenario:
+    """
+    rates : veh/h per approach, either a number (constant) or a list of 24
+            hourly rates (time-of-day profile starting at SIM_START).
+    """
+    name: str
+    rates: dict
+    hours: float = 24.0
+    seed: int = 1
+
+    def rate(self, approach, t):
+        """Arrival rate (veh/s) of `approach` at simulated second t."""
+        r = self.rates.get(approach, 0.0)
+        if isinstance(r, (list, tuple)):
+            r = r[int(t // 3600) % len(r)]
+        return r / 3600.0
+
+
+@dataclass
+class SimResult:
+    scenario: str
+    hours: float
+    vehicles: int = 0
+    throughput_vph: float = 0.0
+    avg_delay_s: float = 0.0
+    max_delay_s: float = 0.0
+    max_queue: dict = field(default_factory=dict)
+    avg_cycle_s: float = 0.0
+    cycles: int = 0
+    wall_s: float = 0.0
+
+
+class IntersectionSim:
+    """
+    One intersection driven by a TrafficController on a VirtualClock.
+    """
+
+    def __init__(self, scenario, controller_factory=None):
+        self.scenario = scenario
+        self.clock = VirtualClock()
+        factory = controller_factory or (lambda clock: TrafficController(log_path=None, clock=clock))
+        self.controller = factory(self.clock)
+        self.rng = random.Random(scenario.seed)
+
+        ring = self.controller.ring
+        self.phase_approaches = dict(zip(ring.phases, ring.approaches))
+        self.approaches = [a for approaches in ring.approaches for a in approaches]
+        self.phase_of = {a: phase for phase, approaches in self.phase_approaches.items() for a in approaches}
+        self.queues = {a: deque() for a in self.approaches}   # arrival times
+        self.next_departure = {a: None for a in self.approaches}
+        self.last_departure = {}
+
+        self.events = []
+        self.green_phase = None
+        self.green_start = 0.0
+        self.last_green_start = {}
+        self.cycle_lengths = []
+
+        self.delay_sum = 0.0
+        self.max_delay = 0.0
+        self.departed = 0
+        self.max_queue = {a: 0 for a in self.approaches}
+
+    # ---------------- helpers ----------------
+    def _push(self, t, kind, approach=None):
+        heapq.heappush(self.events, (t, kind, approach or ""))
+
+    def _schedule_arrival(self, approach, t):
+        rate = self.scenario.rate(approach, t)
+        if rate <= 0:
+            # no demand this hour: look again at the top of the next hour
+            self._push((t // 3600 + 1) * 3600, _ARRIVAL, approach)
+            return
+        self._push(t + self.rng.expovariate(rate), _ARRIVAL, approach)
+
+    def _schedule_departure(self, approach, t):
+        if self.next_departure[approach] is not None or not self.queues[approach]:
+            return
+        if self.phase_of[approach] != self.green_phase:
+            return
+        headway = 3600.0 / SATURATION_FLOW
+        depart = max(
+            t,
+            self.green_start + STARTUP_LOST_TIME,
+            self.last_departure.get(approach, -math.inf) + headway,
+        )
+        self.next_departure[approach] = depart
+        self._push(depart, _DEPARTURE, approach)
+
+    def _phase_counts(self):
+        return {
+            phase: sum(len(self.queues[a]) for a in approaches)
+            for phase, approaches in self.phase_approaches.items()
+        }
+
+    def _step_controller(self, t):
+        """Poll the controller exactly at its deadline and track green changes."""
+        self.controller.set_phase_counts(self._phase_counts())
+        self.controller.advance()
+        state = self.controller.current_phase
+        ring = self.controller.ring
+
+        green = ring.phases[ring.phase_of[state.interval]] if ring.kind[state.interval] == GREEN else None
+        if green != self.green_phase:
+            self.green_phase = green
+            self.next_departure = {a: None for a in self.approaches}
+            if green is not None:
+                self.green_start = t
+                if green in self.last_green_start:
+                    self.cycle_lengths.append(t - self.last_green_start[green])
+                self.last_green_start[green] = t
+                for a in self.phase_approaches[green]:
+                    self._schedule_departure(a, t)
+
+        # (+1 us so float rounding never lands just before the deadline)
+        deadline = state.start_time + state.duration - SIM_START.timestamp()
+        self._push(max(deadline, t) + 1e-6, _CONTROLLER)
+
+    # ---------------- run ----------------
+    def run(self):
+        end = self.scenario.hours * 3600.0
+        wall = time.perf_counter()
+
+        for a in self.approaches:
+            self._schedule_arrival(a, 0.0)
+        self._step_controller(0.0)
+
+        while self.events:
+            t, kind, approach = heapq.heappop(self.events)
+            if t > end:
+                break
+            self.clock.t = SIM_START.timestamp() + t
+
+            if kind == _ARRIVAL:
+                q = self.queues[approach]
+                q.append(t)
+                self.max_queue[approach] = max(self.max_queue[approach], len(q))
+                self._schedule_arrival(approach, t)
+                self._schedule_departure(approach, t)
+
+            elif kind == _DEPARTURE:
+                if self.next_departure[approach] != t:
+                    continue          # stale: phase changed since scheduling
+                self.next_departure[approach] = None
+                arrived = self.queues[approach].popleft()
+                delay = t - arrived
+                self.delay_sum += delay
+                self.max_delay = max(self.max_delay, delay)
+                self.departed += 1
+                self.last_departure[approach] = t
+                self._schedule_departure(approach, t)
+
+            else:
+                self._step_controller(t)
+
+        hours = self.scenario.hours
+        return SimResult(
+            scenario=self.scenario.name,
+            hours=hours,
+            vehicles=self.departed,
+            throughput_vph=self.departed / hours if hours else 0.0,
+            avg_delay_s=self.delay_sum / self.departed if self.departed else 0.0,
+            max_delay_s=self.max_delay,
+            max_queue=dict(self.max_queue),
+            avg_cycle_s=sum(self.cycle_lengths) / len(self.cycle_lengths) if self.cycle_lengths else 0.0,
+            cycles=len(self.cycle_lengths),
+            wall_s=time.perf_counter() - wall,
+        )
+
+
+# -------------------------------------------------------
+# REPLAY: hourly demand profile rebuilt from the cycle log
+# -------------------------------------------------------
+def _logged_cycles(path):
+    """(datetime, count_ns, count_ew) per logged cycle: cycle log dir or old CSV."""
+    if os.path.isdir(path):
+        log = CycleLog(path)
+        try:
+            for row in log.range():
+                yield datetime.fromtimestamp(row["ts"]), row["vehicle_count_ns"], row["vehicle_count_ew"]
+        finally:
+            log.close()
+        return
+
+    with open(path, newline="") as f:
+        for row in csv.DictReader(f):
+            ts = datetime.strptime(row["timestamp"], "%Y-%m-%d %H:%M:%S")
+            yield ts, int(row["vehicle_count_ns"]), int(row["vehicle_count_ew"])
+
+
+def profile_from_cycles(path="data/logs/cycles"):
+    """
+    Rebuild a 24-hour arrival-rate profile (veh/h per phase approach) from
+    logged cycles: vehicles counted per green / time since the previous
+    logged green, averaged per hour of day.
+    """
+    sums = {phase: [0.0] * 24 for phase in ("NS", "EW")}
+    seconds = [0.0] * 24
+    prev = None
+
+    for ts, count_ns, count_ew in _logged_cycles(path):
+        if prev is not None:
+            gap = (ts - prev).total_seconds()
+            if 0 < gap < 3600:
+                sums["NS"][ts.hour] += count_ns
+                sums["EW"][ts.hour] += count_ew
+                seconds[ts.hour] += gap
+        prev = ts
+
+    rates = {}
+    for phase, approaches in PHASE_APPROACHES.items():
+        hourly = [3600.0 * sums[phase][h] / seconds[h] if seconds[h] else 0.0 for h in range(24)]
+        for a in approaches:
+            rates[a] = [r / len(approaches) for r in hourly]
+    return rates
+
+
+# -------------------------------------------------------
+# BENCHMARK SUITE
+# -------------------------------------------------------
+def _all_approaches(rate):
+    return {a: rate for approaches in PHASE_APPROACHES.values() for a in approaches}
+
+
+def _peak_profile(base, peak):
+    """24 hourly rates: quiet night, peaks at 08-11 and 17-20."""
+    night = base * 0.3
+    return [night] * 6 + [base] * 2 + [peak] * 3 + [base] * 6 + [peak] * 3 + [base] * 2 + [night] * 2
+
+
+def default_scenarios():
+    ns, ew = PHASE_APPROACHES["NS"], PHASE_APPROACHES["EW"]
+    unbalanced = {a: 500 for a in ns}
+    unbalanced.update({a: 150 for a in ew})
+    return [
+        Scenario("light_uniform", _all_approaches(150), hours=24, seed=11),
+        Scenario("heavy_uniform", _all_approaches(600), hours=24, seed=12),
+        Scenario("unbalanced", unbalanced, hours=24, seed=13),
+        Scenario("commuter_week", _all_approaches(_peak_profile(250, 650)), hours=24 * 7, seed=14),
+    ]
+
+
+def run_suite(scenarios=None, controller_factory=None):
+    return [IntersectionSim(s, controller_factory).run() for s in (scenarios or default_scenarios())]
+
+
+def print_results(results, baseline=None):
+    print(f"{'scenario':<16}{'hours':>7}{'veh':>9}{'veh/h':>8}{'delay s':>9}"
+          f"{'max dly':>9}{'max q':>7}{'cycle s':>9}{'wall s':>8}")
+    for r in results:
+        line = (f"{r.scenario:<16}{r.hours:>7.0f}{r.vehicles:>9}{r.throughput_vph:>8.0f}"
+                f"{r.avg_delay_s:>9.1f}{r.max_delay_s:>9.0f}{max(r.max_queue.values()):>7}"
+                f"{r.avg_cycle_s:>9.1f}{r.wall_s:>8.2f}")
+        if baseline and r.scenario in baseline:
+            before = baseline[r.scenario]["avg_delay_s"]
+            change = 100.0 * (r.avg_delay_s - before) / before if before else 0.0
+            line += f"   delay {change:+.1f}% vs baseline"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline TrafficController benchmark")
+    parser.add_argument("--replay", metavar="LOG", help="demand profile from a cycle log (directory or old CSV)")
+    parser.add_argument("--days", type=float, default=7, help="days to simulate in replay mode")
+    parser.add_argument("--policy", default=None,
+                        help="comma-separated timing policies to compare (see policies.py)")
+    parser.add_argument("--forecast", action="store_true", help="turn the (experimental) demand forecaster on")
+    parser.add_argument("--save", metavar="JSON", help="write results as a baseline file")
+    parser.add_argument("--baseline", metavar="JSON", help="compare against a saved baseline")
+    args = parser.parse_args()
+
+    if args.replay:
+        scenarios = [Scenario("replay", profile_from_cycles(args.replay), hours=24 * args.days)]
+    else:
+        scenarios = None
+
+    baseline = None
+    if args.baseline and os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    policies = args.policy.split(",") if args.policy else [None]
+    saved = {}
+    for policy in policies:
+        factory = (lambda clock, policy=policy:
+                   TrafficController(log_path=None, clock=clock, policy=policy,
+                                     forecast=args.forecast or None))
+        if policy:
+            print(f"\npolicy: {policy}")
+        results = run_suite(scenarios, factory)
+        print_results(results, baseline)
+        for r in results:
+            saved[r.scenario if len(policies) == 1 else f"{r.scenario}/{policy}"] = asdict(r)
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(saved, f, indent=2)
+
+if __name__ == "__main__":
+    main()
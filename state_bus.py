@@ -0,0 +1,223 @@
+import json
+import struct
+import threading
+import time
+
+from count_bus import open_segment, unlink_segment
+
+# -------------------------------------------------------
+# SHARED-MEMORY CONTROLLER STATE
+# -------------------------------------------------------
+# In multi-worker serving (gunicorn.conf.py) exactly one process runs the
+# TrafficController (controller_service.py). It publishes the serialized
+# status and the recent cycle history here, and every web worker reads them,
+# so all workers show one phase timeline.
+#
+# Layout (little endian):
+#   header : magic, version, n_slots, heartbeat (f64, wall clock)
+#   slots  : n_slots x (seq u64, length u32, publish_ts f64, SLOT_BYTES payload)
+#
+# Each slot is a seqlock like the count bus: odd seq while the single writer
+# is copying, even when the payload is complete.
+
+STATE_BUS_NAME = "traffic_state"
+
+MAGIC = b"TSB1"
+VERSION = 1
+SLOT_BYTES = 64 * 1024
+
+STATUS_SLOT = 0       # JSON status payload (status_stream.status_payload)
+HISTORY_SLOT = 1      # JSON list of the newest cycle log rows
+N_SLOTS = 2
+
+STALE_AFTER = 5.0     # seconds without a heartbeat before readers give up on the writer
+
+_HEADER = struct.Struct("<4sIId")
+_HEARTBEAT_OFFSET = 12
+_HEARTBEAT = struct.Struct("<d")
+_SLOT_HEAD = struct.Struct("<QId")
+_SEQ = struct.Struct("<Q")
+_SLOT_SIZE = _SLOT_HEAD.size + SLOT_BYTES
+SEGMENT_SIZE = _HEADER.size + N_SLOTS * _SLOT_SIZE
+
+READ_RETRIES = 100
+FOLLOW_INTERVAL = 0.1   # seconds between seq checks in StateFollower
+
+
+class StateBus:
+    """
+    Fixed slots of JSON payloads in shared memory. StateBus.create() in the
+    controller authority, StateBus.attach() (or StateReader) in workers.
+    """
+
+    def __init__(self, shm):
+        self.shm = shm
+        self.buf = shm.buf
+
+    # ---------------- construction ----------------
+    @classmethod
+    def create(cls, name=STATE_BUS_NAME):
+        try:
+            shm = open_segment(name, SEGMENT_SIZE)
+            seqs = [0] * N_SLOTS
+        except FileExistsError:
+            shm = open_segment(name)
+            if bytes(shm.buf[:4]) != MAGIC:
+                shm.close()
+                raise ValueError(f"Shared memory {name!r} is not a state bus")
+            if shm.size < SEGMENT_SIZE or _HEADER.unpack_from(shm.buf, 0)[1:3] != (VERSION, N_SLOTS):
+                unlink_segment(shm)
+                shm.close()
+                return cls.create(name)
+            # keep sequences increasing across authority restarts
+            seqs = [_SEQ.unpack_from(shm.buf, cls._offset(i))[0] & ~1 for i in range(N_SLOTS)]
+
+        _HEADER.pack_into(shm.buf, 0, MAGIC, VERSION, N_SLOTS, time.time())
+        bus = cls(shm)
+        for slot, seq in enumerate(seqs):
+            _SEQ.pack_into(bus.buf, cls._offset(slot), seq)
+        return bus
+
+    @classmethod
+    def attach(cls, name=STATE_BUS_NAME):
+        shm = open_segment(name)
+        magic, version, n_slots = _HEADER.unpack_from(shm.buf, 0)[:3]
+        if magic != MAGIC or version != VERSION or n_slots != N_SLOTS:
+            shm.close()
+            raise ValueError(f"Shared memory {name!r} has an incompatible layout")
+        return cls(shm)
+
+    @classmethod
+    def try_attach(cls, name=STATE_BUS_NAME):
+        try:
+            return cls.attach(name)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def close(self):
+        self.buf = None
+        self.shm.close()
+
+    def unlink(self):
+        unlink_segment(self.shm)
+
+    @staticmethod
+    def _offset(slot):
+        return _HEADER.size + slot * _SLOT_SIZE
+
+    # ---------------- writer ----------------
+    def publish(self, slot, data):
+        """Store `data` (bytes) in `slot`; returns the slot's new seq."""
+        if len(data) > SLOT_BYTES:
+            raise ValueError(f"State payload of {len(data)} bytes exceeds {SLOT_BYTES}")
+        offset = self._offset(slot)
+        seq = _SEQ.unpack_from(self.buf, offset)[0] + 2
+
+        _SEQ.pack_into(self.buf, offset, seq - 1)                  # slot busy
+        _SLOT_HEAD.pack_into(self.buf, offset, seq - 1, len(data), time.time())
+        start = offset + _SLOT_HEAD.size
+        self.buf[start:start + len(data)] = data
+        _SEQ.pack_into(self.buf, offset, seq)                      # slot ready
+        self.heartbeat()
+        return seq
+
+    def heartbeat(self):
+        _HEARTBEAT.pack_into(self.buf, _HEARTBEAT_OFFSET, time.time())
+
+    # ---------------- readers ----------------
+    def seq(self, slot):
+        return _SEQ.unpack_from(self.buf, self._offset(slot))[0]
+
+    def last_heartbeat(self):
+        return _HEARTBEAT.unpack_from(self.buf, _HEARTBEAT_OFFSET)[0]
+
+    def read(self, slot):
+        """(seq, payload bytes) of `slot`, or None if never written."""
+        offset = self._offset(slot)
+        for _ in range(READ_RETRIES):
+            seq, length, _ = _SLOT_HEAD.unpack_from(self.buf, offset)
+            if seq == 0:
+                return None
+            if seq % 2:
+                continue             # write in progress
+            start = offset + _SLOT_HEAD.size
+            data = bytes(self.buf[start:start + length])
+            if _SEQ.unpack_from(self.buf, offset)[0] == seq:
+                return seq, data
+        return None
+
+
+class StateReader:
+    """
+    Lazily attached reader for web workers. Payloads are decoded once per
+    new seq and cached, so a /status request is two shared-memory loads.
+    """
+
+    def __init__(self, name=STATE_BUS_NAME):
+        self.name = name
+        self.bus = None
+        self._cache = {}
+
+    def _attached(self):
+        if self.bus is None:
+            self.bus = StateBus.try_attach(self.name)
+        return self.bus
+
+    def alive(self):
+        """True if the controller authority has checked in recently."""
+        bus = self._attached()
+        return bus is not None and time.time() - bus.last_heartbeat() < STALE_AFTER
+
+    def seq(self, slot):
+        bus = self._attached()
+        return bus.seq(slot) if bus is not None else 0
+
+    def get(self, slot, default=None):
+        """Decoded JSON payload of `slot`, or `default`."""
+        bus = self._attached()
+        if bus is None:
+            return default
+        seq = bus.seq(slot)
+        cached = self._cache.get(slot)
+        if cached is not None and cached[0] == seq:
+            return cached[1]
+        record = bus.read(slot)
+        if record is None:
+            return default
+        value = json.loads(record[1])
+        self._cache[slot] = (record[0], value)
+        return value
+
+    def status(self):
+        return self.get(STATUS_SLOT)
+
+    def history(self):
+        return self.get(HISTORY_SLOT, [])
+
+
+class StateFollower(threading.Thread):
+    """
+    Worker-side thread that calls on_change(payload) whenever the status
+    slot gets a new seq, e.g. to feed the worker's StatusBroadcaster.
+    """
+
+    def __init__(self, reader, on_change, interval=FOLLOW_INTERVAL):
+        super().__init__(name="state-follower", daemon=True)
+        self.reader = reader
+        self.on_change = on_change
+        self.interval = interval
+        self._stopped = threading.Event()
+
+    def stop(self):
+        self._stopped.set()
+
+    def run(self):
+        last = None
+        while not self._stopped.wait(self.interval):
+            seq = self.reader.seq(STATUS_SLOT)
+            if seq == last:
+                continue
+            payload = self.reader.status()
+            if payload is not None:
+                last = seq
+                self.on_change(payload)
@@ -0,0 +1,120 @@
+import json
+import threading
+import time
+
+# -------------------------------------------------------
+# SERVER-SENT STATUS STREAM
+# -------------------------------------------------------
+# One StatusBroadcaster per server. The controller side publishes a status
+# dict whenever something may have changed; it is serialized once into an
+# SSE event and every /stream subscriber is handed the same bytes. Nothing
+# is sent while the state is unchanged apart from a keepalive comment, and
+# the client counts the remaining time down locally from phase_ends_at.
+
+KEEPALIVE = 15.0            # seconds between ": keepalive" comments on an idle stream
+FRAME_PUSH_INTERVAL = 2.0   # min seconds between pushes caused only by a new camera frame
+RETRY_MS = 3000             # client reconnect delay sent with the first event
+
+# fields that change on their own (frames arrive continuously); a change in
+# only these is pushed at most every FRAME_PUSH_INTERVAL
+VOLATILE_FIELDS = ("frame_seq",)
+
+
+def status_payload(state, frames=None):
+    """
+    Status fields shared by /status, /stream and the state bus, built from
+    a ControllerState and a FrameReader (no wall-clock countdown).
+    """
+    return {
+        "version": state.version,
+        "phase": state.ui_phase,
+        "phase_ends_at": state.ends_at,
+        "green_time": state.green_time,
+        "vehicle_ns": state.count_ns,
+        "vehicle_ew": state.count_ew,
+        "approaches": state.approaches,
+        "queues": state.queues,
+        "flows": state.flows,
+        "load": state.load,
+        "has_image": frames.has_frame() if frames is not None else False,
+        "frame_seq": frames.frame_seq() if frames is not None else 0,
+        "plan": state.plan,
+        "preempt": state.preempt,
+    }
+
+
+class StatusBroadcaster:
+    """
+    Latest serialized status event plus a condition variable that wakes
+    subscribers when it changes.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self.version = 0
+        self.subscribers = 0
+        self._key = None
+        self._volatile = None
+        self._pushed_at = 0.0
+        self._payload = None
+        self._event = None
+
+    def publish(self, payload):
+        """
+        Offer a new status dict. Returns True if it was broadcast, False if
+        it matched the last one (or only a volatile field moved too soon).
+        """
+        key = json.dumps(
+            {k: v for k, v in payload.items() if k not in VOLATILE_FIELDS},
+            sort_keys=True,
+        )
+        volatile = tuple(payload.get(k) for k in VOLATILE_FIELDS)
+        now = time.monotonic()
+
+        with self._cond:
+            if key == self._key:
+                if volatile == self._volatile or now - self._pushed_at < FRAME_PUSH_INTERVAL:
+                    return False
+
+            self.version += 1
+            self._key = key
+            self._volatile = volatile
+            self._pushed_at = now
+            self._payload = dict(payload, seq=self.version, server_time=time.time())
+            data = json.dumps(self._payload)
+            self._event = f"id: {self.version}\ndata: {data}\n\n".encode()
+            self._cond.notify_all()
+            return True
+
+    def latest(self):
+        """Last broadcast payload dict (or None)."""
+        with self._cond:
+            return self._payload
+
+    def wait(self, version, timeout=KEEPALIVE):
+        """
+        Block until an event newer than `version` exists; returns
+        (version, event bytes), or None on timeout.
+        """
+        with self._cond:
+            if not self._cond.wait_for(lambda: self.version > version, timeout):
+                return None
+            return self.version, self._event
+
+    def stream(self, last_version=0):
+        """Generator of SSE bytes for one subscriber."""
+        with self._cond:
+            self.subscribers += 1
+        try:
+            yield f"retry: {RETRY_MS}\n\n".encode()
+            version = last_version
+            while True:
+                event = self.wait(version)
+                if event is None:
+                    yield b": keepalive\n\n"
+                    continue
+                version, data = event
+                yield data
+        finally:
+            with self._cond:
+                self.subscribers -= 1
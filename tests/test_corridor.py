@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+
+from controller import TrafficController, load_category
+from corridor import CorridorEngine, Intersection
+from phase_ring import PhaseRing
+from simulator import VirtualClock
+from timing_plan import TimingPlan
+
+CORRIDOR = [Intersection("A", 0.0), Intersection("B", 300.0, main="EW")]
+
+
+def engine(plan, demand=((10, 2), (4, 8))):
+    e = CorridorEngine(CORRIDOR, clock=VirtualClock(), plan=plan)
+    e.set_demands(np.array(demand, dtype=np.float64))
+    e.plan()
+    return e
+
+
+def test_greens_follow_the_timing_plan():
+    slow = engine(TimingPlan({"PER_VEHICLE": 1}))
+    fast = engine(TimingPlan({"PER_VEHICLE": 3}))
+    assert fast.cycle > slow.cycle
+
+    plan = TimingPlan({"YELLOW_TIME": 4, "ALL_RED_TIME": 3})
+    e = engine(plan)
+    durations = np.diff(np.concatenate([[0.0], e.ends[0]]))
+    assert durations[[1, 2, 4, 5]].tolist() == [4, 3, 4, 3]
+
+
+def test_splits_keep_the_plans_min_greens():
+    plan = TimingPlan({"MIN_GREEN": 30})
+    e = engine(plan, demand=((60, 0), (0, 60)))
+    assert (e.greens >= 30).all()
+    assert e.cycle >= 60 + e.lost.max()
+
+
+def test_set_plan_applies_at_the_next_plan():
+    e = engine(TimingPlan())
+    before = e.cycle
+    e.set_plan(TimingPlan({"PER_VEHICLE": 4}))
+    assert e.cycle == before
+    e.plan()
+    assert e.cycle > before
+
+
+def test_ring_without_ns_ew_is_rejected():
+    ring = PhaseRing([{"name": "N"}, {"name": "S"}])
+    with pytest.raises(ValueError):
+        CorridorEngine(CORRIDOR, clock=VirtualClock(), plan=TimingPlan(ring=ring))
+
+
+@pytest.mark.parametrize("total", [0, 1, 5, 6, 15, 16, 100])
+def test_corridor_and_controller_share_load_categories(total):
+    e = engine(TimingPlan(), demand=((total, 0), (0, 0)))
+    assert e.snapshot(0).load == load_category(total)
+    controller = TrafficController(log_path=None, plan_path=None, clock=VirtualClock(), forecast=False)
+    assert controller.categorize_load(total) == load_category(total)
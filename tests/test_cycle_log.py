@@ -0,0 +1,107 @@
+import builtins
+
+import pytest
+
+import cycle_log
+from cycle_log import CycleLog, import_csv
+
+
+@pytest.fixture
+def log(tmp_path):
+    log = CycleLog(str(tmp_path / "cycles"))
+    yield log
+    log.close()
+
+
+def add(log, ts, load="LIGHT"):
+    log.append("NS_GREEN", 3, 1, 20, load, ts=ts)
+
+
+def stamps(rows):
+    return [row["ts"] for row in rows]
+
+
+def test_range_bisects_within_and_across_segments(log, monkeypatch):
+    monkeypatch.setattr(cycle_log, "SEGMENT_MAX_RECORDS", 4)
+    for i in range(10):
+        add(log, 1000.0 + i)
+    log.flush()
+    assert len(log.segments) == 3
+    assert stamps(log.range(1002.5, 1007)) == [1003, 1004, 1005, 1006]
+    assert stamps(log.range(end_ts=1001)) == [1000]
+    assert stamps(log.last(3)) == [1007, 1008, 1009]
+
+
+def test_older_rows_start_a_sorted_segment(log, tmp_path):
+    add(log, 2e6)
+    log.flush()
+    for i in range(3):
+        add(log, 1e6 + i)
+    log.flush()
+    assert stamps(log.range()) == [1e6, 1e6 + 1, 1e6 + 2, 2e6]
+    assert stamps(log.range(1e6, 1.5e6)) == [1e6, 1e6 + 1, 1e6 + 2]
+    assert stamps(log.range(1.9e6)) == [2e6]
+    assert [seg.first_ts for seg in log.segments] == [1e6, 2e6]
+
+    reopened = CycleLog(log.log_dir)
+    assert stamps(reopened.range()) == [1e6, 1e6 + 1, 1e6 + 2, 2e6]
+    reopened.close()
+
+
+def test_clock_step_back_keeps_ranges_complete(log):
+    for ts in (100, 110, 120, 200, 105, 115, 130):
+        add(log, ts)
+    log.flush()
+    assert stamps(log.range()) == [100, 105, 110, 115, 120, 130, 200]
+    assert stamps(log.range(108, 125)) == [110, 115, 120]
+    assert stamps(log.range(150)) == [200]
+
+
+def test_import_csv_into_a_live_log(log, tmp_path):
+    add(log, 2e6)
+    log.flush()
+    csv_path = tmp_path / "cycles.csv"
+    lines = ["timestamp,phase,vehicle_count_ns,vehicle_count_ew,green_time,load_category"]
+    for day in (3, 1, 2):
+        lines.append(f"1970-01-{day:02d} 00:00:00,EW_GREEN,1,2,25,FREE")
+    csv_path.write_text("\n".join(lines) + "\n")
+    assert import_csv(str(csv_path), log) == 3
+
+    rows = log.range()
+    assert stamps(rows) == sorted(stamps(rows)) and stamps(rows)[-1] == 2e6
+    assert len(rows) == 4
+    # the dashboard's recent cycles and new live cycles are unaffected
+    assert stamps(log.last(1)) == [2e6]
+    add(log, 2e6 + 60)
+    log.flush()
+    assert stamps(log.range(1.5e6)) == [2e6, 2e6 + 60]
+
+
+def test_write_errors_keep_rows_and_the_writer(log, monkeypatch):
+    def full_disk(path, mode="r", *args, **kwargs):
+        if "+" in mode:
+            raise OSError(28, "No space left on device")
+        return builtins.open(path, mode, *args, **kwargs)
+
+    add(log, 100)
+    log.flush()
+    monkeypatch.setattr(cycle_log, "open", full_disk, raising=False)
+    add(log, 101)
+    add(log, 102)
+    with pytest.raises(OSError):
+        log.flush()
+    assert stamps(log.range()) == [100]
+
+    monkeypatch.undo()
+    log.flush()
+    assert stamps(log.range()) == [100, 101, 102]
+
+
+def test_unencodable_rows_are_dropped(log):
+    add(log, 100)
+    add(log, 101, load="GRIDLOCK")
+    add(log, 102)
+    log._flush_or_warn()
+    assert stamps(log.range()) == [100, 102]
+    assert log.dropped == 1
+    assert log._writer.is_alive()
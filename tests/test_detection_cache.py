@@ -0,0 +1,65 @@
+import numpy as np
+
+from detection_cache import DetectionCache, frame_key
+from lane_map import LaneMap
+
+LANES = {"NS": [[0, 0], [0.5, 0], [0.5, 1], [0, 1]], "EW": [[0.5, 0], [1, 0], [1, 1], [0.5, 1]]}
+
+
+def result(n):
+    return np.full((n, 4), n, np.float32), np.zeros(n, np.int64), np.ones(n, np.float32)
+
+
+def frame(seed, shape=(48, 64, 3)):
+    return np.random.default_rng(seed).integers(0, 256, shape, dtype=np.uint8)
+
+
+def test_key_is_content_addressed():
+    image = frame(0)
+    assert frame_key(image) == frame_key(image.copy())
+    assert frame_key(np.asfortranarray(image)) == frame_key(image)
+
+    changed = image.copy()
+    changed[17, 23, 1] ^= 1
+    assert frame_key(changed) != frame_key(image)
+    assert frame_key(image.reshape(64, 48, 3)) != frame_key(image)
+    assert frame_key(image, scope="a") != frame_key(image, scope="b")
+
+
+def test_hits_misses_and_lru_eviction():
+    cache = DetectionCache(capacity=2)
+    a, b, c = (frame_key(frame(i)) for i in range(3))
+    assert cache.get(a) is None
+    cache.put(a, result(1))
+    cache.put(b, result(2))
+    assert cache.get(a)[0].shape == (1, 4)       # a is now most recently used
+    cache.put(c, result(3))                       # evicts b
+    assert cache.get(b) is None
+    assert cache.get(a) is not None and cache.get(c) is not None
+    assert len(cache) == 2
+    assert cache.stats() == {"hits": 3, "misses": 2, "evictions": 1, "entries": 2, "hit_rate": 0.6}
+
+
+def test_disabled_cache_keeps_nothing():
+    cache = DetectionCache(capacity=0)
+    assert not cache.enabled
+    cache.put(frame_key(frame(0)), result(1))
+    assert len(cache) == 0
+
+
+def test_put_keeps_read_only_copies():
+    cache = DetectionCache(capacity=4)
+    arrays = result(2)
+    kept = cache.put(frame_key(frame(0)), arrays)
+    for original, copy in zip(arrays, kept):
+        assert original.flags.writeable
+        assert not copy.flags.writeable
+        assert not np.shares_memory(original, copy)
+    arrays[0][:] = -1                             # the detector may reuse its buffers
+    assert (cache.get(frame_key(frame(0)))[0] == 2).all()
+
+
+def test_lane_map_key_is_its_content():
+    assert LaneMap(LANES).key == LaneMap(LANES).key
+    moved = dict(LANES, EW=[[0.6, 0], [1, 0], [1, 1], [0.6, 1]])
+    assert LaneMap(moved).key != LaneMap(LANES).key
@@ -0,0 +1,117 @@
+import http.client
+import socket
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from edge_runtime import EdgeHTTPServer, StatusHandler
+from metrics import EDGE_METRICS, Metrics
+
+IDLE_TIMEOUT = 0.3
+
+
+class FakeBroadcaster:
+    """A StatusBroadcaster that only sends keepalives."""
+
+    def stream(self, last_version=0):
+        yield b"retry: 1000\n\n"
+        while True:
+            time.sleep(0.05)
+            yield b": keepalive\n\n"
+
+
+@pytest.fixture
+def serve(monkeypatch):
+    monkeypatch.setattr(StatusHandler, "timeout", IDLE_TIMEOUT)
+    servers = []
+
+    def start(connections=2, streams=1):
+        runtime = SimpleNamespace(edge_metrics=Metrics(EDGE_METRICS), index_html=b"ok",
+                                  broadcaster=FakeBroadcaster(), stopped=False)
+        server = EdgeHTTPServer(("127.0.0.1", 0), runtime, connections, streams)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.runtime.stopped = True
+        server.shutdown()
+        server.server_close()
+
+
+def connect(server):
+    return socket.create_connection(server.server_address[:2], timeout=2)
+
+
+def get(sock, path="/"):
+    sock.sendall(f"GET {path} HTTP/1.1\r\nHost: edge\r\n\r\n".encode())
+    return sock.recv(4096)
+
+
+def test_connections_beyond_the_cap_get_503(serve):
+    server = serve(connections=2)
+    held = [connect(server), connect(server)]
+    time.sleep(0.05)
+    extra = connect(server)
+    assert extra.recv(4096).startswith(b"HTTP/1.1 503")
+    assert server.runtime.edge_metrics.value("edge_http_rejected_total") == 1
+    for sock in held + [extra]:
+        sock.close()
+
+
+def test_idle_keep_alive_connections_release_their_slot(serve):
+    server = serve(connections=1)
+    conn = http.client.HTTPConnection(*server.server_address[:2], timeout=2)
+    conn.request("GET", "/")
+    res = conn.getresponse()
+    assert (res.status, res.read()) == (200, b"ok")
+    # the connection stays open after the response, then times out idle
+    assert not res.will_close
+    time.sleep(IDLE_TIMEOUT + 0.2)
+    assert conn.sock.recv(4096) == b""
+    conn.close()
+
+    other = connect(server)
+    assert get(other).startswith(b"HTTP/1.1 200")
+    other.close()
+
+
+def test_stream_cap_and_idle_timeout_exemption(serve):
+    server = serve(connections=4, streams=1)
+    first = connect(server)
+    assert get(first, "/stream").startswith(b"HTTP/1.1 200")
+
+    second = connect(server)
+    assert get(second, "/stream").startswith(b"HTTP/1.1 503")
+    second.close()
+
+    # a stream outlives the idle timeout
+    time.sleep(IDLE_TIMEOUT + 0.2)
+    assert b"keepalive" in first.recv(4096)
+    first.close()
+
+    # the stream slot is free again once the writer notices the close
+    deadline = time.time() + 2
+    while time.time() < deadline:
+        third = connect(server)
+        head = get(third, "/stream")
+        third.close()
+        if head.startswith(b"HTTP/1.1 200"):
+            break
+        time.sleep(0.05)
+    assert head.startswith(b"HTTP/1.1 200")
+
+
+def test_stream_slots_are_taken_atomically(serve):
+    server = serve(connections=8, streams=2)
+    socks = [connect(server) for _ in range(6)]
+    for sock in socks:
+        sock.sendall(b"GET /stream HTTP/1.1\r\nHost: edge\r\n\r\n")
+    heads = [sock.recv(4096) for sock in socks]
+    assert sum(h.startswith(b"HTTP/1.1 200") for h in heads) == 2
+    for sock in socks:
+        sock.close()
+
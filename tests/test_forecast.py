@@ -0,0 +1,84 @@
+import json
+import os
+
+import pytest
+
+from controller import TrafficController
+from forecast import DemandForecaster
+from timing_plan import local_hours
+
+T0 = 1_700_470_800.0             # start of an hour; any fixed one works
+HOUR = 3600
+
+
+def trained(rates, key="NS"):
+    """Forecaster with `rates` = {ts: veh/s} observed three times each."""
+    f = DemandForecaster(["NS", "EW"])
+    for ts, rate in rates.items():
+        for i in range(3):
+            f.observe(ts + i, key, rate * 60, 60)
+    return f
+
+
+def test_rate_unknown_until_bin_has_min_samples():
+    f = DemandForecaster(["NS", "EW"])
+    f.observe(T0, "NS", 30, 60)
+    f.observe(T0 + 1, "NS", 30, 60)
+    assert f.rate(T0, "NS") is None
+    f.observe(T0 + 2, "NS", 30, 60)
+    assert f.rate(T0, "NS") == pytest.approx(0.5)
+
+
+def test_observations_land_in_their_week_hour_bin():
+    f = trained({T0: 0.5, T0 + HOUR: 0.1})
+    assert f.profile["NS"][local_hours.week_hour(T0)] == pytest.approx(0.5)
+    assert f.profile["NS"][local_hours.week_hour(T0 + HOUR)] == pytest.approx(0.1)
+    assert f.rate(T0 + 2 * HOUR, "NS") is None
+
+
+def test_multiplier_is_clamped_to_the_given_bounds():
+    f = trained({T0: 2.0, T0 + HOUR: 0.1, T0 + 2 * HOUR: 0.1})
+    assert f.multiplier(T0, "NS", (0.5, 1.5)) == 1.5
+    assert f.multiplier(T0 + HOUR, "NS", (0.5, 1.5)) == 0.5
+    assert f.multiplier(T0, "NS", (0.5, 4.0)) > 1.5
+
+
+def test_forecasting_is_off_by_default():
+    assert TrafficController(log_path=None, plan_path=None).forecaster is None
+
+
+def test_learned_multiplier_follows_reloaded_plan_bounds(tmp_path):
+    path = tmp_path / "timing.json"
+    path.write_text(json.dumps({"PEAK_MULTIPLIER_NS": 1.5, "PEAK_MULTIPLIER_EW": 1.2}))
+    controller = TrafficController(log_path=None, plan_path=str(path), forecast=True)
+    controller.forecaster = trained({T0: 5.0, T0 + HOUR: 0.1, T0 + 2 * HOUR: 0.1})
+    assert controller._learned_multiplier(0, T0) == 1.5
+
+    path.write_text(json.dumps({"PEAK_MULTIPLIER_NS": 2.0, "PEAK_MULTIPLIER_EW": 1.2}))
+    os.utime(path, ns=(0, 1))
+    assert controller.reload_plan()
+    assert controller._learned_multiplier(0, T0) == 2.0
+
+
+def log_rows(n, period=60):
+    """Alternating NS / EW cycle log rows; each green clears its queue, 3 arrive per red."""
+    return [
+        {"ts": T0 + i * period, "phase": ("NS_GREEN", "EW_GREEN")[i % 2],
+         "vehicle_count_ns": 3 * (i % 2), "vehicle_count_ew": 3 * (1 - i % 2)}
+        for i in range(n)
+    ]
+
+
+def test_train_uses_the_logged_phases_of_the_ring():
+    f = DemandForecaster(["NS", "EW"]).train(log_rows(20))
+    assert f.observations["NS"] > 0 and f.observations["EW"] > 0
+    assert f.rate(T0 + 1200, "NS") == pytest.approx(3 / 60)
+
+
+def test_train_skips_phases_the_log_does_not_count():
+    f = DemandForecaster(["NS", "NS_LEFT", "EW"]).train(log_rows(20))
+    assert f.observations["NS_LEFT"] == 0
+    assert f.observations["EW"] > 0
+
+    f = DemandForecaster(["N", "S", "E", "W"]).train(log_rows(20))
+    assert not any(f.observations.values())
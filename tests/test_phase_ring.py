@@ -0,0 +1,51 @@
+import json
+
+import pytest
+
+from controller import TrafficController
+from phase_ring import PhaseRing
+from policies import LinearPolicy
+from simulator import VirtualClock
+from timing_plan import TimingPlan
+
+
+class FractionalExtension(LinearPolicy):
+    """Asks for less than a second more green every time."""
+
+    def extend(self, ctx, elapsed):
+        return 0.5
+
+
+@pytest.mark.parametrize("key, value", [("min", 0.5), ("max", 30.5), ("base", 0), ("min", True), ("max", "30")])
+def test_ring_rejects_non_whole_greens(key, value):
+    with pytest.raises(ValueError):
+        PhaseRing([{"name": "NS", key: value}, {"name": "EW"}])
+
+
+def test_ring_accepts_whole_float_greens():
+    ring = PhaseRing([{"name": "NS", "min": 10.0, "max": 60.0}, {"name": "EW"}])
+    assert ring.clamp_green(0, 5) == 10
+
+
+def test_plan_with_fractional_min_green_is_not_applied(tmp_path):
+    with pytest.raises(ValueError):
+        TimingPlan({"MIN_GREEN": 0.5})
+    path = tmp_path / "timing.json"
+    path.write_text(json.dumps({"MIN_GREEN": 0.5}))
+    controller = TrafficController(log_path=None, plan_path=str(path), policy="max_pressure",
+                                   clock=VirtualClock(), forecast=False)
+    assert controller.plan.source is None        # config.py timing instead
+    controller.set_counts(8, 0)
+    controller.clock.t += 600
+    assert controller.advance()
+
+
+def test_fractional_extension_ends_the_green():
+    clock = VirtualClock()
+    controller = TrafficController(log_path=None, plan_path=None, policy=FractionalExtension(),
+                                   clock=clock, forecast=False)
+    start = controller.current_phase
+    clock.t += start.duration
+    assert controller.advance()
+    assert controller.current_phase.name.endswith("_YELLOW")
+    assert controller.current_phase.start_time == start.start_time + start.duration
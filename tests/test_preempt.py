@@ -0,0 +1,124 @@
+import pytest
+
+from config import PREEMPT_GREEN, PREEMPT_MIN_GREEN, TRANSIT_PRIORITY_COOLDOWN
+from controller import TrafficController
+from preempt import EMERGENCY, TRANSIT
+from simulator import VirtualClock
+
+
+@pytest.fixture
+def controller():
+    """Two-phase controller on a virtual clock, NS green from clock.t (T0)."""
+    return TrafficController(log_path=None, plan_path=None, clock=VirtualClock(), forecast=False)
+
+
+def at(controller, ts):
+    controller.clock.t = ts
+    controller.advance()
+    return controller.current_phase
+
+
+def lost(controller, phase):
+    k = controller.ring.index[phase]
+    return controller.ring.yellow[k] + controller.ring.all_red[k]
+
+
+def test_emergency_cuts_a_conflicting_green_to_the_preempt_minimum(controller):
+    t0 = controller.clock.t
+    assert controller.current_phase.name == "NS_GREEN"
+    controller.clock.t = t0 + 2
+    p = controller.request_preempt("EW", EMERGENCY)
+    assert controller.current_phase.duration == PREEMPT_MIN_GREEN
+    assert p.deadline == t0 + PREEMPT_MIN_GREEN + lost(controller, "NS")
+
+    assert at(controller, t0 + PREEMPT_MIN_GREEN).name == "NS_YELLOW"
+    state = at(controller, p.deadline)
+    assert (state.name, state.start_time, state.duration) == ("EW_GREEN", p.deadline, PREEMPT_GREEN)
+    assert p.served_at == p.deadline
+
+
+def test_transit_waits_for_the_min_green(controller):
+    t0 = controller.clock.t
+    controller.clock.t = t0 + 2
+    controller.request_preempt("EW", TRANSIT)
+    assert controller.current_phase.duration == controller.ring.min_green[0]
+
+
+def test_a_late_request_ends_the_green_now(controller):
+    t0 = controller.clock.t
+    controller.clock.t = t0 + 17.5
+    p = controller.request_preempt("EW", EMERGENCY)
+    assert controller.current_phase.duration == pytest.approx(17.5)
+    assert at(controller, p.deadline).name == "EW_GREEN"
+
+
+def test_a_green_already_serving_the_phase_is_held(controller):
+    t0 = controller.clock.t
+    base = controller.current_phase.duration
+    controller.clock.t = t0 + 10
+    p = controller.request_preempt("NS", EMERGENCY)
+    assert p.served_at == t0 + 10
+    assert controller.current_phase.name == "NS_GREEN"
+    assert controller.current_phase.duration == max(base, 10 + PREEMPT_GREEN)
+
+    # repeats keep holding it, never past max green
+    controller.clock.t = t0 + 1000
+    controller.request_preempt("NS", EMERGENCY)
+    assert controller.current_phase.duration == controller.ring.max_green[0]
+
+
+def test_transit_yields_to_emergency(controller):
+    t0 = controller.clock.t
+    controller.clock.t = t0 + 1
+    controller.request_preempt("EW", TRANSIT)
+    assert controller.preempt.phase == "EW"
+
+    controller.clock.t = t0 + 2
+    p = controller.request_preempt("NS", EMERGENCY)
+    assert (controller.preempt.phase, controller.preempt.kind) == ("NS", EMERGENCY)
+    assert p.served_at == t0 + 2                 # NS is green: held for the emergency
+
+    # transit for another phase is ignored while the emergency is served
+    assert controller.request_preempt("EW", TRANSIT) is None
+    assert controller.preempt is p
+
+
+def test_equal_kind_for_another_phase_waits_until_served(controller):
+    t0 = controller.clock.t
+    controller.clock.t = t0 + 1
+    first = controller.request_preempt("EW", EMERGENCY)
+    assert controller.request_preempt("NS", EMERGENCY) is None
+    assert controller.preempt is first
+
+
+def test_transit_cooldown_per_phase(controller):
+    t0 = controller.clock.t
+    controller.clock.t = t0 + 20
+    p = controller.request_preempt("EW", TRANSIT)
+    state = at(controller, p.deadline)
+    assert state.name == "EW_GREEN"
+    ended = state.start_time + state.duration
+    assert at(controller, ended).name == "EW_YELLOW"
+    assert controller.preempt is None
+
+    controller.clock.t = ended + TRANSIT_PRIORITY_COOLDOWN - 1
+    assert controller.request_preempt("EW", TRANSIT) is None
+    controller.clock.t = ended + TRANSIT_PRIORITY_COOLDOWN + 1
+    assert controller.request_preempt("EW", TRANSIT) is not None
+
+
+def test_emergency_ignores_the_transit_cooldown(controller):
+    t0 = controller.clock.t
+    controller.clock.t = t0 + 20
+    p = controller.request_preempt("EW", TRANSIT)
+    state = at(controller, p.deadline)
+    ended = state.start_time + state.duration
+    at(controller, ended)
+
+    controller.clock.t = ended + 1
+    assert controller.request_preempt("EW", EMERGENCY) is not None
+
+
+def test_unknown_approach_is_ignored(controller):
+    assert controller.request_preempt("NE", EMERGENCY) is None
+    assert controller.preempt is None
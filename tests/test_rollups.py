@@ -0,0 +1,92 @@
+import importlib
+import os
+import time
+
+import pytest
+
+from controller import TrafficController
+from rollups import Rollups, minute_index, minute_start
+
+
+@pytest.fixture
+def rollups(tmp_path):
+    return Rollups(str(tmp_path / "rollups"), writable=True)
+
+
+def add(rollups, ts, green, vehicles=4):
+    rollups.add(ts, "NS_GREEN", vehicles, 0, green, "LIGHT")
+
+
+def test_summary_includes_the_current_minute(rollups):
+    now = time.time()
+    for i in range(30):
+        add(rollups, now - 0.01 * i, 24)
+    summary = rollups.summary(now - 86400, now + 0.001)
+    assert summary["cycles"] == 30
+    assert summary["green_time"]["p50"] == pytest.approx(24, rel=0.08)
+
+
+def test_percentiles_cover_only_the_counted_cycles(rollups):
+    hour = minute_start(minute_index(time.time() - 86400) // 60 * 60)
+    # a long green in the first minutes of the hour, before the window starts
+    add(rollups, hour + 60, 100)
+    for i in range(10):
+        add(rollups, hour + 1800 + i, 20)
+    summary = rollups.summary(hour + 900, hour + 3600)
+    assert summary["cycles"] == 10
+    assert summary["green_time"]["p99"] == pytest.approx(20, rel=0.08)
+
+    empty = rollups.summary(hour + 2400, hour + 3000)
+    assert empty["cycles"] == 0
+    assert empty["green_time"]["p50"] is None
+
+
+def test_sums_match_raw_cycles_across_hour_and_day_edges(rollups):
+    # window edges on whole minutes: partial edge minutes are counted whole
+    start = minute_start(minute_index(time.time() - 3 * 86400))
+    for i in range(200):
+        add(rollups, start + i * 997, 15 + i % 40, vehicles=i % 7)
+    summary = rollups.summary(start + 4980, start + 150_000)
+    inside = [i for i in range(200) if start + 4980 <= start + i * 997 < start + 150_000]
+    assert summary["cycles"] == len(inside)
+    assert summary["vehicles"]["NS"] == sum(i % 7 for i in inside)
+
+
+def test_controller_keeps_rollups_with_its_own_log(tmp_path):
+    log = tmp_path / "log"
+    controller = TrafficController(log_path=str(log), plan_path=None)
+    try:
+        assert controller.rollups.dir == os.path.join(str(log), "rollups")
+    finally:
+        controller.cycle_log.close()
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("TRAFFIC_STATE", "local")
+    import app
+    app = importlib.reload(app)
+    yield app.app.test_client()
+    app.runner.stop()
+    if app.preempt_listener is not None:
+        app.preempt_listener.stop()
+
+
+@pytest.mark.parametrize("query", [
+    "/analytics/summary?start=1e300&end=1e301",
+    "/analytics/summary?start=-1e300&end=0",
+    "/analytics/series?start=0&end=1e20",
+    "/analytics/peaks?top=-1",
+    "/analytics/peaks?top=0",
+    "/analytics/peaks?top=100000",
+    "/analytics/peaks?top=x",
+])
+def test_bad_analytics_queries_are_400(client, query):
+    assert client.get(query).status_code == 400
+
+
+def test_analytics_summary_ok(client):
+    res = client.get("/analytics/summary")
+    assert res.status_code == 200
+    assert res.get_json()["cycles"] == 0
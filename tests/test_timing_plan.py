@@ -0,0 +1,101 @@
+import json
+import os
+
+import pytest
+
+import config
+from controller import TrafficController
+from timing_plan import LEARNED_STEP, TimingPlan
+
+T0 = 1_700_470_800.0
+
+
+class FixedForecast:
+    """Forecaster stand-in that has learned `value` for every phase and hour."""
+
+    def __init__(self, value):
+        self.value = value
+
+    def multiplier(self, when, key, bounds):
+        low, high = bounds
+        return max(low, min(self.value, high))
+
+    def forecast(self, when, seconds):
+        return None
+
+    def served(self, *args):
+        pass
+
+
+def write_plan(path, overrides, stamp):
+    path.write_text(json.dumps(overrides))
+    os.utime(path, ns=(stamp, stamp))       # a distinct mtime per rewrite
+
+
+@pytest.fixture
+def controller(tmp_path):
+    path = tmp_path / "timing.json"
+    write_plan(path, {}, 1)
+    c = TrafficController(log_path=None, plan_path=str(path), forecast=True)
+    c.forecaster = FixedForecast(1.234)
+    c.plan_file = path
+    return c
+
+
+def test_tables_match_the_linear_rule():
+    plan = TimingPlan()
+    ring = plan.ring
+    for k in range(ring.n_phases):
+        for hour in range(24):
+            m = plan.multiplier[k][hour]
+            for vehicles in range(200):
+                expected = ring.clamp_green(k, (ring.base[k] + config.PER_VEHICLE * vehicles) * m)
+                assert plan.green(k, hour, vehicles) == expected
+
+
+def test_learned_rows_are_clamped_and_rounded():
+    plan = TimingPlan()
+    low, high = plan.multiplier_range
+    ring = plan.ring
+    assert plan.row(0, 12, low / 10)[0] == low
+    assert plan.row(0, 12, high * 10)[0] == high
+    m, row = plan.row(0, 12, 1.234)
+    assert m == pytest.approx(1.23)
+    assert abs(m - 1.234) <= LEARNED_STEP / 2
+    for vehicles in range(100):
+        assert plan.green(0, 12, vehicles, 1.234) == \
+            ring.clamp_green(0, (ring.base[0] + config.PER_VEHICLE * vehicles) * m)
+
+
+def test_every_decision_uses_the_table_with_forecasting_on(controller):
+    for hour in range(0, 24 * 3600, 1800):
+        ctx = controller.decision_context(T0 + hour)
+        assert set(ctx.greens) == set(controller.ring.phases)
+        for p in ctx.greens:
+            assert ctx.multiplier[p] == pytest.approx(1.23)
+
+
+def test_reload_reaches_learned_decisions(controller):
+    before = controller.compute_green_time("NS_GREEN", 10, 0)
+    write_plan(controller.plan_file, {"PER_VEHICLE": 1}, 2)
+    assert controller.reload_plan()
+    after = controller.compute_green_time("NS_GREEN", 10, 0)
+    ring = controller.ring
+    assert after != before
+    assert after == ring.clamp_green(0, (ring.base[0] + 10) * 1.23)
+
+    # a lower peak multiplier now caps the learned one
+    write_plan(controller.plan_file, {"PEAK_MULTIPLIER_NS": 1.1, "PEAK_MULTIPLIER_EW": 1.1}, 3)
+    assert controller.reload_plan()
+    assert controller._phase_multiplier(0, T0) == pytest.approx(1.1)
+
+
+def test_bad_plan_keeps_the_running_one(controller):
+    plan = controller.plan
+    write_plan(controller.plan_file, {"NO_SUCH_KEY": 1}, 4)
+    assert not controller.reload_plan()
+    assert controller.plan is plan
+    controller.plan_file.write_text("{not json")
+    os.utime(controller.plan_file, ns=(5, 5))
+    assert not controller.reload_plan()
+    assert controller.plan is plan
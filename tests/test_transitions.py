@@ -0,0 +1,47 @@
+from controller import TrafficController
+from simulator import VirtualClock
+
+
+class Recorder(TrafficController):
+    """Records every interval entered, with its start time."""
+
+    def _enter(self, interval, at, duration):
+        super()._enter(interval, at, duration)
+        self.entered.append((self.current_phase.name, at, duration))
+
+
+def make():
+    controller = Recorder(log_path=None, plan_path=None, clock=VirtualClock(), forecast=False)
+    controller.entered = []
+    return controller
+
+
+def test_nothing_happens_before_the_deadline():
+    controller = make()
+    deadline = controller.next_transition_at()
+    assert not controller.advance(deadline - 0.001)
+    assert controller.entered == []
+    assert controller.advance(deadline)
+    assert controller.entered[0][:2] == ("NS_YELLOW", deadline)
+
+
+def test_late_ticks_apply_every_transition_at_its_own_deadline():
+    controller = make()
+    ring = controller.ring
+    start = controller.current_phase.start_time
+    version = controller.version
+    assert controller.advance(start + 3600)
+    assert controller.version == version + 1
+
+    # green -> yellow -> all-red, then the policy's next green
+    kinds = [name.rsplit("_", 1)[-1] for name, _, _ in controller.entered]
+    assert kinds[:6] == ["YELLOW", "RED", "GREEN", "YELLOW", "RED", "GREEN"]
+    assert controller.entered[0][2] == ring.yellow[0]
+    assert controller.entered[1][2] == ring.all_red[0]
+
+    # each interval starts exactly where the previous one ended: no drift
+    previous_end = start + ring.base[0]
+    for _, at, duration in controller.entered:
+        assert at == previous_end
+        previous_end = at + duration
+    assert controller.next_transition_at() > start + 3600
@@ -0,0 +1,190 @@
+import numpy as np
+
+from config import (
+    DETECTOR_INPUT_SIZE, DETECTOR_INPUT_SIZES,
+    ROI_MARGIN, TILE_SIZE, TILE_OVERLAP,
+    MIN_OBJECT_PX, TILE_REFRESH_FRAMES,
+)
+
+# -------------------------------------------------------
+# ROI CROP, ADAPTIVE INPUT SIZE, TILED REFINEMENT
+# -------------------------------------------------------
+# For 4K cameras one full-frame pass either wastes compute on sky and
+# buildings or shrinks distant vehicles below what the network resolves.
+# Per camera, TiledDetector:
+#
+#   1. crops the frame to the lane map's ROI (LaneMap.roi), since only
+#      boxes inside lanes are counted anyway;
+#   2. runs the ROI once at an input size chosen from DETECTOR_INPUT_SIZES
+#      by the recent detections: one rung up while the typical (median)
+#      vehicle is under 2 x MIN_OBJECT_PX at network scale, one rung down
+#      while it is over 4 x (or the scene is empty);
+#   3. re-runs at native resolution only the TILE_SIZE tiles where small
+#      vehicles were seen lately (an exponentially decayed "heat" per
+#      tile), plus every tile on each TILE_REFRESH_FRAMES-th frame so new
+#      distant traffic is found;
+#   4. merges coarse and tile boxes with fast_nms().
+#
+# Backends with a fixed input size (exported ONNX / OpenVINO models) skip
+# step 2 and still get the crop and the tiles.
+
+HEAT_DECAY = 0.2                 # weight of the newest frame in a tile's heat
+HEAT_MIN = 0.5                   # tiles hotter than this are refined
+MERGE_IOS = 0.8                  # intersection / smaller box above which tile boxes merge
+ADAPT_EVERY = 10                 # frames between input size changes
+
+
+def fast_nms(boxes, scores, cls, iou, ios=MERGE_IOS):
+    """
+    Class-aware "fast NMS": one pairwise overlap matrix, and a box is
+    dropped if any higher-scoring box of its class overlaps it by IoU > iou
+    or covers ios of the smaller box (a vehicle cut at a tile edge).
+    Unlike greedy NMS, a dropped box still suppresses others, which is
+    harmless at traffic densities. Returns the kept indices, best first.
+    """
+    if len(boxes) == 0:
+        return np.zeros((0,), dtype=int)
+    order = np.argsort(-scores, kind="stable")
+    b = boxes[order].astype(np.float32)
+    area = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+
+    w = np.minimum(b[:, None, 2], b[None, :, 2]) - np.maximum(b[:, None, 0], b[None, :, 0])
+    h = np.minimum(b[:, None, 3], b[None, :, 3]) - np.maximum(b[:, None, 1], b[None, :, 1])
+    inter = np.clip(w, 0, None) * np.clip(h, 0, None)
+    union = area[:, None] + area[None, :] - inter
+    smaller = np.minimum(area[:, None], area[None, :])
+
+    overlap = (inter > iou * union) | (inter > ios * smaller)
+    overlap &= cls[order][:, None] == cls[order][None, :]
+    suppressed = np.triu(overlap, k=1).any(axis=0)
+    return order[~suppressed]
+
+
+def tile_grid(height, width, tile=TILE_SIZE, overlap=TILE_OVERLAP):
+    """(T, 4) tiles [x1, y1, x2, y2] covering a height x width image."""
+    def starts(length):
+        if length <= tile:
+            return [0]
+        step = max(1, int(tile * (1 - overlap)))
+        s = list(range(0, length - tile, step))
+        return s + [length - tile]
+
+    return np.array([
+        (x, y, min(x + tile, width), min(y + tile, height))
+        for y in starts(height)
+        for x in starts(width)
+    ], dtype=np.int32)
+
+
+class TiledDetector:
+    """Tiled, ROI-cropped inference for one camera; see the module comment."""
+
+    def __init__(self, backend, lane_map, sizes=DETECTOR_INPUT_SIZES):
+        self.backend = backend
+        self.lane_map = lane_map
+        self.sizes = (backend.input_size,) if backend.fixed_size else tuple(sorted(sizes))
+        start = min(self.sizes, key=lambda s: abs(s - DETECTOR_INPUT_SIZE))
+        self.size_index = self.sizes.index(start)
+
+        self.frames = 0
+        self.small_votes = 0         # frames since the last size change voting up ...
+        self.large_votes = 0         # ... and voting down
+        self._tiles = None
+        self._tiles_key = None
+        self.heat = None
+
+        # per-frame cost, for the benchmark and /metrics
+        self.last_tiles = 0
+        self.last_pixels = 0         # network input pixels spent on the last frame
+
+    @property
+    def size(self):
+        return self.sizes[self.size_index]
+
+    def tiles(self, height, width):
+        if self._tiles_key != (height, width):
+            self._tiles = tile_grid(height, width)
+            self._tiles_key = (height, width)
+            self.heat = np.zeros(len(self._tiles), dtype=np.float32)
+        return self._tiles
+
+    def detect(self, image, conf, iou):
+        """(boxes, cls, confs) of the whole frame, like DetectorBackend.infer()."""
+        height, width = image.shape[:2]
+        x1, y1, x2, y2 = self.lane_map.roi(height, width, ROI_MARGIN)
+        roi = image[y1:y2, x1:x2]
+        rh, rw = roi.shape[:2]
+
+        size = self.size
+        boxes, cls, confs = self.backend.infer([roi], conf, iou, size)[0]
+        scale = min(1.0, size / max(rh, rw))
+        self.last_pixels = size * size
+        self.last_tiles = 0
+
+        # tiles only add detail while the ROI is being downscaled
+        if scale < 1.0:
+            tiles = self.tiles(rh, rw)
+            refine = self._pick_tiles()
+            if len(refine):
+                crops = [roi[ty1:ty2, tx1:tx2] for tx1, ty1, tx2, ty2 in tiles[refine].tolist()]
+                tile_size = size if self.backend.fixed_size else TILE_SIZE
+                results = self.backend.infer(crops, conf, iou, tile_size)
+                parts_b, parts_c, parts_s = [boxes], [cls], [confs]
+                for (tx1, ty1, _tx2, _ty2), (b, c, s) in zip(tiles[refine].tolist(), results):
+                    parts_b.append(b + np.array([tx1, ty1, tx1, ty1], dtype=np.int32))
+                    parts_c.append(c)
+                    parts_s.append(s)
+                boxes = np.concatenate(parts_b)
+                cls = np.concatenate(parts_c)
+                confs = np.concatenate(parts_s)
+                keep = fast_nms(boxes, confs, cls, iou)
+                boxes, cls, confs = boxes[keep], cls[keep], confs[keep]
+                self.last_tiles = len(refine)
+                self.last_pixels += len(refine) * tile_size * tile_size
+            self._update_heat(boxes, scale)
+
+        self._adapt(boxes, scale, max(rh, rw))
+        self.frames += 1
+        return boxes + np.array([x1, y1, x1, y1], dtype=np.int32), cls, confs
+
+    # ---------------- tile selection ----------------
+    def _pick_tiles(self):
+        if self.frames % TILE_REFRESH_FRAMES == 0:
+            return np.arange(len(self.heat))
+        return np.nonzero(self.heat > HEAT_MIN)[0]
+
+    def _update_heat(self, boxes, scale):
+        """Decay every tile's heat towards its count of small boxes this frame."""
+        heights = (boxes[:, 3] - boxes[:, 1]) * scale
+        small = boxes[heights < MIN_OBJECT_PX]
+        cx = (small[:, 0] + small[:, 2]) / 2
+        cy = (small[:, 1] + small[:, 3]) / 2
+        t = self._tiles
+        inside = ((cx[:, None] >= t[:, 0]) & (cx[:, None] < t[:, 2])
+                  & (cy[:, None] >= t[:, 1]) & (cy[:, None] < t[:, 3]))
+        self.heat += HEAT_DECAY * (inside.sum(axis=0) - self.heat)
+
+    # ---------------- input size ----------------
+    def _adapt(self, boxes, scale, roi_side):
+        if len(self.sizes) == 1:
+            return
+        # the coarse pass is sized for the typical vehicle; the small,
+        # distant ones are left to the tiles
+        if len(boxes):
+            typical = np.median(boxes[:, 3] - boxes[:, 1]) * scale
+            if typical < 2 * MIN_OBJECT_PX:
+                self.small_votes += 1
+            elif typical > 4 * MIN_OBJECT_PX:
+                self.large_votes += 1
+        else:
+            self.large_votes += 1
+
+        if self.small_votes + self.large_votes < ADAPT_EVERY:
+            return
+        # never upscale past the ROI's own resolution
+        if self.small_votes > self.large_votes and self.size_index < len(self.sizes) - 1 \
+                and self.size < roi_side:
+            self.size_index += 1
+        elif self.large_votes > self.small_votes and self.size_index > 0:
+            self.size_index -= 1
+        self.small_votes = self.large_votes = 0
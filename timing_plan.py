@@ -0,0 +1,217 @@
+import hashlib
+import json
+import os
+import time
+
+import config
+from phase_ring import PhaseRing
+
+# -------------------------------------------------------
+# TIMING PLAN: MEMOIZED GREEN TIMES, HOT RELOAD
+# -------------------------------------------------------
+# Everything the linear timing rule depends on, compiled once into lookup
+# tables instead of re-evaluated per decision:
+#
+#   multiplier[k][hour]         fixed peak / night factor of ring phase k
+#   greens[k][hour][vehicles]   clamped green of phase k for that many
+#                               vehicles; the row stops where the green
+#                               reaches max_green, so longer queues take
+#                               the last entry (see green())
+#   learned_greens[k][i]        the same rows for learned multipliers
+#                               (forecast.py): multiplier_range in steps of
+#                               LEARNED_STEP, so a learned multiplier is a
+#                               lookup too and follows a reloaded plan
+#
+# Parameters are the config.py values in TIMING_KEYS, overridden by the
+# JSON file at TIMING_PLAN_PATH, e.g.
+#   {"PER_VEHICLE": 2, "MAX_GREEN": 90, "PEAK_MORNING": [7, 10]}
+# TrafficController.reload_plan() rebuilds the plan when that file changes
+# and swaps it in as one reference, so a decision sees either the old plan
+# or the new one, never a mix. A file that does not parse or validate is
+# reported and the running plan kept. Each plan carries a version stamp
+# (counter, content digest, load time) for /status and the logs.
+#
+# Hours come from LocalHours, which looks the local time up once per hour
+# instead of building a datetime per call.
+
+TIMING_KEYS = (
+    "BASE_GREEN_NS", "BASE_GREEN_EW", "PER_VEHICLE",
+    "MIN_GREEN", "MAX_GREEN", "YELLOW_TIME", "ALL_RED_TIME",
+    "PEAK_MORNING", "PEAK_EVENING",
+    "PEAK_MULTIPLIER_NS", "PEAK_MULTIPLIER_EW", "NIGHT_MULTIPLIER",
+    "PHASE_RING",
+)
+
+NIGHT_HOURS = (22, 6)            # night profile from 22:00 until 05:59
+MAX_TABLE_VEHICLES = 4096        # longest green row (only reached with tiny PER_VEHICLE)
+LEARNED_STEP = 0.01              # resolution of learned multipliers in the tables
+
+# the default NS / EW ring entries follow these globals, as in config.py
+_NS_EW_KEYS = {
+    "NS": ("BASE_GREEN_NS", "PEAK_MULTIPLIER_NS"),
+    "EW": ("BASE_GREEN_EW", "PEAK_MULTIPLIER_EW"),
+}
+
+
+class LocalHours:
+    """
+    Local weekday/hour of epoch seconds. time.localtime() runs once per
+    local hour; other calls are a range check on the cached hour.
+    """
+
+    def __init__(self):
+        self._span = (0.0, 0.0, 0)       # [start, end) of the cached hour, its week-hour
+
+    def week_hour(self, ts):
+        """weekday x 24 + hour (0..167), Monday 00:00 = 0."""
+        start, end, bin_ = self._span
+        if start <= ts < end:
+            return bin_
+        t = time.localtime(ts)
+        start = ts - t.tm_min * 60 - t.tm_sec - ts % 1
+        bin_ = t.tm_wday * 24 + t.tm_hour
+        self._span = (start, start + 3600, bin_)   # one assignment: safe across threads
+        return bin_
+
+    def hour(self, ts):
+        return self.week_hour(ts) % 24
+
+
+local_hours = LocalHours()
+
+
+class TimingPlan:
+    """Compiled timing parameters; see the module comment."""
+
+    def __init__(self, overrides=None, ring=None, version=1, source=None):
+        """
+        overrides maps TIMING_KEYS to new values; ring, if given, is used
+        as is instead of compiling PHASE_RING.
+        """
+        overrides = dict(overrides or {})
+        unknown = sorted(set(overrides) - set(TIMING_KEYS))
+        if unknown:
+            raise ValueError(f"Unknown timing parameters {unknown}; allowed: {list(TIMING_KEYS)}")
+        params = {key: getattr(config, key) for key in TIMING_KEYS}
+        params.update(overrides)
+        if params["PER_VEHICLE"] < 0:
+            raise ValueError("PER_VEHICLE must be >= 0")
+
+        self.params = params
+        self.ring = ring or PhaseRing(self._ring_entries(overrides), defaults={
+            "base": params["BASE_GREEN_NS"],
+            "min": params["MIN_GREEN"], "max": params["MAX_GREEN"],
+            "yellow": params["YELLOW_TIME"], "all_red": params["ALL_RED_TIME"],
+        })
+        self.per_vehicle = params["PER_VEHICLE"]
+
+        ring = self.ring
+        self.multiplier = tuple(
+            tuple(self._hour_multiplier(k, hour) for hour in range(24))
+            for k in range(ring.n_phases)
+        )
+        self.greens = tuple(self._green_rows(k, self.multiplier[k]) for k in range(ring.n_phases))
+        # learned multipliers (forecast.py) are clamped to the fixed profile's range
+        values = [m for row in self.multiplier for m in row]
+        self.multiplier_range = (min(values), max(values))
+        low, high = self.multiplier_range
+        steps = round((high - low) / LEARNED_STEP)
+        self.learned_multipliers = tuple(min(high, round(low + i * LEARNED_STEP, 6))
+                                         for i in range(steps + 1))
+        self.learned_greens = tuple(self._green_rows(k, self.learned_multipliers)
+                                    for k in range(ring.n_phases))
+        # per-phase timing handed to the policies in every DecisionContext
+        self.timing = {
+            "order": ring.phases,
+            "base": dict(zip(ring.phases, ring.base)),
+            "min_green": dict(zip(ring.phases, ring.min_green)),
+            "max_green": dict(zip(ring.phases, ring.max_green)),
+            "lost": {p: y + r for p, y, r in zip(ring.phases, ring.yellow, ring.all_red)},
+            "per_vehicle": {p: self.per_vehicle for p in ring.phases},
+        }
+
+        self.version = version
+        self.source = source
+        self.loaded_at = time.time()
+        blob = json.dumps(params, sort_keys=True, default=list).encode()
+        self.digest = hashlib.sha256(blob).hexdigest()[:12]
+
+    @classmethod
+    def load(cls, path, ring=None, version=1):
+        """Plan from config.py plus the overrides in `path`, if it exists."""
+        overrides = {}
+        if path is not None and os.path.exists(path):
+            with open(path) as f:
+                overrides = json.load(f)
+            if not isinstance(overrides, dict):
+                raise ValueError(f"{path}: expected a JSON object")
+        return cls(overrides, ring=ring, version=version, source=path if overrides else None)
+
+    def _ring_entries(self, overrides):
+        params = self.params
+        if "PHASE_RING" in overrides:
+            return params["PHASE_RING"]
+        entries = []
+        for entry in params["PHASE_RING"]:
+            entry = dict(entry)
+            keys = _NS_EW_KEYS.get(entry["name"])
+            if keys is not None:
+                base, peak = keys
+                if base in overrides:
+                    entry["base"] = params[base]
+                if peak in overrides:
+                    entry["peak_multiplier"] = params[peak]
+            entries.append(entry)
+        return entries
+
+    def _hour_multiplier(self, k, hour):
+        params = self.params
+        night_from, night_until = NIGHT_HOURS
+        if hour >= night_from or hour < night_until:
+            return params["NIGHT_MULTIPLIER"]
+        for start, end in (params["PEAK_MORNING"], params["PEAK_EVENING"]):
+            if start <= hour < end:
+                return self.ring.peak_multiplier[k]
+        return 1.0
+
+    def _green_rows(self, k, multipliers):
+        ring = self.ring
+        rows = {}                        # equal multipliers share a row
+        for multiplier in multipliers:
+            if multiplier in rows:
+                continue
+            row = []
+            for vehicles in range(MAX_TABLE_VEHICLES):
+                row.append(ring.clamp_green(k, (ring.base[k] + self.per_vehicle * vehicles) * multiplier))
+                if row[-1] >= ring.max_green[k] or self.per_vehicle == 0:
+                    break
+            rows[multiplier] = tuple(row)
+        return tuple(rows[m] for m in multipliers)
+
+    # ---------------- lookups ----------------
+    def learned_index(self, multiplier):
+        """Index into learned_multipliers / learned_greens[k] of a learned multiplier."""
+        low, high = self.multiplier_range
+        i = round((min(max(multiplier, low), high) - low) / LEARNED_STEP)
+        return min(i, len(self.learned_multipliers) - 1)
+
+    def row(self, k, hour, learned=None):
+        """(multiplier, green row) of ring phase k: the hour's, or a learned multiplier's."""
+        if learned is None:
+            return self.multiplier[k][hour], self.greens[k][hour]
+        i = self.learned_index(learned)
+        return self.learned_multipliers[i], self.learned_greens[k][i]
+
+    def green(self, k, hour, vehicles, learned=None):
+        """Linear green of ring phase k at local `hour` (or `learned` multiplier) for `vehicles`."""
+        row = self.row(k, hour, learned)[1]
+        return row[min(int(vehicles), len(row) - 1)]
+
+    def stamp(self):
+        """Version stamp for /status and the logs."""
+        return {
+            "version": self.version,
+            "digest": self.digest,
+            "loaded_at": self.loaded_at,
+            "source": self.source,
+        }
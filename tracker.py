@@ -0,0 +1,262 @@
+from collections import deque
+from typing import NamedTuple
+
+import numpy as np
+
+# -------------------------------------------------------
+# LIGHTWEIGHT MULTI-OBJECT TRACKER
+# -------------------------------------------------------
+# Greedy IoU association (centroid-distance fallback for fast movers) with
+# an alpha-beta ("Kalman-lite") constant-velocity model on box centres.
+# All track state lives in preallocated, compacted NumPy arrays, so one
+# update over 100+ tracks is a handful of array operations.
+
+IOU_MATCH = 0.3            # min IoU between a predicted track box and a detection
+CENTROID_MATCH = 0.5       # fallback: centre distance < this x detection diagonal
+MAX_MISSED = 5             # updates a track survives without a matching detection
+MIN_HITS = 2               # matches before a track counts (filters flicker)
+
+ALPHA = 0.6                # position / size correction gain
+BETA = 0.2                 # velocity correction gain
+
+STOP_SPEED = 0.02          # frame heights per second below which a vehicle is queued
+FLOW_WINDOW = 60.0         # seconds of crossings used for the vehicles/min rate
+
+
+class LaneTraffic(NamedTuple):
+    """
+    Per-lane tracking output, arrays in LaneMap.names order:
+      active    : confirmed tracks in the lane
+      queues    : confirmed tracks in the lane that are (nearly) stopped
+      flows     : stop-line crossings per minute over FLOW_WINDOW
+      max_dwell : longest time (s) a current track has spent in view
+    """
+    active: np.ndarray
+    queues: np.ndarray
+    flows: np.ndarray
+    max_dwell: np.ndarray
+
+
+def _iou_matrix(a, b):
+    """IoU of every box in a (N, 4) with every box in b (M, 4)."""
+    x1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    union = area_a[:, None] + area_b[None, :] - inter
+    return inter / np.maximum(union, 1e-6)
+
+
+def _greedy_pairs(score, threshold, higher_is_better=True):
+    """Greedy one-to-one assignment on a score matrix; returns (rows, cols)."""
+    if higher_is_better:
+        rows, cols = np.nonzero(score >= threshold)
+        order = np.argsort(-score[rows, cols], kind="stable")
+    else:
+        rows, cols = np.nonzero(score <= threshold)
+        order = np.argsort(score[rows, cols], kind="stable")
+
+    used_rows = set()
+    used_cols = set()
+    out_rows = []
+    out_cols = []
+    for r, c in zip(rows[order].tolist(), cols[order].tolist()):
+        if r in used_rows or c in used_cols:
+            continue
+        used_rows.add(r)
+        used_cols.add(c)
+        out_rows.append(r)
+        out_cols.append(c)
+    return np.array(out_rows, dtype=int), np.array(out_cols, dtype=int)
+
+
+def _side(lines, points):
+    """Sign of each point relative to its lane's stop line (0 if no line)."""
+    dx = lines[:, 2] - lines[:, 0]
+    dy = lines[:, 3] - lines[:, 1]
+    cross = dx * (points[:, 1] - lines[:, 1]) - dy * (points[:, 0] - lines[:, 0])
+    return np.nan_to_num(np.sign(cross)).astype(np.int8)
+
+
+class VehicleTracker:
+    """
+    Tracks vehicle detections of one camera across frames.
+
+    update(detections, ts, shape) takes the Detections of one frame (boxes
+    already assigned to lanes) and returns LaneTraffic. A crossing is
+    counted when a track moves across its lane's stop line; lanes without
+    a stop line count confirmed tracks that leave the lane instead.
+    """
+
+    def __init__(self, lane_map, capacity=128):
+        self.lane_map = lane_map
+        self.n_lanes = len(lane_map.names)
+        self.size = 0
+        self.next_id = 1
+        self.last_ts = None
+        self.started_ts = None
+        self.crossings = [deque() for _ in range(self.n_lanes)]
+        self.total_crossings = np.zeros(self.n_lanes, dtype=np.int64)
+        self._allocate(capacity)
+
+    def _allocate(self, capacity):
+        old = getattr(self, "ids", None)
+        ids = np.zeros(capacity, dtype=np.int64)
+        centre = np.zeros((capacity, 2), dtype=np.float32)
+        extent = np.zeros((capacity, 2), dtype=np.float32)
+        vel = np.zeros((capacity, 2), dtype=np.float32)
+        first_ts = np.zeros(capacity, dtype=np.float64)
+        hits = np.zeros(capacity, dtype=np.int32)
+        missed = np.zeros(capacity, dtype=np.int16)
+        lane = np.zeros(capacity, dtype=np.uint8)
+        side = np.zeros(capacity, dtype=np.int8)
+
+        if old is not None:
+            n = self.size
+            ids[:n] = self.ids[:n]
+            centre[:n] = self.centre[:n]
+            extent[:n] = self.extent[:n]
+            vel[:n] = self.vel[:n]
+            first_ts[:n] = self.first_ts[:n]
+            hits[:n] = self.hits[:n]
+            missed[:n] = self.missed[:n]
+            lane[:n] = self.lane[:n]
+            side[:n] = self.side[:n]
+
+        self.ids, self.centre, self.extent, self.vel = ids, centre, extent, vel
+        self.first_ts, self.hits, self.missed = first_ts, hits, missed
+        self.lane, self.side = lane, side
+
+    def _fields(self):
+        return (self.ids, self.centre, self.extent, self.vel, self.first_ts,
+                self.hits, self.missed, self.lane, self.side)
+
+    # ---------------- update ----------------
+    def update(self, detections, ts, shape):
+        height, width = shape[:2]
+        dt = 0.0 if self.last_ts is None else max(0.0, ts - self.last_ts)
+        self.last_ts = ts
+        if self.started_ts is None:
+            self.started_ts = ts
+
+        n = self.size
+        lines = self.lane_map.stop_lines_px(height, width)
+
+        boxes = detections.boxes.astype(np.float32)
+        det_centre = (boxes[:, :2] + boxes[:, 2:]) * 0.5
+        det_extent = boxes[:, 2:] - boxes[:, :2]
+
+        # predict
+        centre = self.centre[:n] + self.vel[:n] * dt
+        extent = self.extent[:n]
+        predicted = np.hstack([centre - extent * 0.5, centre + extent * 0.5])
+
+        # associate: IoU first, then centroid distance for what is left
+        rows, cols = _greedy_pairs(_iou_matrix(predicted, boxes), IOU_MATCH)
+        free_rows = np.setdiff1d(np.arange(n), rows)
+        free_cols = np.setdiff1d(np.arange(len(boxes)), cols)
+        if len(free_rows) and len(free_cols):
+            dist = np.linalg.norm(
+                centre[free_rows, None, :] - det_centre[None, free_cols, :], axis=2
+            )
+            diag = np.linalg.norm(det_extent[free_cols], axis=1)
+            r2, c2 = _greedy_pairs(dist / np.maximum(diag, 1.0), CENTROID_MATCH,
+                                   higher_is_better=False)
+            rows = np.concatenate([rows, free_rows[r2]])
+            cols = np.concatenate([cols, free_cols[c2]])
+
+        # correct matched tracks (alpha-beta filter)
+        residual = det_centre[cols] - centre[rows]
+        self.centre[:n] = centre
+        self.centre[rows] = centre[rows] + ALPHA * residual
+        if dt > 0:
+            self.vel[rows] += BETA * residual / dt
+        self.extent[rows] += ALPHA * (det_extent[cols] - self.extent[rows])
+        self.hits[rows] += 1
+        self.missed[:n] += 1
+        self.missed[rows] = 0
+
+        old_lane = self.lane[rows].copy()
+        self.lane[rows] = detections.lanes[cols]
+
+        # stop-line crossings of matched tracks
+        new_side = _side(lines[self.lane[rows]], self.centre[rows])
+        old_side = self.side[rows]
+        crossed = (old_side != 0) & (new_side != 0) & (new_side != old_side) \
+            & (old_lane == self.lane[rows]) & (self.hits[rows] >= MIN_HITS)
+        self.side[rows] = new_side
+        self._record_crossings(self.lane[rows][crossed], ts)
+
+        # retire lost tracks; without a stop line, leaving the lane is a crossing
+        gone = self.missed[:n] > MAX_MISSED
+        if gone.any():
+            exited = gone & np.isnan(lines[self.lane[:n], 0]) & (self.hits[:n] >= MIN_HITS)
+            self._record_crossings(self.lane[:n][exited], ts)
+            self._compact(~gone)
+
+        # start tracks for unmatched detections
+        new = np.setdiff1d(np.arange(len(boxes)), cols)
+        if len(new):
+            self._spawn(det_centre[new], det_extent[new], detections.lanes[new], lines, ts)
+
+        return self.lane_traffic(ts, height)
+
+    def _compact(self, keep):
+        k = int(keep.sum())
+        for field in self._fields():
+            field[:k] = field[:self.size][keep]
+        self.size = k
+
+    def _spawn(self, centre, extent, lanes, lines, ts):
+        m = len(centre)
+        if self.size + m > len(self.ids):
+            self._allocate(max(2 * len(self.ids), self.size + m))
+        s = slice(self.size, self.size + m)
+        self.ids[s] = np.arange(self.next_id, self.next_id + m)
+        self.centre[s] = centre
+        self.extent[s] = extent
+        self.vel[s] = 0.0
+        self.first_ts[s] = ts
+        self.hits[s] = 1
+        self.missed[s] = 0
+        self.lane[s] = lanes
+        self.side[s] = _side(lines[lanes], centre)
+        self.next_id += m
+        self.size += m
+
+    def _record_crossings(self, lanes, ts):
+        for lane in lanes.tolist():
+            self.crossings[lane].append(ts)
+        np.add.at(self.total_crossings, lanes, 1)
+
+    # ---------------- queries ----------------
+    def lane_traffic(self, ts, height):
+        n = self.size
+        confirmed = self.hits[:n] >= MIN_HITS
+        lanes = self.lane[:n][confirmed]
+
+        speed = np.linalg.norm(self.vel[:n][confirmed], axis=1)
+        stopped = speed < STOP_SPEED * height
+        dwell = ts - self.first_ts[:n][confirmed]
+
+        active = np.bincount(lanes, minlength=self.n_lanes)
+        queues = np.bincount(lanes[stopped], minlength=self.n_lanes)
+        max_dwell = np.zeros(self.n_lanes, dtype=np.float64)
+        np.maximum.at(max_dwell, lanes, dwell)
+
+        window = min(FLOW_WINDOW, max(1.0, ts - self.started_ts))
+        flows = np.zeros(self.n_lanes, dtype=np.float32)
+        for i, crossings in enumerate(self.crossings):
+            while crossings and crossings[0] < ts - FLOW_WINDOW:
+                crossings.popleft()
+            flows[i] = len(crossings) * 60.0 / window
+
+        return LaneTraffic(active, queues, flows, max_dwell)
+
+    def tracks(self, ts):
+        """(ids, lanes, dwell seconds) of all current tracks."""
+        n = self.size
+        return self.ids[:n].copy(), self.lane[:n].copy(), ts - self.first_ts[:n]
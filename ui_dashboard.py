@@ -1,4 +1,3 @@
-import os
 import time
 import threading
 import tkinter as tk
@@ -6,6 +5,9 @@ from tkinter import ttk
 from PIL import Image, ImageTk
 import cv2
 
+from count_bus import CountReader
+from frame_bus import FrameReader
+
 IMAGE_UPDATE_INTERVAL = 1000   # ms
 COUNT_UPDATE_INTERVAL = 1000   # ms
 
@@ -30,48 +32,38 @@ class TrafficUI(tk.Tk):
         tk.Label(self.info_frame, textvariable=self.green_time_var,
                  font=("Segoe UI", 14)).pack(anchor="w")
 
+        # Latest counts and frame published by the detector (shared memory)
+        self.counts = CountReader()
+        self.frames = FrameReader()
+        self.frame_seq = None
+
         # Start periodic updates
         self.after(IMAGE_UPDATE_INTERVAL, self.update_image)
         self.after(COUNT_UPDATE_INTERVAL, self.update_stats)
 
-    def get_latest_image_path(self):
-        files = [f for f in os.listdir(".")
-                 if f.startswith("captured_image_") and f.endswith(".jpg")]
-        if not files:
-            return None
-        files.sort()
-        return files[-1]
-
     def update_image(self):
-        path = self.get_latest_image_path()
-        if path:
-            try:
-                img = cv2.imread(path)
-                if img is not None:
+        latest = self.frames.latest()
+        if latest:
+            seq, _, img, _ = latest
+            if seq != self.frame_seq:
+                self.frame_seq = seq
+                try:
                     img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
                     img = cv2.resize(img, (800, 400))
                     im_pil = Image.fromarray(img)
                     im_tk = ImageTk.PhotoImage(im_pil)
                     self.image_label.configure(image=im_tk, text="")
                     self.image_label.image = im_tk
-            except Exception:
-                pass
+                except Exception:
+                    pass
         else:
             self.image_label.configure(text="No captured images yet...")
 
         self.after(IMAGE_UPDATE_INTERVAL, self.update_image)
 
     def update_stats(self):
-        # read vehicle_count.txt
-        if os.path.exists("vehicle_count.txt"):
-            try:
-                with open("vehicle_count.txt", "r") as f:
-                    data = f.read().strip()
-                    vehicle_count = int(data) if data else 0
-            except Exception:
-                vehicle_count = 0
-        else:
-            vehicle_count = 0
+        record = self.counts.latest()
+        vehicle_count = record.total if record else 0
 
         # same formula as your green_time_signal.py
         base_green_time = 30
@@ -3,115 +3,320 @@ import time
 
 import cv2
 import numpy as np
-from ultralytics import YOLO
 
-IMAGE_PATH = "static/latest_frame.jpg"   # frame from capture script
+from cctv_image_capture import CAMERA_INDEX, CaptureWorker
+from config import TILED_INFERENCE
+from count_bus import CountBus
+from detection_cache import DetectionCache, frame_key
+from detections import Detections, draw_detections
+from detector_backend import make_backend
+from frame_bus import FrameBus
+from lane_map import OUTSIDE, LaneMap
+from metrics import DETECTOR_METRICS, Metrics
+from motion_gate import InferenceGate
+from preempt import PrioritySender, priority_approaches
+from tiled_inference import TiledDetector
+from tracker import VehicleTracker
+
 CONF_THRESHOLD = 0.3                     # detection confidence threshold
 NMS_IOU_THRESHOLD = 0.45                 # NMS IoU threshold
 
 # COCO class ids for vehicles in YOLOv8
 VEHICLE_CLASS_IDS = {2, 3, 5, 7}         # car, motorcycle, bus, truck
+VEHICLE_CLASS_ARRAY = np.array(sorted(VEHICLE_CLASS_IDS))
+
+# Headless deployments skip the preview window and never draw on frames;
+# the dashboard annotates on demand when /image is requested.
+HEADLESS = os.environ.get("TRAFFIC_HEADLESS", "0") == "1"
+
+FRAME_POLL_INTERVAL = 0.1                # seconds between gate checks
+
+# Named lane polygons of this camera (config.py / data/lanes.json)
+LANE_MAP = LaneMap.load()
+
+# YOLOv8 backend (config.DETECTOR_BACKEND); the model is loaded on first
+# use, or up front by main() while the camera opens
+detector = make_backend()
+
+# Stage timings and frame counters; main() shares them for app.py's /metrics
+metrics = Metrics(DETECTOR_METRICS)
+
+# TILED_INFERENCE: one TiledDetector per lane map (by LaneMap.key), see tiled_inference.py
+_tilers = {}
+
+# Results of recently inferred frames, reused for identical frames (detection_cache.py)
+cache = DetectionCache()
+
+
+def tiler_for(lane_map):
+    tiler = _tilers.get(lane_map.key)
+    if tiler is None:
+        tiler = _tilers[lane_map.key] = TiledDetector(detector, lane_map)
+    return tiler
+
+
+def _run_model(image, lane_map):
+    if not TILED_INFERENCE:
+        return detector.infer([image], CONF_THRESHOLD, NMS_IOU_THRESHOLD)[0]
+    tiler = tiler_for(lane_map)
+    arrays = tiler.detect(image, CONF_THRESHOLD, NMS_IOU_THRESHOLD)
+    metrics.set("detector_input_size", tiler.size)
+    metrics.inc("detector_tiles_total", tiler.last_tiles)
+    return arrays
+
+
+def _cache_scope(lane_map):
+    # tiled results depend on the lane map's ROI; full-frame ones do not
+    return lane_map.key if TILED_INFERENCE else None
 
-print("[YOLOv8] loading model yolov8n.pt ...")
-model = YOLO("yolov8n.pt")               # will auto-download first run
-print("[YOLOv8] model ready")
 
+def _cache_key(image, lane_map):
+    """Cache key of a frame, or None with the cache disabled."""
+    if not cache.enabled:
+        return None
+    with metrics.timer("detector_cache_key_seconds"):
+        return frame_key(image, _cache_scope(lane_map))
 
-def count_vehicles(image):
+
+def _cache_get(key):
+    if key is None:
+        return None
+    arrays = cache.get(key)
+    metrics.inc("detector_cache_hits_total" if arrays is not None else "detector_cache_misses_total")
+    return arrays
+
+
+def infer_arrays(image, lane_map):
     """
-    Run YOLOv8 on the image and return NS/EW counts and annotated frame.
+    (boxes, cls, confs) of one frame, tiled within the lane map's ROI if
+    enabled; an identical earlier frame's result is reused from the cache.
     """
-    height, width, _ = image.shape
-    mid_y = height // 2  # top = NS, bottom = EW
+    key = _cache_key(image, lane_map)
+    arrays = _cache_get(key)
+    if arrays is not None:
+        return arrays
+    arrays = _run_model(image, lane_map)
+    return cache.put(key, arrays) if key is not None else arrays
 
-    # Run inference (results list, one item per image)
-    results = model(
-        image,
-        verbose=False,
-        conf=CONF_THRESHOLD,
-        iou=NMS_IOU_THRESHOLD,
-    )
 
-    count_ns = 0
-    count_ew = 0
+def _infer_batch(images, lane_maps):
+    """
+    One detector call for the frames of a batch that miss the cache;
+    identical frames within the batch are inferred once.
+    """
+    results = [None] * len(images)
+    pending = {}                         # key -> indices of frames waiting for it
+    for i, (image, lane_map) in enumerate(zip(images, lane_maps)):
+        key = _cache_key(image, lane_map)
+        if key is not None and key in pending:
+            cache.count_hit()            # same frame as an earlier one in this batch
+            metrics.inc("detector_cache_hits_total")
+            pending[key].append(i)
+            continue
+        results[i] = _cache_get(key)
+        if results[i] is None:
+            pending[key if key is not None else i] = [i]
+    if pending:
+        first = [indices[0] for indices in pending.values()]
+        fresh = detector.infer([images[i] for i in first], CONF_THRESHOLD, NMS_IOU_THRESHOLD)
+        for (key, indices), arrays in zip(pending.items(), fresh):
+            if cache.enabled:
+                arrays = cache.put(key, arrays)
+            for i in indices:
+                results[i] = arrays
+    return results
 
-    annotated = image.copy()
 
-    for r in results:
-        if r.boxes is None:
-            continue
+def classify_boxes(boxes, cls, confs, shape, lane_map=None):
+    """
+    Vectorized vehicle filter and lane assignment through the lane map's
+    label raster. Returns ({approach: vehicles}, Detections); boxes outside
+    every lane polygon are dropped.
+    """
+    lane_map = lane_map or LANE_MAP
+    height, width = shape[:2]
+
+    keep = np.isin(cls, VEHICLE_CLASS_ARRAY)
+    boxes = boxes[keep]
+    confs = confs[keep]
+
+    lanes = lane_map.assign(boxes, height, width)
+    inside = lanes != OUTSIDE
+    detections = Detections(boxes[inside], confs[inside], lanes[inside])
 
-        boxes = r.boxes.xyxy.cpu().numpy().astype(int)   # [x1, y1, x2, y2]
-        cls = r.boxes.cls.cpu().numpy().astype(int)      # class ids
-        confs = r.boxes.conf.cpu().numpy()               # confidences
-
-        for (x1, y1, x2, y2, c, conf) in zip(
-            boxes[:, 0],
-            boxes[:, 1],
-            boxes[:, 2],
-            boxes[:, 3],
-            cls,
-            confs,
-        ):
-            if c not in VEHICLE_CLASS_IDS:
-                continue
-
-            center_y = (y1 + y2) // 2
-
-            if center_y < mid_y:
-                count_ns += 1
-                color = (0, 255, 0)      # NS = green
-            else:
-                count_ew += 1
-                color = (0, 191, 255)    # EW = yellow
-
-            cv2.rectangle(annotated, (x1, y1), (x2, y2), color, 2)
-            cv2.putText(
-                annotated,
-                f"veh {conf:.2f}",
-                (x1, max(10, y1 - 5)),
-                cv2.FONT_HERSHEY_SIMPLEX,
-                0.5,
-                color,
-                2,
-            )
-
-    # draw split line
-    cv2.line(annotated, (0, mid_y), (width, mid_y), (255, 255, 255), 1)
-
-    return count_ns, count_ew, annotated
+    return lane_map.as_dict(lane_map.count(detections.lanes)), detections
+
+
+def detect_vehicles(image, lane_map=None):
+    """
+    Run YOLOv8 on the image and return ({approach: vehicles}, Detections)
+    without touching the pixels.
+    """
+    lane_map = lane_map or LANE_MAP
+    with metrics.timer("detector_infer_seconds"):
+        arrays = infer_arrays(image, lane_map)
+    with metrics.timer("detector_classify_seconds"):
+        return classify_boxes(*arrays, image.shape, lane_map)
+
+
+def count_vehicles(image, annotate=True, lane_map=None):
+    """
+    Run YOLOv8 on the image and return per-approach counts and the
+    annotated frame. With annotate=False (headless) the frame is never
+    copied or drawn on and None is returned in its place.
+    """
+    lane_map = lane_map or LANE_MAP
+    counts, detections = detect_vehicles(image, lane_map)
+    if not annotate:
+        return counts, None
+    height, width = image.shape[:2]
+    return counts, draw_detections(image, detections, lane_map.outlines(height, width))
+
+
+def count_vehicles_batch(images, lane_maps=None):
+    """
+    Run YOLOv8 once on a list of frames (one per camera), each with its own
+    lane map. Returns a list of ({approach: vehicles}, Detections), in input
+    order.
+    """
+    if not images:
+        return []
+    if lane_maps is None:
+        lane_maps = [LANE_MAP] * len(images)
+
+    if TILED_INFERENCE:
+        # crops and tiles differ per camera, so each frame runs on its own
+        results = [infer_arrays(image, lane_map) for image, lane_map in zip(images, lane_maps)]
+    else:
+        results = _infer_batch(images, lane_maps)
+    return [
+        classify_boxes(*arrays, image.shape, lane_map)
+        for image, arrays, lane_map in zip(images, results, lane_maps)
+    ]
+
+
+class DetectionLoop:
+    """
+    One camera's loop: take the newest frame from the capture worker, run
+    the model when the motion gate lets it, send priority requests, track
+    and publish. Shared by main() (CountBus / FrameBus in shared memory)
+    and edge_runtime.DetectionWorker (in-process LocalCounts /
+    LatestDetections); `counts` needs publish() and decision_at(), `frames`
+    publish(image, capture_ts, detections).
+    """
+
+    def __init__(self, capture, counts, frames, priority=None, lane_map=LANE_MAP, log=True):
+        self.capture = capture
+        self.counts = counts
+        self.frames = frames
+        self.priority = priority
+        self.lane_map = lane_map
+        self.log = log
+        self.gate = InferenceGate()
+        self.tracker = VehicleTracker(lane_map)
+        self.throttle = 0.0              # > 0: at most one inference per `throttle` s
+        self.last_counts = None
+        self.traffic = None
+
+    def should_infer(self, image, capture_ts):
+        gate = self.gate
+        if self.throttle and gate.last_infer_ts is not None \
+                and capture_ts - gate.last_infer_ts < self.throttle:
+            return False
+        return gate.should_infer(image, capture_ts, self.counts.decision_at())
+
+    def step(self, timeout=2):
+        """
+        Handle the newest frame. Returns (image, Detections) when the model
+        ran on it, None when it was skipped or no frame came within `timeout`.
+        """
+        capture = self.capture
+        with metrics.timer("detector_wait_seconds"):
+            item = capture.frames.get(timeout=timeout)
+        metrics.set("detector_frames_captured_total", capture.captured)
+        metrics.set("detector_frames_dropped_total", capture.frames.dropped)
+        if item is None:
+            if self.log:
+                print("No frames from camera yet. Waiting...")
+            return None
+
+        image, capture_ts = item
+        lane_map = self.lane_map
+
+        # (the first frame always passes the gate, so counts is set by then)
+        with metrics.timer("detector_gate_seconds"):
+            infer = self.should_infer(image, capture_ts)
+        if not infer:
+            # scene unchanged: previous counts are still valid for this frame
+            self.counts.publish(self.last_counts, capture_ts, self.traffic.queues, self.traffic.flows)
+            metrics.inc("detector_frames_skipped_total")
+            return None
+
+        with metrics.timer("detector_infer_seconds"):
+            arrays = infer_arrays(image, lane_map)
+        with metrics.timer("detector_classify_seconds"):
+            counts, detections = classify_boxes(*arrays, image.shape, lane_map)
+            requests = priority_approaches(*arrays, image.shape, lane_map)
+        if requests and self.priority is not None:
+            self.priority.send(requests)
+        metrics.inc("detector_frames_inferred_total")
+        with metrics.timer("detector_track_seconds"):
+            traffic = self.tracker.update(detections, capture_ts, image.shape)
+        self.last_counts, self.traffic = counts, traffic
+
+        if self.log:
+            print(" | ".join(
+                f"{name} vehicles: {n} (queue {q})"
+                for (name, n), q in zip(counts.items(), traffic.queues.tolist())
+            ) + f" | skipped {self.gate.skip_ratio:.0%} | cache hits {cache.hit_rate:.0%}")
+
+        # publish counts for controller/Flask, raw frame + boxes for /image
+        with metrics.timer("detector_publish_seconds"):
+            self.counts.publish(counts, capture_ts, traffic.queues, traffic.flows)
+            self.frames.publish(image, capture_ts, detections)
+        metrics.observe("detector_frame_age_seconds", max(0.0, time.time() - capture_ts))
+        return image, detections
 
 
 def main():
-    while True:
-        if not os.path.exists(IMAGE_PATH):
-            print("No captured images yet. Waiting...")
-            time.sleep(2)
-            continue
+    bus = CountBus.create(approaches=LANE_MAP.names)
+    frame_bus = FrameBus.create()
+    metrics.share("detector")
 
-        image = cv2.imread(IMAGE_PATH)
-        if image is None:
-            print("Failed to read image, skipping...")
-            time.sleep(2)
-            continue
+    # keep the camera open and take raw frames straight from memory
+    capture = CaptureWorker(CAMERA_INDEX)
+    capture.start()
+
+    # load + warm the model while the camera opens
+    detector.warmup()
+    print(f"[INFO] detector warm in {detector.warmup_time:.2f} s")
 
-        count_ns, count_ew, annotated = count_vehicles(image)
+    # buses / emergency vehicles in a lane go straight to the controller
+    priority = PrioritySender()
 
-        print(f"NS vehicles: {count_ns} | EW vehicles: {count_ew}")
+    # only run YOLO when the scene changed or a green decision is near
+    loop = DetectionLoop(capture, bus, frame_bus, priority)
 
-        # write counts for controller/Flask
-        with open("vehicle_count_ns.txt", "w") as f:
-            f.write(str(count_ns))
-        with open("vehicle_count_ew.txt", "w") as f:
-            f.write(str(count_ew))
+    while True:
+        inferred = loop.step()
 
-        cv2.imshow("YOLOv8 Vehicle Detection (NS upper, EW lower)", annotated)
-        if cv2.waitKey(1) & 0xFF == ord("q"):
-            break
+        if inferred is not None and not HEADLESS:
+            image, detections = inferred
+            height, width = image.shape[:2]
+            annotated = draw_detections(image, detections, LANE_MAP.outlines(height, width))
+            cv2.imshow("YOLOv8 Vehicle Detection (lanes from lane map)", annotated)
+            if cv2.waitKey(1) & 0xFF == ord("q"):
+                break
 
-        time.sleep(1)
+        time.sleep(FRAME_POLL_INTERVAL)
 
-    cv2.destroyAllWindows()
+    capture.stop()
+    priority.close()
+    if not HEADLESS:
+        cv2.destroyAllWindows()
+    bus.close()
+    frame_bus.close()
+    metrics.close()
 
 
 if __name__ == "__main__":